@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+"""Benchmarks of SuperCron on synthetic crontabs, compared with stored baselines
+
+	python benchmarks/bench_supercron.py                  compare with benchmarks/baseline.json
+	python benchmarks/bench_supercron.py --save           store the results as the new baseline
+	python benchmarks/bench_supercron.py --sizes 100000   run on crontabs of 100k lines
+	python benchmarks/bench_supercron.py -k read          run the benchmarks whose name contains 'read'
+
+The exit status is 1 when a benchmark is slower than its baseline by more than the tolerance, or
+when importing the CLI takes more than STARTUP_BUDGET milliseconds (measured with python -X importtime).
+Nothing here touches the crontab of the user: crontabs are held in memory or in temporary files.
+"""
+
+import gc
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+
+from supercron.supercron import SuperCron
+from supercron.utils import Utils
+from supercron.trigger import TCronTab
+from supercron.repetition_parsing import Repetition
+from supercron.timing import clock
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SIZES = (1000, 10000)
+# a benchmark runs ROUNDS times, or fewer once it has run for MAX_SECONDS, and keeps its best time
+ROUNDS = 5
+MAX_SECONDS = 3.0
+# jobs of a synthetic crontab form chains of CHAIN jobs, each one turned off when the previous one is disabled
+CHAIN = 10
+LOOKUPS = 1000
+SENTENCES = 1000
+# milliseconds the import of the CLI module may take, whatever the baseline: the modules of the
+# subcommands (python-crontab, NumPy, the daemon...) are imported when they run
+STARTUP_BUDGET = 30.0
+
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+
+
+def make_crontab(size, seed=0):
+	"""return the text of a crontab of size lines, mostly SuperCron jobs, some of them disabled or triggered"""
+	rand = random.Random(seed)
+	lines = ["# synthetic crontab", "MAILTO=root", "SHELL=/bin/sh"]
+	for i in range(size - len(lines)):
+		minute = rand.choice(("*", "*/5", "*/15", str(rand.randrange(60))))
+		hour = rand.choice(("*", "*/2", "{}-{}".format(rand.randrange(12), rand.randrange(12, 24)), str(rand.randrange(24))))
+		day = rand.choice(("*", "*", "*", str(rand.randrange(1, 29))))
+		month = rand.choice(("*", "*", "*/3", "jan-jun"))
+		dow = rand.choice(("*", "*", "mon-fri", "sat,sun"))
+		schedule = " ".join((minute, hour, day, month, dow))
+		if i % 20 == 19:
+			# not a SuperCron job
+			lines.append("{} /usr/bin/backup --volume {}".format(schedule, i))
+			continue
+		comment = "SuperCron__bench_{}".format(i)
+		if i % CHAIN:
+			comment += "%off:bench_{}:disabled".format(i - 1)
+		line = "{} /usr/local/bin/task --id {} >/dev/null 2>&1 # {}".format(schedule, i, comment)
+		lines.append("# " + line if i % 7 == 3 else line)
+	return "\n".join(lines) + "\n"
+
+
+def make_sentences(count, seed=0):
+	"""return count distinct repetition sentences, mixing the kinds of clauses the parser accepts"""
+	rand = random.Random(seed)
+	sentences = set()
+	while len(sentences) < count:
+		clauses = []
+		kind = rand.randrange(4)
+		if kind == 0:
+			clauses.append("every {} minutes".format(rand.randrange(1, 60)))
+		elif kind == 1:
+			clauses.append("at {}:{:02}".format(rand.randrange(24), rand.randrange(60)))
+		elif kind == 2:
+			clauses.append("every {} hours".format(rand.randrange(1, 24)))
+		else:
+			clauses.append("at {}:{:02} {}".format(rand.randrange(1, 13), rand.randrange(60), rand.choice(("am", "pm"))))
+		if rand.random() < 0.5:
+			clauses.append("on " + " and ".join(rand.sample(DAYS, rand.randrange(1, 3))))
+		if rand.random() < 0.3:
+			clauses.append("from {} to {}".format(*rand.sample(MONTHS, 2)))
+		rand.shuffle(clauses)
+		sentences.add(" ".join(clauses))
+	return sorted(sentences)
+
+
+@contextmanager
+def quiet():
+	"""silence the messages SuperCron prints"""
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull, "w")
+	try:
+		yield
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+		Utils.DEBUG = False
+
+
+def bench_parse_repetition():
+	"""parse repetition sentences, which do not depend on the size of the crontab, so it runs once"""
+	sentences = make_sentences(SENTENCES)
+
+	def run(state):
+		# every sentence is new to the cache
+		Repetition.cache.clear()
+		for sentence in sentences:
+			Repetition.parse_repetition(sentence)
+	return None, run
+
+
+class Benchmarks(object):
+	"""benchmarks of one crontab size; each one is a setup (not timed) and a run taking its result"""
+
+	def __init__(self, size, directory):
+		self.size = size
+		self.text = make_crontab(size)
+		self.path = os.path.join(directory, "crontab-{}".format(size))
+		self.cron = TCronTab(tab=self.text)
+		names = [job.get_name() for job in self.cron if job.is_superjob()]
+		self.names = [names[i * len(names) // LOOKUPS] for i in range(LOOKUPS)]
+		self.heads = [name for name in names if int(name.split("_")[-1]) % CHAIN == 0][:100]
+
+	def bench_read(self):
+		return None, lambda state: TCronTab(tab=self.text)
+
+	def bench_render(self):
+		return TCronTab(tab=self.text), lambda cron: cron.render()
+
+	def bench_render_changed(self):
+		def setup():
+			cron = TCronTab(tab=self.text)
+			for job in cron:
+				job._line = None
+			return cron
+		return setup(), lambda cron: cron.render()
+
+	def bench_find_name(self):
+		def run(cron):
+			for name in self.names:
+				list(cron.find_name(name))
+		return self.cron, run
+
+	def bench_activate_triggered_jobs(self):
+		def run(cron):
+			for name in self.heads:
+				cron.activate_triggered_jobs(name, "disabled")
+		return (lambda: TCronTab(tab=self.text)), run
+
+	def cli(self, *argv):
+		"""benchmark a command line run on the crontab file, from reading it to writing it"""
+		def setup():
+			with open(self.path, "w") as tab:
+				tab.write(self.text)
+
+		def run(state):
+			with quiet():
+				status = SuperCron.execute(TCronTab(tabfile=self.path), list(argv))
+			assert status == 0, argv
+		return setup, run
+
+	def bench_cli_add(self):
+		return self.cli("add", "-c", "ls", "-r", "every 5 minutes on mondays", "bench_new")
+
+	def bench_cli_disable(self):
+		return self.cli("disable", self.heads[0])
+
+	def bench_cli_delete(self):
+		return self.cli("delete", self.names[-1])
+
+	def bench_cli_search(self):
+		return self.cli("search", self.names[0])
+
+	def names_of(self):
+		return sorted(name[len("bench_"):] for name in dir(self) if name.startswith("bench_"))
+
+
+def measure(setup, run):
+	"""return the best time of run, in seconds; a callable setup builds a fresh state before each round"""
+	best = None
+	spent = 0.0
+	for _ in range(ROUNDS):
+		state = setup() if callable(setup) else setup
+		# like timeit, the garbage collector does not run in the middle of a measure
+		gc.collect()
+		gc.disable()
+		start = clock()
+		try:
+			run(state)
+		finally:
+			elapsed = clock() - start
+			gc.enable()
+		best = elapsed if best is None else min(best, elapsed)
+		spent += elapsed
+		if spent >= MAX_SECONDS:
+			break
+	return best
+
+
+def import_time():
+	"""return the best time python -X importtime reports for importing the CLI module, in seconds"""
+	best = None
+	# the first round compiles the modules if needed
+	for _ in range(ROUNDS + 1):
+		process = subprocess.Popen([sys.executable, "-X", "importtime", "-c", "import supercron.supercron"],
+			cwd=ROOT_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		out, err = process.communicate()
+		for line in err.decode("utf-8").splitlines():
+			# import time: self [us] | cumulative | imported package
+			fields = [field.strip() for field in line.split("|")]
+			if fields[-1] == "supercron.supercron":
+				elapsed = int(fields[1]) / 1e6
+				best = elapsed if best is None else min(best, elapsed)
+	return best
+
+
+def run_benchmarks(sizes, keyword):
+	"""return {"name[size]": best milliseconds} (just "name" for those not depending on the size) and print
+	them as they are measured"""
+	results = {}
+	# python -X importtime is there from Python 3.7
+	elapsed = import_time() if not keyword or keyword in "startup_import" else None
+	if elapsed is not None:
+		results["startup_import"] = round(elapsed * 1000, 3)
+		sys.stderr.write("{:<40}{:>12.3f} ms\n".format("startup_import", results["startup_import"]))
+	if not keyword or keyword in "parse_repetition":
+		results["parse_repetition"] = round(measure(*bench_parse_repetition()) * 1000, 3)
+		sys.stderr.write("{:<40}{:>12.3f} ms\n".format("parse_repetition", results["parse_repetition"]))
+	directory = tempfile.mkdtemp()
+	# snapshots and locks of the crontab files go to the temporary directory too
+	os.environ["XDG_CACHE_HOME"] = directory
+	try:
+		for size in sizes:
+			benchmarks = Benchmarks(size, directory)
+			for name in benchmarks.names_of():
+				key = "{}[{}]".format(name, size)
+				if keyword and keyword not in key:
+					continue
+				setup, run = getattr(benchmarks, "bench_" + name)()
+				results[key] = round(measure(setup, run) * 1000, 3)
+				sys.stderr.write("{:<40}{:>12.3f} ms\n".format(key, results[key]))
+	finally:
+		shutil.rmtree(directory)
+	return results
+
+
+def compare(results, baseline, tolerance):
+	"""print the results next to the baseline and return the keys of the regressions"""
+	regressions = []
+	print("{:<40}{:>12}{:>12}{:>8}".format("benchmark", "ms", "baseline", "ratio"))
+	for key in sorted(results):
+		if key not in baseline:
+			print("{:<40}{:>12.3f}{:>12}{:>8}".format(key, results[key], "-", "-"))
+			continue
+		ratio = results[key] / baseline[key] if baseline[key] else 1.0
+		flag = ""
+		if ratio > 1 + tolerance:
+			regressions.append(key)
+			flag = "  SLOWER"
+		print("{:<40}{:>12.3f}{:>12.3f}{:>8.2f}{}".format(key, results[key], baseline[key], ratio, flag))
+	return regressions
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks of SuperCron on synthetic crontabs.")
+	parser.add_argument("--sizes", default=",".join(str(size) for size in SIZES),
+		help="comma-separated numbers of lines of the synthetic crontabs (default: %(default)s)")
+	parser.add_argument("-k", "--keyword", help="only run the benchmarks whose name contains KEYWORD")
+	parser.add_argument("--baseline", default=BASELINE, help="baseline file (default: benchmarks/baseline.json)")
+	parser.add_argument("--save", action="store_true", help="store the results in the baseline file")
+	parser.add_argument("--tolerance", type=float, default=0.25,
+		help="slowdown over the baseline reported as a regression (default: %(default)s)")
+	args = parser.parse_args()
+	sizes = [int(size) for size in args.sizes.split(",")]
+	results = run_benchmarks(sizes, args.keyword)
+	baseline = {}
+	if os.path.exists(args.baseline):
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+	if args.save:
+		# results of other sizes or benchmarks are kept
+		baseline.update(results)
+		with open(args.baseline, "w") as f:
+			json.dump(baseline, f, indent=1, sort_keys=True)
+			f.write("\n")
+		return 0
+	regressions = compare(results, baseline, args.tolerance)
+	if results.get("startup_import", 0) > STARTUP_BUDGET:
+		print("Importing the CLI takes {:.3f} ms, over the budget of {} ms.".format(results["startup_import"],
+			STARTUP_BUDGET))
+		regressions.append("startup_import")
+	if regressions:
+		print("{} benchmark(s) slower than the baseline: {}".format(len(regressions), ", ".join(regressions)))
+		return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -17,6 +17,7 @@ setup(
 	download_url = 'https://github.com/linostar/SuperCron/tarball/' + package_version,
 	keywords = ['cron', 'crontab', 'scheduling'],
 	install_requires = ['python-crontab>=1.9.3'],
+	extras_require = {'profile': ['numpy'], 'apply': ['PyYAML']},
 	long_description = pypi_readme,
 	entry_points = {
 	'console_scripts': [
@@ -0,0 +1,141 @@
+import asyncio
+
+try:
+	from namespace import Namespace
+	from snapshot import Snapshot
+	from storage import CommandStorage
+	from supercron import SuperCron
+	from trigger import TCronTab
+except ImportError:
+	from supercron.namespace import Namespace
+	from supercron.snapshot import Snapshot
+	from supercron.storage import CommandStorage
+	from supercron.supercron import SuperCron
+	from supercron.trigger import TCronTab
+
+# the loop running the coroutine (get_running_loop is Python 3.7+, where get_event_loop is deprecated in coroutines)
+running_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+
+
+class AsyncSuperCron(object):
+	"""asyncio interface to SuperCron operations, returning results instead of printing them
+
+	Every operation reads user's crontab, applies the change and writes it back while holding
+	a lock, so concurrent calls on the same instance never lose each other's updates; the write
+	also holds the lock file of the crontab, like TCronTab.write, and the change is applied again
+	if another process changed the crontab in the meantime. Invalid
+	arguments raise ValueError, and failures of the crontab command raise IOError.
+	"""
+
+	def __init__(self, user=True, command="crontab"):
+		self.user = user
+		self.command = command
+		# the crontab read and written, and named by the lock file of its writes
+		self.storage = CommandStorage(user or True, command)
+		# created on first use, so it belongs to the loop running the operations
+		self._lock = None
+
+	def user_opt(self):
+		return self.storage.user_opt()
+
+	async def run(self, *args, **flags):
+		"""run the crontab command with args and flags and return its output (IOError on failure)"""
+		command_line = CommandStorage.command_line(self.command, *args, **flags)
+		process = await asyncio.create_subprocess_exec(*command_line,
+			stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+		out, err = await process.communicate()
+		if process.returncode and not (args and args[0] == "-l" and b"no crontab for" in err):
+			raise IOError("{}: {}".format(" ".join(command_line), err.decode("utf-8").strip()))
+		return out
+
+	async def read(self):
+		"""return user's crontab as a TCronTab, read with 'crontab -l'"""
+		out = await self.run("-l", **self.user_opt())
+		cron = TCronTab(tab=out.decode("utf-8"))
+		cron.digest = Snapshot.digest(out)
+		return cron
+
+	async def write(self, cron):
+		"""replace user's crontab with cron, through 'crontab FILE' like CommandStorage.write"""
+		with CommandStorage.content_file(cron.render().encode("utf-8")) as path:
+			await self.run(path, **self.user_opt())
+
+	async def modify(self, operation, dry_run=False):
+		"""apply operation(cron) to user's crontab and write it, unless on a dry run"""
+		if self._lock is None:
+			self._lock = asyncio.Lock()
+		async with self._lock:
+			cron = await self.read()
+			result = operation(cron)
+			if not dry_run:
+				# serializes the write with those of SuperCron processes, the lock is taken off the loop
+				lock = TCronTab.lock_key(self.storage.key)
+				await running_loop().run_in_executor(None, lock.__enter__)
+				try:
+					retries = TCronTab.RETRIES
+					# the crontab may have been changed by another process since it was read
+					while Snapshot.digest(await self.run("-l", **self.user_opt())) != cron.digest:
+						if not retries:
+							raise IOError("crontab changed by someone else {} times in a row".format(TCronTab.RETRIES))
+						retries -= 1
+						cron = await self.read()
+						result = operation(cron)
+					await self.write(cron)
+				finally:
+					lock.__exit__(None, None, None)
+		result.dry_run = dry_run
+		result.propagation = [Namespace({"depth": depth, "cause": (name, state), "name": job.get_name(),
+			"enabled": job.is_enabled()}) for depth, name, state, job in cron.propagation]
+		result.cycles = cron.cycles
+		return result
+
+	@staticmethod
+	def describe(job):
+		"""return the fields of a job shown by subcommand search"""
+		return Namespace({"name": job.get_name(), "enabled": job.is_enabled(), "trigger": job.get_trigger(),
+			"repetition": str(job.slices), "command": job.command, "superjob": job.is_superjob()})
+
+	async def add(self, name, command, repetition, dry_run=False, spread=None):
+		"""add a job; spread ("load" or "hash") chooses the time the repetition does not set"""
+		name = SuperCron.check_name(name)
+		repeat = SuperCron.get_repeat(repetition)
+
+		def add_job(cron):
+			job_repeat = SuperCron.spread_repeat(cron, repetition, name, spread) if spread else repeat
+			return Namespace({"count": 1, "job": self.describe(cron.add_job(name, command, job_repeat))})
+		return await self.modify(add_job, dry_run)
+
+	async def rename(self, old_name, new_name, dry_run=False):
+		new_name = SuperCron.check_name(new_name)
+		return await self.modify(lambda cron: Namespace({"count": cron.rename_job(old_name, new_name)}), dry_run)
+
+	async def delete(self, name, dry_run=False):
+		return await self.modify(lambda cron: Namespace({"count": cron.delete_job(name)}), dry_run)
+
+	async def enable(self, name, enable_it=True, dry_run=False):
+		return await self.modify(lambda cron: Namespace({"count": cron.enable_job(name, enable_it)}), dry_run)
+
+	async def disable(self, name, dry_run=False):
+		return await self.enable(name, False, dry_run)
+
+	async def trigger(self, name, trigger):
+		"""set the trigger of the jobs named name, from a sentence like subcommand trigger ("none" removes it)"""
+		trigger_list = SuperCron.get_trigger(trigger)
+		return await self.modify(lambda cron: Namespace({"count": cron.trigger_job(name, trigger_list)}))
+
+	async def clear(self):
+		return await self.modify(lambda cron: Namespace({"count": cron.clear_jobs()}))
+
+	async def search(self, name):
+		"""return the jobs named name, or all SuperCron jobs for '@supercron', or all jobs for '@all'"""
+		if self._lock is None:
+			self._lock = asyncio.Lock()
+		async with self._lock:
+			cron = await self.read()
+		if name == "@all":
+			jobs = list(cron)
+		elif name == "@supercron":
+			jobs = [job for job in cron if job.is_superjob()]
+		else:
+			jobs = list(cron.find_name(name))
+		return [self.describe(job) for job in jobs]
@@ -0,0 +1,102 @@
+import os
+import sys
+import stat
+import errno
+
+# socket and json are imported once a daemon is found, so that commands run without daemon start faster
+
+
+class DaemonClient(object):
+	"""class for sending command lines to the SuperCron daemon, without loading what the daemon needs"""
+
+	COMMANDS = ("add", "rename", "delete", "enable", "disable", "search", "next", "trigger", "policy", "batch", "clear")
+
+	@staticmethod
+	def socket_path():
+		"""return the path of the socket, $SUPERCRON_SOCKET or a per-user default"""
+		path = os.environ.get("SUPERCRON_SOCKET")
+		if path:
+			return path
+		directory = os.environ.get("XDG_RUNTIME_DIR")
+		if not directory:
+			import tempfile
+			# anyone can create files in the temporary directory, so the socket goes in a directory of the user
+			return os.path.join(tempfile.gettempdir(), "supercron-{}".format(os.getuid()), "daemon.sock")
+		return os.path.join(directory, "supercron-{}.sock".format(os.getuid()))
+
+	@staticmethod
+	def trusted(path):
+		"""check that the socket at path, if any, belongs to the user and that only the user can connect
+		to it, in a directory of the user or root; otherwise someone else would get the command lines"""
+		uid = os.getuid()
+		try:
+			if os.lstat(os.path.dirname(os.path.abspath(path))).st_uid not in (uid, 0):
+				return False
+			st = os.lstat(path)
+		except OSError as e:
+			return e.errno == errno.ENOENT
+		return stat.S_ISSOCK(st.st_mode) and st.st_uid == uid and not st.st_mode & 0o077
+
+	@staticmethod
+	def serves(argv):
+		"""check if the daemon can run this command line (clear asks for confirmation without -f)"""
+		if not argv or argv[0] not in DaemonClient.COMMANDS:
+			return False
+		return argv[0] != "clear" or "-f" in argv or "--force" in argv
+
+	@staticmethod
+	def connect(path):
+		import socket
+		client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			client.connect(path)
+		except socket.error:
+			client.close()
+			raise
+		return client
+
+	@staticmethod
+	def request(client, message):
+		"""send a request on a connected client socket and return the reply of the daemon"""
+		import json
+		import socket
+		try:
+			client.sendall((json.dumps(message) + "\n").encode("utf-8"))
+			client.shutdown(socket.SHUT_WR)
+			chunks = []
+			chunk = client.recv(65536)
+			while chunk:
+				chunks.append(chunk)
+				chunk = client.recv(65536)
+		finally:
+			client.close()
+		return json.loads(b"".join(chunks).decode("utf-8"))
+
+	@staticmethod
+	def forward(argv):
+		"""run a command line through the running daemon and return its exit status (None without daemon)"""
+		path = DaemonClient.socket_path()
+		if not DaemonClient.serves(argv) or not os.path.exists(path):
+			return None
+		if not DaemonClient.trusted(path):
+			sys.stderr.write("Warning: '{}' is not a socket of your own, it is not used.\n".format(path))
+			return None
+		import socket
+		try:
+			client = DaemonClient.connect(path)
+		except socket.error:
+			# stale socket of a daemon that is gone
+			return None
+		try:
+			reply = DaemonClient.request(client, {"argv": argv})
+		except (socket.error, ValueError) as e:
+			# the daemon may have applied the command, so it is not run again here
+			sys.stderr.write("Error: no reply from SuperCron daemon ({}).\n".format(e))
+			return 1
+		sys.stdout.write(reply["output"])
+		return reply["status"]
+
+	@staticmethod
+	def stop(path):
+		"""ask the daemon listening on path to write its pending changes and exit"""
+		return DaemonClient.request(DaemonClient.connect(path), {"stop": True})
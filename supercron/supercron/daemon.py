@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+from contextlib import contextmanager
+
+try:
+	import socketserver
+except ImportError:
+	import SocketServer as socketserver
+
+try:
+	from StringIO import StringIO
+except ImportError:
+	from io import StringIO
+
+try:
+	from client import DaemonClient
+	from trigger import TCronTab
+except ImportError:
+	from supercron.client import DaemonClient
+	from supercron.trigger import TCronTab
+
+
+class DaemonCronTab(TCronTab):
+	"""class for holding the writes of a crontab in memory until the daemon flushes them"""
+
+	def __init__(self, user=None, tab=None, tabfile=None, log=None, storage=None):
+		# time of the oldest change not written yet, None when there is none
+		self.dirty = None
+		super(DaemonCronTab, self).__init__(user, tab, tabfile, log, storage)
+
+	def write(self, filename=None):
+		if self._transactions:
+			# the outermost transaction marks the crontab changed when it ends
+			return
+		if self.dirty is None:
+			self.dirty = time.time()
+
+	@contextmanager
+	def transaction(self):
+		"""defer all writes inside the block, and put the crontab back as it was if the block fails"""
+		if self._transactions:
+			with super(DaemonCronTab, self).transaction():
+				yield self
+			return
+		content, journal = self.render(), list(self.journal)
+		try:
+			with super(DaemonCronTab, self).transaction():
+				yield self
+		except BaseException:
+			# unlike a crontab read for one command, this one serves the next requests
+			self.crons, self.lines, self._names, self._triggers = [], [], {}, {}
+			self._occupancy = None
+			self.parse_lines(content.split("\n"))
+			self.journal = journal
+			raise
+
+	def flush(self):
+		"""write the pending changes to user's crontab, all at once"""
+		if self.dirty is not None:
+			TCronTab.write(self)
+			self.dirty = None
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+	"""handler reading one JSON request line and answering one JSON reply line"""
+
+	def handle(self):
+		try:
+			request = json.loads(self.rfile.readline().decode("utf-8"))
+		except ValueError:
+			reply = {"status": 2, "output": "Error: invalid request.\n"}
+		else:
+			reply = self.server.supercron.handle(request)
+		self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+
+class Daemon(DaemonClient):
+	"""class for serving subcommands over a Unix socket from a crontab kept in memory"""
+
+	# seconds a change may wait for the next ones before the crontab is written
+	WRITE_DELAY = 0.5
+	# seconds between two checks for changes made to the crontab outside the daemon
+	CHECK_INTERVAL = 1.0
+	# seconds before writing the changes again when the crontab could not be written
+	RETRY_DELAY = 5.0
+
+	def __init__(self, path, execute):
+		"""execute(cron, argv) runs a command line on cron and returns its exit status"""
+		self.path = path
+		self.execute = execute
+		self.cron = None
+		self.checked = 0
+		self.running = False
+
+	@staticmethod
+	def terminate(signum, frame):
+		raise SystemExit(0)
+
+	def load(self):
+		self.cron = DaemonCronTab(user=True)
+		self.checked = time.time()
+
+	def check(self):
+		"""reload the crontab if it was changed outside the daemon"""
+		if self.cron.dirty is not None or time.time() - self.checked < self.CHECK_INTERVAL:
+			return
+		if self.cron.read_digest() != self.cron.digest:
+			self.load()
+		self.checked = time.time()
+
+	def handle(self, request):
+		"""run the command line of a request and return the reply, with its status and output"""
+		if request.get("stop"):
+			self.running = False
+			return {"status": 0, "output": "SuperCron daemon stopped.\n"}
+		argv = [str(arg) for arg in request.get("argv", [])]
+		if not Daemon.serves(argv):
+			return {"status": 2, "output": "Error: command not served by SuperCron daemon.\n"}
+		self.check()
+		output = StringIO()
+		stdout, stderr = sys.stdout, sys.stderr
+		sys.stdout = sys.stderr = output
+		try:
+			status = self.execute(self.cron, argv)
+		except Exception as e:
+			output.write("Error: {}\n".format(e))
+			status = 1
+		finally:
+			sys.stdout, sys.stderr = stdout, stderr
+		return {"status": status, "output": output.getvalue()}
+
+	def flush(self):
+		"""write the pending changes, keeping them to try again later if the crontab cannot be written"""
+		try:
+			self.cron.flush()
+		except (IOError, OSError) as e:
+			sys.stderr.write("Error: cannot write the crontab, trying again in {} seconds ({}).\n".format(
+				self.RETRY_DELAY, e))
+			self.cron.dirty = time.time() + self.RETRY_DELAY - self.WRITE_DELAY
+			return False
+		return True
+
+	def save_pending(self):
+		"""write the pending changes aside when the daemon stops without writing them to the crontab"""
+		path = self.path + ".crontab"
+		fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+		with os.fdopen(fd, "w") as f:
+			f.write(self.cron.render())
+		return path
+
+	def serve(self):
+		"""serve requests until stopped, writing the changes at most every WRITE_DELAY seconds"""
+		directory = os.path.dirname(os.path.abspath(self.path))
+		if not os.path.isdir(directory):
+			os.makedirs(directory, 0o700)
+		if not Daemon.trusted(self.path):
+			raise IOError("'{}' or its directory belongs to someone else".format(self.path))
+		if os.path.exists(self.path):
+			try:
+				Daemon.connect(self.path).close()
+			except socket.error:
+				os.unlink(self.path)
+			else:
+				raise IOError("a daemon is already listening on '{}'".format(self.path))
+		self.load()
+		# only the user can connect to the socket
+		umask = os.umask(0o177)
+		try:
+			server = socketserver.UnixStreamServer(self.path, DaemonHandler)
+		finally:
+			os.umask(umask)
+		server.supercron = self
+		handler = signal.signal(signal.SIGTERM, Daemon.terminate)
+		self.running = True
+		try:
+			while self.running:
+				if self.cron.dirty is None:
+					server.timeout = None
+				else:
+					server.timeout = max(0, self.cron.dirty + self.WRITE_DELAY - time.time())
+				server.handle_request()
+				if self.cron.dirty is not None and time.time() - self.cron.dirty >= self.WRITE_DELAY:
+					self.flush()
+		finally:
+			signal.signal(signal.SIGTERM, handler)
+			server.server_close()
+			os.unlink(self.path)
+			if not self.flush():
+				path = self.save_pending()
+				raise IOError("the changes could not be written to the crontab, they are in '{0}' "
+					"(install them with 'crontab {0}')".format(path))
@@ -0,0 +1,120 @@
+import sys
+import json
+
+try:
+	import yaml
+except ImportError:
+	yaml = None
+
+from crontab import CronSlices, SPECIALS
+
+try:
+	from namespace import Namespace
+	from expression import TriggerExpression
+	from placement import Occupancy
+	from repetition_parsing import Repetition
+	from trigger import TCronTab
+	from utils import Utils
+except ImportError:
+	from supercron.namespace import Namespace
+	from supercron.expression import TriggerExpression
+	from supercron.placement import Occupancy
+	from supercron.repetition_parsing import Repetition
+	from supercron.trigger import TCronTab
+	from supercron.utils import Utils
+
+
+class DesiredJobs(object):
+	"""class for reading the SuperCron jobs a crontab should have, as subcommand apply takes them
+
+	A YAML (or JSON) file lists the jobs, at its top level or under the key 'jobs'. Every job has
+	a name, a command, and a repetition sentence or a raw schedule ('0 3 * * *', '@daily'); it may
+	have enabled (true by default), a trigger, an overlap policy, and wrap (true to log its runs).
+	"""
+
+	KEYS = ("name", "command", "repetition", "schedule", "enabled", "trigger", "policy", "wrap")
+
+	@staticmethod
+	def load(path):
+		"""return the list of jobs of a YAML or JSON file ('-' for stdin), as dicts"""
+		infile = sys.stdin if path == "-" else open(path, "r")
+		try:
+			if path.endswith(".json"):
+				data = json.load(infile)
+			elif yaml is None:
+				raise ImportError("PyYAML is needed to read YAML files (pip install pyyaml)")
+			else:
+				try:
+					data = yaml.safe_load(infile)
+				except yaml.YAMLError as e:
+					raise ValueError("invalid YAML: {}".format(e))
+		finally:
+			if infile is not sys.stdin:
+				infile.close()
+		if isinstance(data, dict) and "jobs" in data:
+			data = data["jobs"]
+		if data is None:
+			# an empty file: no job at all
+			return []
+		if not isinstance(data, list) or not all(isinstance(job, dict) for job in data):
+			raise ValueError("expected a list of jobs, at the top level or under the key 'jobs'.")
+		return data
+
+	@staticmethod
+	def resolve(jobs):
+		"""return the jobs as Namespaces with their slices rendered as in the crontab (ValueError if invalid)
+
+		Repetition sentences leaving the time free get a time derived from the job name, like
+		'add --spread hash', so the same file always gives the same crontab.
+		"""
+		scratch = TCronTab(tab="")
+		occupancy = Occupancy()
+		resolved = []
+		for number, job in enumerate(jobs, 1):
+			try:
+				resolved.append(DesiredJobs.resolve_job(job, scratch, occupancy))
+			except ValueError as e:
+				raise ValueError("job {} ({}): {}".format(number, job.get("name", "no name"), e))
+		return resolved
+
+	@staticmethod
+	def resolve_job(job, scratch, occupancy):
+		"""return a job of the file as a Namespace, its slices set on a job of the scratch crontab"""
+		unknown = sorted(set(job) - set(DesiredJobs.KEYS))
+		if unknown:
+			raise ValueError("unknown key(s) {}.".format(", ".join(unknown)))
+		for key in ("name", "command"):
+			if not job.get(key):
+				raise ValueError("missing {}.".format(key))
+		name = str(job["name"])
+		if Utils.check_job_name(name) != 0:
+			raise ValueError("job name cannot be '{}' or contain a '%' symbol.".format(name))
+		if ("repetition" in job) == ("schedule" in job):
+			raise ValueError("expected either a repetition or a schedule.")
+		item = scratch.new(command="", comment=name)
+		if "repetition" in job:
+			schedule = Repetition.parse_schedule(str(job["repetition"]))
+			repeat = occupancy.place(schedule, name, "hash", 0, 0) if schedule else None
+			if not repeat:
+				raise ValueError("invalid repetition sentence: '{}'.".format(job["repetition"]))
+			item.set_repetition(repeat)
+		else:
+			text = " ".join(str(job["schedule"]).split())
+			special = text.startswith("@") and (text[1:] == "reboot" or text[1:] in SPECIALS)
+			if not (special or text.count(" ") == 4) or not CronSlices().setall(text):
+				raise ValueError("invalid schedule: '{}'.".format(job["schedule"]))
+			item.setall(text)
+		trigger = None
+		if job.get("trigger"):
+			try:
+				trigger = tuple(trigger.compact for trigger in TriggerExpression.parse(str(job["trigger"])))
+			except ValueError as e:
+				raise ValueError("invalid trigger: {}.".format(e))
+		policy = None
+		if job.get("policy"):
+			policy = Utils.parse_policy(str(job["policy"]))
+			if not policy:
+				raise ValueError("invalid policy (expected \"skip\", \"queue\" or \"limit N\").")
+		return Namespace({"name": name, "slices": str(item.slices), "command": str(job["command"]),
+			"enabled": bool(job.get("enabled", True)), "trigger": trigger,
+			"policy": policy, "wrap": bool(job.get("wrap")) or bool(policy)})
@@ -0,0 +1,263 @@
+import re
+
+try:
+	from lrucache import LRUCache
+except ImportError:
+	from supercron.lrucache import LRUCache
+
+
+class TriggerExpression(object):
+	"""class for a trigger: an action (on, off or toggle) taken on a job when a condition on other jobs holds
+
+	The condition combines "NAME is STATE" terms with and, or, not and parentheses, like
+	"on if db_backup is disabled and (reports is added or etl is toggled)". It is parsed once and
+	compiled into closures, and stored in the comment of the job in a compact form, like
+	"on:db_backup:disabled&(reports:added|etl:toggled)"; a trigger of a single term keeps the
+	"on:NAME:STATE" form of the triggers SuperCron always wrote. In the compact form, the characters
+	of RESERVED in job names are escaped with a backslash; in sentences, a job name having
+	parentheses or the words and, or, not is written in double quotes, like '"a and b" is enabled'.
+
+	When job NAME becomes STATE, only the triggers having the term "NAME is STATE" are evaluated
+	(TCronTab indexes them by their terms), or a negated term of the opposite state, like
+	"not NAME is enabled" for disabled. That term is then true, and the other terms are true
+	when their job is in their state now: some job of that name is enabled (enabled), they all are
+	disabled (disabled), it exists (added) or not (deleted). State toggled is only true for the event.
+	"""
+
+	# order the triggers of the same event fire in
+	ACTIONS = ("toggle", "on", "off")
+	STATES = ("enabled", "disabled", "toggled", "added", "deleted")
+	# states a negated term becomes true with; "not NAME is toggled" is true without any event
+	OPPOSITES = {"enabled": "disabled", "disabled": "enabled", "added": "deleted", "deleted": "added"}
+	# characters of the compact form, escaped with a backslash in job names
+	RESERVED = "&|!();\\"
+	ESCAPE = re.compile("([" + re.escape(RESERVED) + "])")
+	UNESCAPE = re.compile(r"\\([" + re.escape(RESERVED) + "])")
+	KEYWORDS = {"or": "or", "and": "and", "not": "not"}
+	WORDS = {"or": " or ", "and": " and ", "not": "not "}
+	SYMBOLS = {"or": "|", "and": "&", "not": "!"}
+	OPERATORS = re.compile(r"[&|!()\\]")
+	# tokens of a sentence, of a compact condition, and triggers of a sentence
+	SENTENCE_TOKENS = re.compile(r'\(|\)|"[^"]*"|[^\s()]+')
+	COMPACT_TOKENS = re.compile(r"[&|!()]|(?:\\.?|[^&|!()\\])+")
+	SENTENCES = re.compile(r'(?:"[^"]*"|[^;])+')
+	# compact forms of compound triggers already parsed, shared by the jobs having them
+	cache = LRUCache(4096)
+
+	__slots__ = ("action", "tree", "atoms", "compact", "_evaluate")
+
+	def __init__(self, action, tree, compact=None):
+		"""build the trigger of an action and a condition tree: ("is", NAME, STATE), ("not", TREE),
+		("and", TREE, TREE...) or ("or", TREE, TREE...); None is a trigger that cannot be read and never fires"""
+		self.action = action
+		self.tree = tree
+		atoms = []
+		if tree is not None:
+			TriggerExpression.collect(tree, atoms)
+		self.atoms = tuple(atoms)
+		self.compact = compact or action + ":" + TriggerExpression.render(tree,
+			lambda name, state: TriggerExpression.ESCAPE.sub(r"\\\1", name) + ":" + state, TriggerExpression.SYMBOLS)
+		self._evaluate = None
+
+	def __str__(self):
+		if self.tree is None:
+			return "INVALID ({})".format(self.compact)
+		return "{} IF {}".format(self.action.upper(), TriggerExpression.render(self.tree,
+			lambda name, state: "{} IS {}".format(TriggerExpression.quote(name), state.upper()),
+			dict((key, word.upper()) for key, word in TriggerExpression.WORDS.items())))
+
+	def __eq__(self, other):
+		return isinstance(other, TriggerExpression) and self.compact == other.compact
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		return hash(self.compact)
+
+	def is_simple(self):
+		"""return True for a trigger of a single "NAME is STATE" term"""
+		return self.tree is not None and self.tree[0] == "is"
+
+	def as_list(self):
+		"""return [action, name, state] of a simple trigger"""
+		return [self.action, self.tree[1], self.tree[2]]
+
+	def evaluate(self, event, is_in_state):
+		"""return whether the condition holds when the (name, state) event happens, is_in_state(name, state)
+		telling whether a job is in a state now"""
+		if self._evaluate is None:
+			if self.tree is None:
+				return False
+			self._evaluate = TriggerExpression.compile(self.tree)
+		return self._evaluate(event, is_in_state)
+
+	@staticmethod
+	def collect(tree, atoms, negated=False):
+		"""append to atoms the distinct (name, state) events that can make tree true: its terms, and
+		the opposite states of its negated terms"""
+		kind = tree[0]
+		if kind == "is":
+			atom = tree[1:]
+			if negated:
+				state = TriggerExpression.OPPOSITES.get(atom[1])
+				atom = (atom[0], state) if state else None
+			if atom is not None and atom not in atoms:
+				atoms.append(atom)
+			return
+		for child in tree[1:]:
+			TriggerExpression.collect(child, atoms, negated != (kind == "not"))
+
+	@staticmethod
+	def compile(tree):
+		"""return a closure evaluating tree for an event, see evaluate"""
+		kind = tree[0]
+		if kind == "is":
+			atom = tree[1:]
+			if atom[1] == "toggled":
+				return lambda event, is_in_state: event == atom
+			return lambda event, is_in_state: event == atom or is_in_state(*atom)
+		if kind == "not":
+			operand = TriggerExpression.compile(tree[1])
+			return lambda event, is_in_state: not operand(event, is_in_state)
+		operands = [TriggerExpression.compile(child) for child in tree[1:]]
+		if kind == "and":
+			return lambda event, is_in_state: all(operand(event, is_in_state) for operand in operands)
+		return lambda event, is_in_state: any(operand(event, is_in_state) for operand in operands)
+
+	@staticmethod
+	def render(tree, atom, operators):
+		"""return the text of tree, with atom(name, state) for its terms and operators the texts of or, and and not"""
+		kind = tree[0]
+		if kind == "is":
+			return atom(tree[1], tree[2])
+		texts = []
+		for child in tree[1:]:
+			text = TriggerExpression.render(child, atom, operators)
+			# "and" binds tighter than "or", and "not" tighter than both
+			if child[0] == "or" and kind != "or" or child[0] == "and" and kind == "not":
+				text = "(" + text + ")"
+			texts.append(text)
+		if kind == "not":
+			return operators["not"] + texts[0]
+		return operators[kind].join(texts)
+
+	@staticmethod
+	def parse_tree(tokens, operators, read_atom):
+		"""return the tree of a condition split into tokens, operators mapping or, and and not to
+		their tokens, and read_atom(tokens, position) returning a term and the position after it"""
+		position = [0]
+
+		def peek():
+			return tokens[position[0]].lower() if position[0] < len(tokens) else None
+
+		def expression(kind):
+			# a chain of "or" of "and" chains
+			child = "and" if kind == "or" else None
+			operands = [expression(child) if child else factor()]
+			while peek() == operators[kind]:
+				position[0] += 1
+				operands.append(expression(child) if child else factor())
+			return operands[0] if len(operands) == 1 else (kind,) + tuple(operands)
+
+		def factor():
+			token = peek()
+			if token == operators["not"]:
+				position[0] += 1
+				return ("not", factor())
+			if token == "(":
+				position[0] += 1
+				tree = expression("or")
+				if peek() != ")":
+					raise ValueError("missing ')'")
+				position[0] += 1
+				return tree
+			if token is None:
+				raise ValueError("missing condition")
+			atom, position[0] = read_atom(tokens, position[0])
+			return atom
+
+		tree = expression("or")
+		if position[0] != len(tokens):
+			raise ValueError("unexpected '{}'".format(tokens[position[0]]))
+		return tree
+
+	@staticmethod
+	def quote(name):
+		"""return name as written in a sentence, in double quotes if it would not be read back as is"""
+		if '"' not in name and (any(c in name for c in "()") or name.split() != name.split(" ") or
+				any(word in TriggerExpression.KEYWORDS for word in name.lower().split())):
+			return '"' + name + '"'
+		return name
+
+	@staticmethod
+	def read_sentence_atom(tokens, position):
+		"""read a "NAME is STATE" term, the name possibly of several words (but not "and" or "or"),
+		or in double quotes"""
+		token = tokens[position]
+		if len(token) > 1 and token[0] == token[-1] == '"':
+			if position + 2 < len(tokens) and tokens[position + 1].lower() == "is" and \
+					tokens[position + 2].lower() in TriggerExpression.STATES:
+				return ("is", token[1:-1], tokens[position + 2].lower()), position + 3
+			raise ValueError("expected \"NAME is STATE\" at '{}'".format(token))
+		end = position
+		while end < len(tokens) and tokens[end] not in ("(", ")") and (end == position or
+				tokens[end].lower() not in ("and", "or")):
+			if end > position and tokens[end].lower() == "is" and end + 1 < len(tokens) and \
+					tokens[end + 1].lower() in TriggerExpression.STATES:
+				name = " ".join(tokens[position:end])
+				return ("is", name, tokens[end + 1].lower()), end + 2
+			end += 1
+		raise ValueError("expected \"NAME is STATE\" at '{}' (names having parentheses or the words and, "
+			"or, not go in double quotes)".format(tokens[position]))
+
+	@staticmethod
+	def read_compact_atom(tokens, position):
+		name, _, state = tokens[position].rpartition(":")
+		if not name or state not in TriggerExpression.STATES:
+			raise ValueError("invalid term '{}'".format(tokens[position]))
+		return ("is", TriggerExpression.UNESCAPE.sub(r"\1", name), state), position + 1
+
+	@staticmethod
+	def parse(sentence):
+		"""return the triggers of a sentence like "on if a is disabled and not b is added", several
+		triggers being separated by ';' (ValueError if invalid)"""
+		triggers = []
+		for part in TriggerExpression.SENTENCES.findall(sentence) or [""]:
+			tokens = TriggerExpression.SENTENCE_TOKENS.findall(part)
+			if len(tokens) < 2 or tokens[0].lower() not in TriggerExpression.ACTIONS or tokens[1].lower() != "if":
+				raise ValueError("expected \"ACTION if CONDITION\" in '{}'".format(part.strip()))
+			tree = TriggerExpression.parse_tree(tokens[2:], TriggerExpression.KEYWORDS,
+				TriggerExpression.read_sentence_atom)
+			trigger = TriggerExpression(tokens[0].lower(), tree)
+			if not trigger.atoms:
+				# only negated toggled terms, which no event makes true
+				raise ValueError("no change of a job makes '{}' true".format(part.strip()))
+			triggers.append(trigger)
+		return triggers
+
+	@staticmethod
+	def decode(compact):
+		"""return the trigger of its compact form; a form that cannot be read gives a trigger that never fires"""
+		action, _, condition = compact.partition(":")
+		if not TriggerExpression.OPERATORS.search(condition):
+			# a single term, like all the triggers SuperCron wrote before compound ones
+			name, _, state = condition.rpartition(":")
+			if action in TriggerExpression.ACTIONS and name and state in TriggerExpression.STATES:
+				return TriggerExpression(action, ("is", name, state), compact)
+			return TriggerExpression(action, None, compact)
+		trigger = TriggerExpression.cache.get(compact)
+		if trigger is None:
+			try:
+				if action not in TriggerExpression.ACTIONS:
+					raise ValueError(action)
+				tree = TriggerExpression.parse_tree(TriggerExpression.COMPACT_TOKENS.findall(condition),
+					TriggerExpression.SYMBOLS, TriggerExpression.read_compact_atom)
+			except ValueError:
+				# a single term written before names were escaped, like "on:backup (old):disabled"
+				name, _, state = condition.rpartition(":")
+				valid = action in TriggerExpression.ACTIONS and name and state in TriggerExpression.STATES
+				tree = ("is", name, state) if valid else None
+			trigger = TriggerExpression(action, tree, compact)
+			TriggerExpression.cache.put(compact, trigger)
+		return trigger
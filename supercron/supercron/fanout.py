@@ -0,0 +1,71 @@
+from multiprocessing.pool import ThreadPool
+
+try:
+	from namespace import Namespace
+	from storage import Storage, CommandStorage
+	from timing import Timing, clock
+	from trigger import TCronTab
+except ImportError:
+	from supercron.namespace import Namespace
+	from supercron.storage import Storage, CommandStorage
+	from supercron.timing import Timing, clock
+	from supercron.trigger import TCronTab
+
+
+class FanOut(object):
+	"""class for applying one operation to many crontabs in parallel, with a bounded pool of threads
+
+	Every crontab is read, changed and written on its own, with its own snapshot, lock and check
+	for concurrent changes: a failing crontab does not stop the others, and is reported with its error.
+	"""
+
+	WORKERS = 8
+
+	@staticmethod
+	def storage_of(entry):
+		"""return the storage of a user name, or of a storage spec like file:PATH"""
+		if ":" in entry:
+			return Storage.parse(entry)
+		return CommandStorage(entry)
+
+	@staticmethod
+	def read_users(path):
+		"""return the entries of a file listing one user (or storage spec) per line, '#' starting comments"""
+		with open(path) as f:
+			lines = [line.split("#", 1)[0].strip() for line in f]
+		return [line for line in lines if line]
+
+	@staticmethod
+	def apply(storages, operation, workers=None, dry_run=False):
+		"""apply operation(cron) to the crontab of every storage, writing it unless on a dry run
+
+		Return a Namespace with the results (one per storage, in order: name and storage, value returned
+		by the operation, error message or None, seconds), the failed ones and the seconds of the whole run.
+		"""
+		def apply_one(storage):
+			start = clock()
+			value = error = None
+			try:
+				cron = TCronTab(storage=storage)
+				value = operation(cron)
+				if not dry_run:
+					cron.write()
+			except Exception as e:
+				# reported with the other results rather than aborting them
+				error = str(e) or e.__class__.__name__
+			return Namespace({"name": str(storage), "storage": storage, "value": value, "error": error,
+				"seconds": clock() - start})
+
+		start = clock()
+		pool = ThreadPool(max(1, min(workers or FanOut.WORKERS, len(storages))))
+		with Timing.span("fan-out"):
+			# the spans of the threads would mix, each result has its own time instead
+			enabled, Timing.enabled = Timing.enabled, False
+			try:
+				results = pool.map(apply_one, storages)
+			finally:
+				Timing.enabled = enabled
+				pool.close()
+				pool.join()
+		return Namespace({"results": results, "failures": [result for result in results if result.error],
+			"seconds": clock() - start})
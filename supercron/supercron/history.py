@@ -0,0 +1,164 @@
+import os
+import time
+import sqlite3
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+try:
+	from namespace import Namespace
+	from runner import RunLog
+	from timing import Timing
+except ImportError:
+	from supercron.namespace import Namespace
+	from supercron.runner import RunLog
+	from supercron.timing import Timing
+
+
+class RunHistory(object):
+	"""class for the history of the runs of wrapped jobs, in an SQLite database indexed by job name and start time
+
+	The wrapper only appends to the run log, which stays fast; the runs are moved from the log to the
+	database when the history is opened. Runs are keyed by job name (TCronItem.get_name), and the
+	ones older than the retention period are deleted.
+	"""
+
+	# days runs are kept for
+	RETENTION = 90
+	# size of the run log past which it is replaced by an empty one, once its runs are in the database
+	LOG_LIMIT = 1 << 20
+	FIELDS = RunLog.FIELDS
+	STATS_FIELDS = ("name", "runs", "failed", "skipped", "mean_wall", "max_wall", "mean_cpu")
+
+	def __init__(self, path=None):
+		self.path = path or os.path.join(RunLog.make_directory(), "history.sqlite3")
+		self.db = sqlite3.connect(self.path)
+		with self.db:
+			self.db.execute("CREATE TABLE IF NOT EXISTS runs (name TEXT NOT NULL, started REAL NOT NULL, " +
+				"wall REAL NOT NULL, cpu REAL NOT NULL, status INTEGER NOT NULL, overlap INTEGER)")
+			# also makes a run moved twice from the log (after a crash) a single run
+			self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS runs_name_started ON runs (name, started, wall)")
+			self.db.execute("CREATE INDEX IF NOT EXISTS runs_started ON runs (started)")
+			# the wall times of a job in order, with the start times the percentiles filter them by
+			self.db.execute("CREATE INDEX IF NOT EXISTS runs_name_wall ON runs (name, wall, started)")
+			self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+
+	def close(self):
+		self.db.close()
+
+	def offset(self):
+		"""return the size of the part of the run log already moved to the database"""
+		row = self.db.execute("SELECT value FROM meta WHERE key = 'offset'").fetchone()
+		return row[0] if row else 0
+
+	def load(self, path, offset):
+		"""insert the runs of the complete lines of the log file path from offset; return the offset reached"""
+		try:
+			f = open(path, "rb")
+		except (IOError, OSError):
+			return offset
+		with f:
+			f.seek(offset)
+			rest = b""
+			chunk = f.read(1 << 20)
+			while chunk:
+				data = rest + chunk
+				# a run being appended right now is left for the next time
+				end = data.rfind(b"\n") + 1
+				runs = (RunLog.parse(line) for line in data[:end].splitlines())
+				self.db.executemany("INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?, ?)", (run for run in runs if run))
+				offset += end
+				rest = data[end:]
+				chunk = f.read(1 << 20)
+		return offset
+
+	@Timing.timed("ingest")
+	def ingest(self, retention=None):
+		"""move the new runs of the run log to the database, and delete the runs older than retention days"""
+		log = RunLog.path()
+		rotated = log + ".old"
+		lock = open(self.path + ".lock", "a")
+		try:
+			if fcntl is not None:
+				# history commands take turns moving the runs
+				fcntl.flock(lock, fcntl.LOCK_EX)
+			with self.db:
+				offset = self.offset()
+				if os.path.exists(rotated):
+					# left by an interrupted rotation: its runs come first
+					self.load(rotated, offset)
+					offset = 0
+				offset = self.load(log, offset)
+				self.db.execute("INSERT OR REPLACE INTO meta VALUES ('offset', ?)", (offset,))
+				self.db.execute("DELETE FROM runs WHERE started < ?",
+					(time.time() - (retention or RunHistory.RETENTION) * 86400,))
+			if os.path.exists(rotated):
+				os.unlink(rotated)
+			if offset > RunHistory.LOG_LIMIT:
+				# the wrapper creates a new log at its next run; runs appended meanwhile are in the renamed one
+				os.rename(log, rotated)
+				with self.db:
+					self.load(rotated, offset)
+					self.db.execute("INSERT OR REPLACE INTO meta VALUES ('offset', 0)")
+				os.unlink(rotated)
+		finally:
+			lock.close()
+
+	@staticmethod
+	def where(name, since, failed=False):
+		"""return the WHERE clause and parameters selecting runs of job name (all if None) from since"""
+		clauses, parameters = ["started >= ?"], [since or 0]
+		if name is not None:
+			clauses.append("name = ?")
+			parameters.append(name)
+		if failed:
+			clauses.append("status > 0")
+		return " AND ".join(clauses), parameters
+
+	def runs(self, name=None, since=None, failed=False):
+		"""yield the runs of job name (of all jobs if None) started from the epoch time since, oldest first
+
+		Runs are read from the database as they are yielded, and failed=True only yields the failed
+		ones (exit status above 0).
+		"""
+		where, parameters = self.where(name, since, failed)
+		for row in self.db.execute("SELECT name, started, wall, cpu, status, overlap FROM runs WHERE " + where +
+				" ORDER BY started", parameters):
+			yield Namespace(zip(self.FIELDS, row[:5] + (None if row[5] is None else bool(row[5]),)))
+
+	def percentiles(self, name, since, percents, skipped, count):
+		"""return the percents-th percentiles (nearest rank) of the wall times of the count runs not skipped
+
+		The wall times are read in order from the index on job name, wall time and start time, which
+		needs no sort and stops at the largest percentile: the skipped runs, which last 0 seconds,
+		come first and are passed over.
+		"""
+		where, parameters = self.where(name, since)
+		positions = [skipped + max(1, int(-(-percent * count // 100))) - 1 for percent in percents]
+		last = max(positions)
+		values = {}
+		if count:
+			cursor = self.db.execute("SELECT wall FROM runs INDEXED BY runs_name_wall WHERE " + where + " ORDER BY wall", parameters)
+			for position, (wall,) in enumerate(cursor):
+				if position in positions:
+					values[position] = wall
+					if position == last:
+						break
+		return [values.get(position) for position in positions]
+
+	def stats(self, name=None, since=None, percentiles=(50, 95, 99)):
+		"""yield per job the runs, failed and skipped runs, mean and max wall time, mean CPU time and
+		percentiles of the wall time (of the runs that were not skipped), as Namespaces ordered by name"""
+		where, parameters = self.where(name, since)
+		rows = self.db.execute("SELECT name, COUNT(*), SUM(status > 0), SUM(status = ?), " +
+			"AVG(CASE WHEN status != ? THEN wall END), MAX(wall), AVG(CASE WHEN status != ? THEN cpu END) " +
+			"FROM runs WHERE " + where + " GROUP BY name ORDER BY name",
+			[RunLog.SKIPPED] * 3 + parameters).fetchall()
+		for row in rows:
+			stats = Namespace(zip(self.STATS_FIELDS, row))
+			values = self.percentiles(stats.name, since, percentiles, stats.skipped, stats.runs - stats.skipped)
+			for percent, value in zip(percentiles, values):
+				stats["p{:g}".format(percent)] = value
+			yield stats
@@ -0,0 +1,36 @@
+import importlib
+
+# package of SuperCron modules, empty when they are run from their directory
+PACKAGE = __name__.rpartition(".")[0]
+
+
+class LazyImport(object):
+	"""stand-in for a class of a SuperCron module, which imports the module the first time it is used
+
+	Calls, attribute reads and attribute writes go to the class, so that subcommands only pay for the
+	modules they need (python-crontab, NumPy, socketserver...).
+	"""
+
+	def __init__(self, module, name):
+		object.__setattr__(self, "_module", module)
+		object.__setattr__(self, "_name", name)
+		object.__setattr__(self, "_target", None)
+
+	def _load(self):
+		target = object.__getattribute__(self, "_target")
+		if target is None:
+			module = object.__getattribute__(self, "_module")
+			if PACKAGE:
+				module = "{}.{}".format(PACKAGE, module)
+			target = getattr(importlib.import_module(module), object.__getattribute__(self, "_name"))
+			object.__setattr__(self, "_target", target)
+		return target
+
+	def __getattr__(self, name):
+		return getattr(self._load(), name)
+
+	def __setattr__(self, name, value):
+		setattr(self._load(), name, value)
+
+	def __call__(self, *args, **kwargs):
+		return self._load()(*args, **kwargs)
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	from schedule import ScheduleIndex
+except ImportError:
+	from supercron.schedule import ScheduleIndex
+
+MINUTES_PER_DAY = 1440
+
+# number of distinct schedules expanded at once, which bounds the memory used
+CHUNK = 4096
+
+
+class LoadProfile(object):
+	"""class for counting, with NumPy, the jobs starting at every minute of a period"""
+
+	def __init__(self, jobs, start, days):
+		"""profile the enabled jobs over the 'days' days starting on the date of 'start'"""
+		if numpy is None:
+			raise ImportError("NumPy is needed for load profiles (pip install numpy)")
+		self.start = datetime(start.year, start.month, start.day)
+		self.days = days
+		# jobs with the same schedule are expanded once, and counted as many times as they are
+		groups = list(ScheduleIndex(job for job in jobs if job.is_enabled()).groups.values())
+		self.jobs = sum(len(group_jobs) for schedule, group_jobs in groups)
+		self.schedules = len(groups)
+		self.counts = self.count(groups).ravel()
+
+	@staticmethod
+	def bits(masks, count):
+		"""expand an array of bitsets into a (len(masks), count) array of their bits 0..count-1"""
+		return (masks[:, None] >> numpy.arange(count, dtype=numpy.uint64)) & numpy.uint64(1)
+
+	def count(self, groups):
+		"""return the (days, minutes of the day) matrix of the number of jobs starting"""
+		dates = [self.start + timedelta(days=day) for day in range(self.days)]
+		months = sorted(set((date.year, date.month) for date in dates))
+		# (month of the period, day of the month) of each date, to pick the days out of the month bitsets
+		month_index = numpy.array([months.index((date.year, date.month)) for date in dates])
+		day_of_month = numpy.array([date.day for date in dates], dtype=numpy.uint64)
+		counts = numpy.zeros((self.days, MINUTES_PER_DAY))
+		for first in range(0, len(groups), CHUNK):
+			chunk = groups[first:first + CHUNK]
+			weights = numpy.array([len(group_jobs) for schedule, group_jobs in chunk], dtype=float)
+			day_masks = numpy.array([[schedule.day_mask(year, month) if schedule.months >> month & 1 else 0
+				for year, month in months] for schedule, group_jobs in chunk], dtype=numpy.uint64)
+			days = (day_masks[:, month_index] >> day_of_month) & numpy.uint64(1)
+			hours = self.bits(numpy.array([schedule.hours for schedule, group_jobs in chunk], dtype=numpy.uint64), 24)
+			minutes = self.bits(numpy.array([schedule.minutes for schedule, group_jobs in chunk],
+				dtype=numpy.uint64), 60)
+			# minutes of the day of every schedule, as the outer product of its hours and minutes
+			day_minutes = (hours[:, :, None] * minutes[:, None, :]).reshape(len(chunk), MINUTES_PER_DAY)
+			counts += numpy.dot((days * weights[:, None]).T, day_minutes.astype(float))
+		return numpy.rint(counts).astype(numpy.int64)
+
+	def time_of(self, minute):
+		return self.start + timedelta(minutes=int(minute))
+
+	def histogram(self):
+		"""return the (number of jobs, number of minutes with that many jobs starting) pairs"""
+		minutes = numpy.bincount(self.counts)
+		return [(int(jobs), int(minutes[jobs])) for jobs in numpy.nonzero(minutes)[0]]
+
+	def peaks(self, width=1, top=5):
+		"""return the (start time, number of jobs) of the busiest non-overlapping windows of width minutes"""
+		sums = numpy.cumsum(numpy.concatenate(([0], self.counts)))
+		windows = sums[width:] - sums[:-width]
+		peaks = []
+		taken = numpy.zeros(len(self.counts), dtype=bool)
+		for start in numpy.argsort(-windows, kind="stable"):
+			if len(peaks) == top or not windows[start]:
+				break
+			if not taken[start:start + width].any():
+				taken[start:start + width] = True
+				peaks.append((self.time_of(start), int(windows[start])))
+		return peaks
+
+	def write_csv(self, out):
+		"""write the number of jobs starting at every minute of the period as CSV"""
+		out.write("time,jobs\n")
+		for minute, jobs in enumerate(self.counts):
+			out.write("{},{}\n".format(self.time_of(minute).strftime("%Y-%m-%d %H:%M"), jobs))
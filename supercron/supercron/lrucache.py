@@ -0,0 +1,49 @@
+import threading
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+	"""A bounded, thread-safe mapping that evicts the least recently used keys"""
+
+	def __init__(self, maxsize=1024):
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self._items = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key, default=None):
+		"""return the cached value of key (marking it as recently used), or default"""
+		with self._lock:
+			try:
+				value = self._items.pop(key)
+			except KeyError:
+				self.misses += 1
+				return default
+			self._items[key] = value
+			self.hits += 1
+			return value
+
+	def put(self, key, value):
+		with self._lock:
+			self._items.pop(key, None)
+			self._items[key] = value
+			while len(self._items) > self.maxsize:
+				self._items.popitem(last=False)
+
+	def clear(self):
+		with self._lock:
+			self._items.clear()
+			self.hits = 0
+			self.misses = 0
+
+	def info(self):
+		"""return a dict of the counters of the cache"""
+		return {"hits": self.hits, "misses": self.misses, "size": len(self._items), "maxsize": self.maxsize}
+
+	def __len__(self):
+		return len(self._items)
+
+	def __contains__(self, key):
+		return key in self._items
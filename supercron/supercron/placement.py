@@ -0,0 +1,100 @@
+import zlib
+
+try:
+	from repetition_parsing import Repetition
+	from schedule import Schedule
+except ImportError:
+	from supercron.repetition_parsing import Repetition
+	from supercron.schedule import Schedule
+
+
+def set_bits(mask):
+	"""list the positions of the set bits of mask"""
+	bits = []
+	position = 0
+	while mask:
+		if mask & 1:
+			bits.append(position)
+		mask >>= 1
+		position += 1
+	return bits
+
+
+class Occupancy(object):
+	"""class for counting the jobs starting at every minute of the day, updated as jobs are added and removed"""
+
+	STRATEGIES = ("load", "hash")
+
+	def __init__(self, jobs=()):
+		# jobs starting at hour * 60 + minute, whatever their days (disabled jobs may be enabled again)
+		self.slots = [0] * 1440
+		counts = {}
+		for job in jobs:
+			key = Occupancy.key(job)
+			if key:
+				counts[key] = counts.get(key, 0) + 1
+		for (hours, minutes), count in counts.items():
+			self.update(hours, minutes, count)
+
+	@staticmethod
+	def key(job):
+		schedule = Schedule.of(job)
+		if schedule is None:
+			return None
+		return schedule.hours, schedule.minutes
+
+	def update(self, hours, minutes, count):
+		minutes = set_bits(minutes)
+		for hour in set_bits(hours):
+			for minute in minutes:
+				self.slots[hour * 60 + minute] += count
+
+	def add(self, job):
+		key = Occupancy.key(job)
+		if key:
+			self.update(key[0], key[1], 1)
+
+	def remove(self, job):
+		key = Occupancy.key(job)
+		if key:
+			self.update(key[0], key[1], -1)
+
+	def place(self, schedule, name, strategy, hour, minute):
+		"""return a copy of a parsed schedule with its missing hour and/or minute chosen by strategy
+
+		Strategy "load" picks the least loaded time (the nearest from hour:minute in case of a tie),
+		and strategy "hash" picks a time from a stable hash of the job name.
+		"""
+		repeat = Repetition.apply_defaults(schedule, hour, minute)
+		# the same fields as the ones apply_defaults fills
+		free_minute = not ("min_on" in schedule or "min_every" in schedule)
+		free_hour = not ("hour_on" in schedule or "hour_every" in schedule or "min_every" in schedule)
+		if not repeat or not (free_minute or free_hour):
+			return repeat
+		slots = self.slots
+		if free_hour and free_minute:
+			loads, start = slots, hour * 60 + minute
+		elif free_minute:
+			# the job starts at the chosen minute of each of its hours
+			if "hour_every" in repeat:
+				hours = range(0, 24, repeat['hour_every'])
+			else:
+				hours = [repeat['hour_on']]
+			loads = [sum(slots[h * 60 + m] for h in hours) for m in range(60)]
+			start = minute
+		else:
+			minutes = [repeat['min_on']]
+			loads = [sum(slots[h * 60 + m] for m in minutes) for h in range(24)]
+			start = hour
+		if strategy == "hash":
+			chosen = zlib.crc32(name.encode("utf-8")) % len(loads)
+		else:
+			rotated = loads[start:] + loads[:start]
+			chosen = (start + rotated.index(min(rotated))) % len(loads)
+		if free_hour and free_minute:
+			repeat['hour_on'], repeat['min_on'] = divmod(chosen, 60)
+		elif free_minute:
+			repeat['min_on'] = chosen
+		else:
+			repeat['hour_on'] = chosen
+		return repeat
@@ -2,195 +2,254 @@ import re
 
 try:
 	from utils import Utils
+	from lrucache import LRUCache
+	from timing import Timing
 except ImportError:
 	from supercron.utils import Utils
+	from supercron.lrucache import LRUCache
+	from supercron.timing import Timing
+
+
+# one pattern for all the tokens of a repetition sentence, so it is scanned only once
+TOKEN_REX = re.compile(r"(?P<time>\b(?P<hour>\d{1,2}):(?P<minute>\d{1,2})\b(?:\s*(?P<ampm>am|pm))?)" +
+	r"|(?P<date>\b(?P<day>\d{1,2})[/-](?P<month>\d{1,2})\b)" +
+	r"|(?P<number>\d+)|(?P<word>[a-z]+)|(?P<comma>,)")
+
+SHORT_NAMES = dict(Utils.SHORT_DAYS, **Utils.SHORT_MONTHS)
+SHORT_REX = re.compile(r"\b(" + "|".join(SHORT_NAMES) + r")\b")
+
+# words with a meaning in repetition sentences, mapped to their (kind, value) token
+WORDS = {}
+for day, value in Utils.DAYS.items():
+	WORDS[day] = WORDS[day + "s"] = WORDS[day[:3]] = ("dow", value)
+for month, value in Utils.MONTHS.items():
+	WORDS[month] = WORDS[month[:3]] = ("month", value)
+for unit in ("minute", "hour", "day", "month"):
+	WORDS[unit] = WORDS[unit + "s"] = ("unit", unit)
+for word in ("at", "every", "once", "on", "in", "and", "from", "to", "boot", "reboot", "everyday", "anyday",
+		"midnight", "am", "pm"):
+	WORDS[word] = ("word", word)
+WORDS[","] = ("comma", ",")
+for number in range(100):
+	WORDS[str(number)] = ("number", str(number))
+
+# words after which a day or a month name is part of a list, like in "on mondays, fridays and sundays"
+DOW_LIST_PREFIXES = frozenset(("on", "and", ","))
+MONTH_LIST_PREFIXES = frozenset(("on", "and", ",", "in"))
+
+# words starting a clause of their own
+KEYWORDS = frozenset(("at", "every", "everyday", "anyday", "midnight", "from"))
+
+# upper bounds and error messages of "every N units" clauses
+EVERY_LIMITS = {
+	"minute": (59, "Expected 1-59 for minutes."),
+	"hour": (23, "Expected 1-23 for hours."),
+	"day": (459, "Expected 1-31 for days."),
+	"month": (12, "Expected 1-12 for months."),
+}
+EVERY_KEYS = (("minute", "min_every"), ("hour", "hour_every"), ("day", "day_every"), ("month", "month_every"))
 
 
 class Repetition:
 	"""class for parsing repetition clauses"""
 
+	# parsed schedules by lowercase sentence, shared by all the operations of a process
+	cache = LRUCache(4096)
+
 	@staticmethod
 	def expand_repetition(repetition):
 		"""expand short day/month names to full day/month names"""
-		for short_day in Utils.SHORT_DAYS.keys():
-			repetition = re.sub(r"\b{}\b".format(short_day), Utils.SHORT_DAYS[short_day], repetition)
-		for short_month in Utils.SHORT_MONTHS.keys():
-			repetition = re.sub(r"\b{}\b".format(short_month), Utils.SHORT_MONTHS[short_month], repetition)
-		return repetition
+		return SHORT_REX.sub(lambda matched: SHORT_NAMES[matched.group(1)], repetition)
 
 	@staticmethod
-	def parse_repetition(repetition):
-		"""parse and convert different types of repetition clauses"""
-		repeat = {}
-		repetition = Repetition.expand_repetition(repetition.lower())
-		# check for repetition clauses like: "every reboot"
-		matched = re.search(r"(at|every)\s+(boot|reboot)", repetition)
-		if matched:
-			repeat['reboot'] = True
-		# check for repetition clauses like: "once every 21 minutes"
-		matched = re.search(r"(once\s+)?every\s+(\d+\s+)?minute(s)?", repetition)
-		if matched:
-			if not matched.group(2):
-				repeat['min_every'] = 1
-			elif int(matched.group(2)) > 0 and int(matched.group(2)) < 60:
-				repeat['min_every'] = int(matched.group(2))
-			else:
-				Utils.debug_print("Error: invalid value '{}'. Expected 1-59 for minutes.")
-				sys.exit(1)
-		# check for repetition clauses like: "once every 3 hours"
-		matched = re.search(r"(once\s+)?every\s+(\d+\s+)?hour(s)?", repetition)
-		if matched:
-			if not matched.group(2):
-				repeat['hour_every'] = 1
-			elif int(matched.group(2)) > 0 and int(matched.group(2)) < 24:
-				repeat['hour_every'] = int(matched.group(2))
-			else:
-				Utils.debug_print("Error: invalid value '{}'. Expected 1-23 for hours.")
-				sys.exit(1)
-		# check for repetition clauses like: "once every 11 days"
-		matched = re.search(r"(once\s+)?every\s+(\d+\s+)?day(s)?", repetition)
-		if matched:
-			if not matched.group(2):
-				repeat['day_every'] = 1
-			elif int(matched.group(2)) > 0 and int(matched.group(2)) < 460:
-				repeat['day_every'] = int(matched.group(2))
-			else:
-				Utils.debug_print("Error: invalid value '{}'. Expected 1-31 for days.")
-				sys.exit(1)
-		# check for repetition clauses like: "once every 3 months"
-		matched = re.search(r"(once\s+)?every\s+(\d+\s+)?month(s)?", repetition)
-		if matched:
-			if not matched.group(2):
-				repeat['month_every'] = 1
-			elif int(matched.group(2)) > 0 and int(matched.group(2)) < 13:
-				repeat['month_every'] = int(matched.group(2))
-			else:
-				Utils.debug_print("Error: invalid value '{}'. Expected 1-12 for months.")
-				sys.exit(1)
-		# check for repetition clause: "everyday"
-		matched = re.match(r"\b(everyday|anyday)\b", repetition)
-		if matched:
-			repeat['day_every'] = 1
-		# check for repetition clause: "at midnight"
-		matched = re.match(r"(at\s*)?\bmidnight\b", repetition)
-		if matched:
-			repeat['min_on'] = 0
-			repeat['hour_on'] = 0
-		# check for repetition clauses like: "10:32 am"
-		matched = re.search(r"(on|at\s*)?\b(\d{1,2}):(\d{1,2})\b(\s*(am|pm))?", repetition)
-		if matched:
-			hour = int(matched.group(2))
-			minute = int(matched.group(3))
-			if matched.group(4):
-				if matched.group(5) == "pm":
-					if hour != 12:
-						hour += 12
-				else:
-					if hour == 12:
-						hour = 0
-			if hour < 24 and minute < 59:
-				repeat['min_on'] = minute
-				repeat['hour_on'] = hour
-			else:
-				Utils.debug_print("Error: invalid value for hour and/or minute.")
-				sys.exit(1)
-		# check for repetition clauses like: "19/05"
-		matched = re.search(r"(on\s*)?\b(\d{1,2})[/-](\d{1,2})\b", repetition)
-		if matched:
-			day = int(matched.group(2))
-			month = int(matched.group(3))
-			if month > 12 or month < 1:
-				Utils.debug_print("Error: invalid value for month (expected value: 1-12).")
-				sys.exit(1)
-			if month == 2 and (day > 29 or day < 1):
-				Utils.debug_print("Error: invalid value for day (expected value: 1-29).")
-				sys.exit(1)
-			if month in (4, 6, 9, 11) and (day > 30 or day < 1):
-				Utils.debug_print("Error: invalid value for day (expected value: 1-30).")
-				sys.exit(1)
-			if day > 31 or day < 1:
-				Utils.debug_print("Error: invalid value for day (expected value: 1-31).")
-				sys.exit(1)
-			else:
-				repeat['day_on'] = day
-				repeat['month_on'] = [month]
-		# check for repetition clauses like: "on monday"
-		m_repetition = repetition.replace(" and ", " on ").replace(",and ", " on ").replace(",", " on ")
-		matched = re.finditer(r"(on\s+)(monday|tuesday|wednesday|thursday|friday|saturday|sunday)s?", m_repetition)
-		weekdays = []
-		for match in matched:
-			weekdays.append(Utils.DAYS[match.group(2)])
-		if weekdays:
-			repeat['dow_on'] = weekdays
-		# check for repetition clauses like: "from monday to friday"
-		matched = re.search(r"(from\s+)(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\s+to\s+" +
-			r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday)", repetition)
-		if matched:
-			weekdays = []
-			weekdays.append(Utils.DAYS[matched.group(2)])
-			weekdays.append(Utils.DAYS[matched.group(3)])
-			if weekdays[0] < weekdays[1]:
-				repeat['dow_during'] = weekdays
-			else:
-				dows = []
-				i = int(weekdays[0])
-				while i != int(weekdays[1]):
-					dows.append(str(i))
-					i = (i + 1) % 7
-				dows.append(str(weekdays[1]))
-				repeat['dow_on'] = dows
-		# check for repetition clauses like: "on december"
-		m_repetition = repetition.replace(" and ", " in ").replace(",and ", " in ").replace(",", "in ")
-		matched = re.finditer(r"([oi]n\s+)(january|february|march|april|may|june|july|august|september|october|november|december)",
-			m_repetition)
-		matched_months = []
-		for match in matched:
-			matched_months.append(Utils.MONTHS[match.group(2)])
-		if matched_months:
-			repeat['month_on'] = matched_months
-		# check for repetition clauses like: "from june to august"
-		matched = re.search(r"(from\s+)(january|february|march|april|may|june|july|august|september|october|november|december)" +
-			r"\s+to\s+(january|february|march|april|may|june|july|august|september|october|november|december)", repetition)
-		if matched:
-			matched_months = []
-			matched_months.append(Utils.MONTHS[matched.group(2)])
-			matched_months.append(Utils.MONTHS[matched.group(3)])
-			if matched_months[0] < matched_months[1]:
-				repeat['month_during'] = matched_months
+	def tokenize(repetition):
+		"""split a lowercase repetition sentence into a list of (kind, value) tokens"""
+		tokens = []
+		for word in repetition.replace(",", " , ").split():
+			token = WORDS.get(word)
+			if token:
+				tokens.append(token)
+			elif word.isdigit():
+				tokens.append(("number", word))
+			elif word.isalpha():
+				tokens.append(("word", word))
 			else:
-				consec_months = []
-				i = int(matched_months[0])
-				while i != int(matched_months[1]):
-					consec_months.append(str(i))
-					i = (i % 12) + 1
-				consec_months.append(str(matched_months[1]))
-				repeat['month_on'] = consec_months
-		# check for repetition clauses like: "on 22 september"
-		matched = re.search(r"(on\s*)?\b(\d{1,2})\s+(january|february|march|april|may|june|july|august|september|october|november|december)",
-			repetition)
-		if matched:
-			day = int(matched.group(2))
-			month = int(Utils.MONTHS[matched.group(3)])
-			if month == 2 and not (1 <= day <= 29):
-				Utils.debug_print("Error: invalid value for day (expected value: 1-29).")
-				sys.exit(1)
-			elif month in (4, 6, 9, 11) and not (1 <= day <= 30):
-				Utils.debug_print("Error: invalid value for day (expected value: 1-30).")
-				sys.exit(1)
-			elif month in (1, 3, 5, 7, 8, 10, 12) and not (1 <= day <= 31):
-				Utils.debug_print("Error: invalid value for day (expected value: 1-31).")
-				sys.exit(1)
-			elif not (1 <= month <= 12):
-				Utils.debug_print("Error: invalid value for month (expected value: january..december).")
-				sys.exit(1)
+				tokens.extend(Repetition.split_word(word))
+		return tokens
+
+	@staticmethod
+	def split_word(word):
+		"""tokenize times, dates and words glued to punctuation"""
+		tokens = []
+		for matched in TOKEN_REX.finditer(word):
+			kind = matched.lastgroup
+			if kind == "time":
+				tokens.append(("time", (int(matched.group("hour")), int(matched.group("minute")),
+					matched.group("ampm"))))
+			elif kind == "date":
+				tokens.append(("date", (int(matched.group("day")), int(matched.group("month")))))
+			elif kind == "number":
+				tokens.append(("number", matched.group("number")))
+			elif kind == "word":
+				word = matched.group("word")
+				tokens.append(WORDS.get(word, ("word", word)))
 			else:
-				repeat['month_on'] = [month]
-				repeat['day_on'] = day
+				tokens.append(("comma", ","))
+		return tokens
+
+	@staticmethod
+	def check_day(day, month):
+		"""raise ValueError if the day does not exist in the month"""
+		if not 1 <= month <= 12:
+			raise ValueError("invalid value for month (expected value: 1-12).")
+		if month == 2 and not 1 <= day <= 29:
+			raise ValueError("invalid value for day (expected value: 1-29).")
+		if month in (4, 6, 9, 11) and not 1 <= day <= 30:
+			raise ValueError("invalid value for day (expected value: 1-30).")
+		if not 1 <= day <= 31:
+			raise ValueError("invalid value for day (expected value: 1-31).")
+
+	@staticmethod
+	def expand_range(first, last, size, base):
+		"""list the values of a cyclic range going forward from first to last"""
+		values = []
+		i = int(first)
+		while i != int(last):
+			values.append(str(i))
+			i = (i - base + 1) % size + base
+		values.append(str(last))
+		return values
+
+	@staticmethod
+	@Timing.timed("parse_repetition")
+	def parse_repetition(repetition):
+		"""parse and convert different types of repetition clauses (ValueError on invalid values)"""
+		hour, minute = Utils.get_time_now()
+		return Repetition.apply_defaults(Repetition.parse_schedule(repetition), hour, minute)
+
+	@staticmethod
+	def parse_schedule(repetition):
+		"""parse a repetition sentence without filling in the current time (cached)"""
+		key = repetition.lower()
+		schedule = Repetition.cache.get(key)
+		if schedule is None:
+			schedule = Repetition.parse_sentence(key)
+			Repetition.cache.put(key, schedule)
+		return schedule
+
+	@staticmethod
+	def apply_defaults(schedule, hour, minute):
+		"""return a copy of a parsed schedule, with hour and minute filling its empty fields"""
+		repeat = dict((key, list(value) if isinstance(value, list) else value)
+			for key, value in schedule.items())
 		# check if minute and hour fields are empty
 		if repeat:
-			hour, minute = Utils.get_time_now()
 			if not ("min_on" in repeat or "min_every" in repeat):
 				repeat['min_on'] = minute
 			if not ("hour_on" in repeat or "hour_every" in repeat or "min_every" in repeat):
 				repeat['hour_on'] = hour
 		return repeat
+
+	@staticmethod
+	def parse_sentence(repetition):
+		"""parse a lowercase repetition sentence into a schedule that does not depend on the time"""
+		tokens = Repetition.tokenize(repetition)
+		count = len(tokens)
+		# sentinels, so that looking ahead never goes past the end
+		tokens.extend(((None, None), (None, None)))
+		reboot = everyday = midnight = False
+		time = date = day_month = dow_range = month_range = None
+		every = {}
+		dows = []
+		months = []
+		previous = None
+		# single pass over the tokens, collecting the first occurrence of every clause
+		for i, (kind, value) in enumerate(tokens[:count]):
+			if kind == "word" and value in KEYWORDS:
+				following = tokens[i + 1]
+				if value in ("at", "every") and following[1] in ("boot", "reboot"):
+					# clauses like: "every reboot"
+					reboot = True
+				elif value == "every":
+					# clauses like: "once every 21 minutes"
+					unit, number = following[1], None
+					if following[0] == "number":
+						unit, number = tokens[i + 2][1], following[1]
+					if unit in EVERY_LIMITS and unit not in every:
+						limit, message = EVERY_LIMITS[unit]
+						if number is not None and not 0 < int(number) <= limit:
+							raise ValueError("invalid value '{}'. {}".format(number, message))
+						every[unit] = int(number) if number is not None else 1
+				elif value in ("everyday", "anyday"):
+					everyday = True
+				elif value == "midnight":
+					midnight = True
+				elif value == "from" and i + 3 < count and tokens[i + 2] == ("word", "to") and \
+						following[0] == tokens[i + 3][0]:
+					# clauses like: "from monday to friday" or "from june to august"
+					if following[0] == "dow" and dow_range is None:
+						dow_range = (following[1], tokens[i + 3][1])
+					elif following[0] == "month" and month_range is None:
+						month_range = (following[1], tokens[i + 3][1])
+			elif kind == "time" and time is None:
+				# clauses like: "10:32 am"
+				hour, minute, ampm = value
+				if not ampm and tokens[i + 1][1] in ("am", "pm"):
+					ampm = tokens[i + 1][1]
+				if ampm == "pm" and hour != 12:
+					hour += 12
+				elif ampm == "am" and hour == 12:
+					hour = 0
+				if hour > 23 or minute > 59:
+					raise ValueError("invalid value for hour and/or minute.")
+				time = (hour, minute)
+			elif kind == "date" and date is None:
+				# clauses like: "19/05"
+				Repetition.check_day(*value)
+				date = value
+			elif kind == "number" and tokens[i + 1][0] == "month" and day_month is None and len(value) <= 2:
+				# clauses like: "on 22 september"
+				day_month = (int(value), int(tokens[i + 1][1]))
+				Repetition.check_day(*day_month)
+			elif kind == "dow" and previous in DOW_LIST_PREFIXES:
+				# clauses like: "on monday"
+				dows.append(value)
+			elif kind == "month" and previous in MONTH_LIST_PREFIXES:
+				# clauses like: "on december"
+				months.append(value)
+			previous = value
+		# build the repeat dict, later clauses taking precedence over earlier ones
+		repeat = {}
+		if reboot:
+			repeat['reboot'] = True
+		for unit, key in EVERY_KEYS:
+			if unit in every:
+				repeat[key] = every[unit]
+		if everyday:
+			repeat['day_every'] = 1
+		if midnight:
+			repeat['min_on'] = 0
+			repeat['hour_on'] = 0
+		if time:
+			repeat['hour_on'], repeat['min_on'] = time
+		if date:
+			repeat['day_on'] = date[0]
+			repeat['month_on'] = [date[1]]
+		if dows:
+			repeat['dow_on'] = dows
+		if dow_range:
+			if int(dow_range[0]) < int(dow_range[1]):
+				repeat['dow_during'] = list(dow_range)
+			else:
+				repeat['dow_on'] = Repetition.expand_range(dow_range[0], dow_range[1], 7, 0)
+		if months:
+			repeat['month_on'] = months
+		if month_range:
+			if int(month_range[0]) < int(month_range[1]):
+				repeat['month_during'] = list(month_range)
+			else:
+				repeat['month_on'] = Repetition.expand_range(month_range[0], month_range[1], 12, 1)
+		if day_month:
+			repeat['day_on'] = day_month[0]
+			repeat['month_on'] = [day_month[1]]
+		return repeat
@@ -0,0 +1,271 @@
+import os
+import sys
+import time
+import errno
+import hashlib
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+try:
+	from timing import clock
+	from namespace import Namespace
+except ImportError:
+	from supercron.timing import clock
+	from supercron.namespace import Namespace
+
+# runs every time cron starts a wrapped job: only modules that load fast are imported here
+
+
+class RunLog(object):
+	"""class for the append-only log of the runs of wrapped jobs, one line of tab-separated fields per run"""
+
+	FIELDS = ("name", "started", "wall", "cpu", "status", "overlap")
+	# status of the runs skipped by the overlap policy of their job
+	SKIPPED = -1
+
+	@staticmethod
+	def directory():
+		"""return the state directory of SuperCron, following the XDG base directory specification"""
+		state_home = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+		return os.path.join(state_home, "supercron")
+
+	@staticmethod
+	def path():
+		return os.path.join(RunLog.directory(), "runs.log")
+
+	@staticmethod
+	def make_directory():
+		directory = RunLog.directory()
+		try:
+			os.makedirs(directory, 0o700)
+		except OSError:
+			# already there, possibly created by a concurrent run
+			if not os.path.isdir(directory):
+				raise
+		return directory
+
+	@staticmethod
+	def append(name, started, wall, cpu, status, overlap):
+		"""append a run to the log with a single write, which concurrent runs cannot interleave"""
+		line = "{}\t{:.3f}\t{:.6f}\t{:.6f}\t{}\t{}\n".format(name.replace("\t", " ").replace("\n", " "), started,
+			wall, cpu, status, "-" if overlap is None else int(overlap))
+		RunLog.make_directory()
+		fd = os.open(RunLog.path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+		try:
+			os.write(fd, line.encode("utf-8"))
+		finally:
+			os.close(fd)
+
+	@staticmethod
+	def parse(line):
+		"""return the values of FIELDS of a line of the log (overlap None if unknown), or None if it is invalid"""
+		fields = line.decode("utf-8", "replace").rstrip("\n").split("\t")
+		if len(fields) != len(RunLog.FIELDS):
+			# like a line cut short by a full disk
+			return None
+		try:
+			return (fields[0], float(fields[1]), float(fields[2]), float(fields[3]), int(fields[4]),
+				None if fields[5] == "-" else fields[5] == "1")
+		except ValueError:
+			return None
+
+	@staticmethod
+	def read(name=None):
+		"""yield the runs of the log (of the job name if given) as Namespaces, oldest first"""
+		try:
+			f = open(RunLog.path(), "rb")
+		except (IOError, OSError):
+			return
+		with f:
+			for line in f:
+				run = RunLog.parse(line)
+				if run is not None and (name is None or run[0] == name):
+					yield Namespace(zip(RunLog.FIELDS, run))
+
+
+class JobRunner(object):
+	"""class for running the command of a wrapped job ('supercron exec NAME -- COMMAND') and logging the run"""
+
+	USAGE = "usage: supercron exec [--policy POLICY] NAME -- COMMAND [ARGUMENT ...]"
+
+	@staticmethod
+	def executable():
+		"""return the command line starting SuperCron, for the crontab lines of wrapped jobs"""
+		script = os.path.abspath(sys.argv[0])
+		if os.path.basename(script) == "supercron" and os.access(script, os.X_OK):
+			return JobRunner.quote(script)
+		return "{} -m supercron.supercron".format(JobRunner.quote(sys.executable))
+
+	@staticmethod
+	def quote(word):
+		"""quote word for /bin/sh"""
+		if word and all(c.isalnum() or c in "@%_+=:,./-" for c in word):
+			return word
+		return "'" + word.replace("'", "'\"'\"'") + "'"
+
+	@staticmethod
+	def wrap(name, command, policy=None):
+		"""return the crontab command running command through the wrapper, as job name with an overlap policy"""
+		return "{} exec {}{} -- {}".format(JobRunner.executable(), "--policy {} ".format(policy) if policy else "",
+			JobRunner.quote(name), JobRunner.quote(command))
+
+	@staticmethod
+	def unwrap(command):
+		"""return the job name, policy and command of a crontab command written by wrap, or None"""
+		import shlex
+		start = command.find(" exec ")
+		if start == -1:
+			return None
+		try:
+			words = shlex.split(command[start + len(" exec "):])
+		except ValueError:
+			return None
+		policy = None
+		if words[:1] == ["--policy"] and len(words) > 1:
+			policy, words = words[1], words[2:]
+		if len(words) < 3 or words[1] != "--":
+			return None
+		inner = words[2] if len(words) == 3 else " ".join(JobRunner.quote(word) for word in words[2:])
+		return words[0], policy, inner
+
+	@staticmethod
+	def slots(policy):
+		"""return the number of concurrent runs a policy allows, and whether runs beyond it wait (None if invalid)"""
+		if policy == "skip":
+			return 1, False
+		if policy == "queue":
+			return 1, True
+		kind, _, count = (policy or "").partition(":")
+		if kind == "limit" and count.isdigit() and int(count) > 0:
+			return int(count), False
+		return None
+
+	@staticmethod
+	def lock_file(name, suffix):
+		"""return an open lock file of job name, which the command does not inherit"""
+		path = os.path.join(RunLog.make_directory(), "{}.{}".format(
+			hashlib.sha1(name.encode("utf-8")).hexdigest()[:16], suffix))
+		fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+		# the locks are released by the kernel when the wrapper exits, even if it is killed
+		fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+		return fd
+
+	@staticmethod
+	def acquire(name, policy):
+		"""return the open lock file of a free run slot of job name, or None when the run is skipped
+
+		Every slot is a lock file tried once without waiting, so stale slots cannot exist: a slot
+		is free as soon as the wrapper holding it is gone. The slots are tried from one picked by the
+		process id, so concurrent runs usually get a free slot on the first try; all of them are tried
+		only when the runs are near their limit. With policy queue, the run waits for the slot.
+		"""
+		count, wait = JobRunner.slots(policy)
+		start = os.getpid() % count
+		for slot in range(count):
+			fd = JobRunner.lock_file(name, "slot{}".format((start + slot) % count))
+			try:
+				fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+				return fd
+			except (IOError, OSError):
+				os.close(fd)
+		if not wait:
+			return None
+		fd = JobRunner.lock_file(name, "slot0")
+		fcntl.flock(fd, fcntl.LOCK_EX)
+		return fd
+
+	@staticmethod
+	def running(name):
+		"""return the open lock file of the runs of job name and whether another run holds it (None if unknown)"""
+		if fcntl is None:
+			return None, None
+		fd = JobRunner.lock_file(name, "lock")
+		try:
+			fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+			overlap = False
+		except (IOError, OSError):
+			overlap = True
+		# every run holds it shared, so the next one knows this one is still going
+		fcntl.flock(fd, fcntl.LOCK_SH)
+		return fd, overlap
+
+	@staticmethod
+	def run(name, argv, policy=None):
+		"""run argv (a single shell command line if alone), log the run of job name and return its exit status
+
+		With an overlap policy (skip, queue or limit:N), a run beyond the concurrent runs it allows is
+		logged as SKIPPED and returns 0, or waits for the previous run to finish with queue.
+		"""
+		try:
+			fd, overlap = JobRunner.running(name)
+		except (IOError, OSError):
+			# the job runs even if its runs cannot be tracked
+			fd, overlap = None, None
+		slot = None
+		if policy and fcntl is not None:
+			try:
+				slot = JobRunner.acquire(name, policy)
+				skipped = slot is None
+			except (IOError, OSError) as e:
+				sys.stderr.write("supercron exec: cannot apply the policy of '{}' ({}).\n".format(name, e))
+				skipped = False
+			if skipped:
+				try:
+					RunLog.append(name, time.time(), 0.0, 0.0, RunLog.SKIPPED, overlap)
+				except (IOError, OSError):
+					pass
+				if fd is not None:
+					os.close(fd)
+				return 0
+		if len(argv) == 1:
+			argv = ["/bin/sh", "-c", argv[0]]
+		started = time.time()
+		start = clock()
+		pid = os.fork()
+		if pid == 0:
+			try:
+				os.execvp(argv[0], argv)
+			except OSError as e:
+				sys.stderr.write("supercron exec: {}: {}\n".format(argv[0], e.strerror))
+			os._exit(127)
+		# the rusage of the child is its own CPU time, and that of the processes it waited for
+		while True:
+			try:
+				_, wait_status, usage = os.wait4(pid, 0)
+				break
+			except OSError as e:
+				# interrupted by a signal
+				if e.errno != errno.EINTR:
+					raise
+		wall = clock() - start
+		if os.WIFSIGNALED(wait_status):
+			status = 128 + os.WTERMSIG(wait_status)
+		else:
+			status = os.WEXITSTATUS(wait_status)
+		try:
+			RunLog.append(name, started, wall, usage.ru_utime + usage.ru_stime, status, overlap)
+		except (IOError, OSError) as e:
+			# the job ran anyway, its status matters more than its log
+			sys.stderr.write("supercron exec: cannot log the run of '{}' ({}).\n".format(name, e))
+		for lock in (fd, slot):
+			if lock is not None:
+				os.close(lock)
+		return status
+
+	@staticmethod
+	def main(argv):
+		"""run the arguments of 'supercron exec' and return the exit status"""
+		policy = None
+		if argv[:1] == ["--policy"] and len(argv) > 1:
+			policy, argv = argv[1], argv[2:]
+			if JobRunner.slots(policy) is None:
+				# the job runs anyway
+				sys.stderr.write("supercron exec: invalid policy '{}' ignored.\n".format(policy))
+				policy = None
+		if len(argv) < 3 or argv[1] != "--":
+			sys.stderr.write(JobRunner.USAGE + "\n")
+			return 2
+		return JobRunner.run(argv[0], argv[2:], policy)
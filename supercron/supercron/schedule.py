@@ -0,0 +1,152 @@
+import calendar
+from datetime import datetime, timedelta
+
+# (lowest, highest) values of the five slices of a job: minute, hour, day of month, month, day of week
+BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+# number of years after which the calendar repeats itself (leap years and days of week)
+HORIZON_YEARS = 28
+
+
+def first_bit(mask, start):
+	"""return the lowest set bit of mask that is >= start, or -1"""
+	mask >>= start
+	if not mask:
+		return -1
+	return start + (mask & -mask).bit_length() - 1
+
+
+class Schedule(object):
+	"""class for computing the run times of a job from bitsets of its allowed values"""
+
+	__slots__ = ("minutes", "hours", "days", "months", "dows", "any_day", "any_dow")
+
+	def __init__(self, slices, fields=None):
+		"""build the schedule of slices, fields being their texts in the crontab (rendered from slices if None)"""
+		masks = [Schedule.mask(cron_slice, low, high) for cron_slice, (low, high) in zip(slices, BOUNDS)]
+		self.minutes, self.hours, self.days, self.months, dows = masks
+		# day 7 is another sunday
+		self.dows = (dows | dows >> 7) & 0x7f
+		# like cron: a day field starting with '*' (including '*/N') is a star, and with no star in
+		# the days of month and days of week, either of them is enough; otherwise both must match
+		fields = fields or [str(cron_slice) for cron_slice in slices]
+		self.any_day = fields[2].startswith("*")
+		self.any_dow = fields[4].startswith("*")
+
+	@staticmethod
+	def of(job):
+		"""return the schedule of a job, or None if it does not run at given times (@reboot)"""
+		if job.slices.special == "@reboot":
+			return None
+		# python-crontab renders a day field covering all days (like 1-31) as '*', so the fields are
+		# taken from the line as read, unless the job was changed and is written as rendered
+		line = getattr(job, "_line", None)
+		fields = line.lstrip("#").split()[:5] if line else None
+		if not fields or len(fields) < 5 or fields[0].startswith("@"):
+			fields = None
+		return Schedule(job.slices, fields)
+
+	@staticmethod
+	def full_mask(low, high):
+		return ((1 << (high - low + 1)) - 1) << low
+
+	@staticmethod
+	def mask(cron_slice, low, high):
+		"""return the bitset of the values allowed by a slice"""
+		if not cron_slice.parts:
+			return Schedule.full_mask(low, high)
+		mask = 0
+		for part in cron_slice.parts:
+			if hasattr(part, "vfrom"):
+				first, last = sorted((int(part.vfrom), int(part.vto)))
+				for value in range(first, last + 1, int(part.seq)):
+					mask |= 1 << value
+			else:
+				mask |= 1 << int(part)
+		return mask
+
+	def key(self):
+		return (self.minutes, self.hours, self.days, self.months, self.dows, self.any_day, self.any_dow)
+
+	def day_mask(self, year, month):
+		"""return the bitset of the days of a month the job runs on"""
+		first_dow, length = calendar.monthrange(year, month)
+		days = self.days & Schedule.full_mask(1, length)
+		if self.dows == 0x7f and (self.any_day or self.any_dow):
+			# every day of the week, and both fields must match
+			return days
+		# days of week of the month, from the one of its first day (cron counts from sunday)
+		first_dow = (first_dow + 1) % 7
+		week = 0
+		for offset in range(7):
+			if self.dows >> ((first_dow + offset) % 7) & 1:
+				week |= 1 << offset
+		dows = (week | week << 7 | week << 14 | week << 21 | week << 28) << 1 & Schedule.full_mask(1, length)
+		if self.any_day or self.any_dow:
+			return days & dows
+		return days | dows
+
+	def next_run(self, start, end=None):
+		"""return the first run time at or after start (rounded up to the minute) and before end, or None"""
+		if start.second or start.microsecond:
+			start = start.replace(second=0, microsecond=0) + timedelta(minutes=1)
+		year, month, day, hour, minute = start.year, start.month, start.day, start.hour, start.minute
+		last = (end.year, end.month) if end else (start.year + HORIZON_YEARS, 1)
+		# each field is moved to its next allowed value, resetting the smaller fields when it moves
+		while (year, month) <= last:
+			found = first_bit(self.months, month)
+			if found == -1:
+				year, month, day, hour, minute = year + 1, 1, 1, 0, 0
+				continue
+			if found != month:
+				month, day, hour, minute = found, 1, 0, 0
+			found = first_bit(self.day_mask(year, month), day)
+			if found == -1:
+				year, month, day, hour, minute = year + (month == 12), month % 12 + 1, 1, 0, 0
+				continue
+			if found != day:
+				day, hour, minute = found, 0, 0
+			found = first_bit(self.hours, hour)
+			if found == -1:
+				day, hour, minute = day + 1, 0, 0
+				continue
+			if found != hour:
+				hour, minute = found, 0
+			found = first_bit(self.minutes, minute)
+			if found == -1:
+				hour, minute = hour + 1, 0
+				continue
+			run = datetime(year, month, day, hour, found)
+			return run if end is None or run < end else None
+		return None
+
+	def next_runs(self, start, count):
+		"""return the first count run times at or after start"""
+		runs = []
+		run = self.next_run(start)
+		while run is not None and len(runs) < count:
+			runs.append(run)
+			run = self.next_run(run + timedelta(minutes=1))
+		return runs
+
+
+class ScheduleIndex(object):
+	"""class for grouping the jobs of a crontab by schedule, so each distinct schedule is computed once"""
+
+	def __init__(self, jobs):
+		# schedule key -> (schedule, jobs)
+		self.groups = {}
+		for job in jobs:
+			schedule = Schedule.of(job)
+			if schedule is not None:
+				self.groups.setdefault(schedule.key(), (schedule, []))[1].append(job)
+
+	def runs_within(self, start, end):
+		"""return the (first run time, job) pairs of the jobs running in [start, end), sorted by time"""
+		runs = []
+		for schedule, jobs in self.groups.values():
+			run = schedule.next_run(start, end)
+			if run is not None:
+				runs.extend((run, job) for job in jobs)
+		runs.sort(key=lambda run: run[0])
+		return runs
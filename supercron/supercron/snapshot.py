@@ -0,0 +1,139 @@
+import os
+import sys
+import marshal
+import tempfile
+import hashlib
+
+import crontab
+from crontab import CronSlices, CronSlice, CronRange, CronValue, S_INFO
+
+# attributes of the five slices of a job, as CronSlice sets them from S_INFO
+SLICE_ATTRIBUTES = [dict((key, info.get(key)) for key in ("min", "max", "name", "enum")) for info in S_INFO]
+
+
+class Snapshot:
+	"""class for caching parsed crontabs on disk, keyed by a hash of their content"""
+
+	# bumped whenever the encoding below changes
+	FORMAT = 2
+
+	@staticmethod
+	def directory():
+		"""return the cache directory, following the XDG base directory specification"""
+		cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+		return os.path.join(cache_home, "supercron")
+
+	@staticmethod
+	def path(user):
+		# marshal data is only readable by the Python version that wrote it
+		return os.path.join(Snapshot.directory(), "{}.py{}{}.snapshot".format(
+			user, sys.version_info[0], sys.version_info[1]))
+
+	@staticmethod
+	def digest(content):
+		"""return the hash of the raw content of a crontab (text is encoded, buffers are hashed as they are)"""
+		if isinstance(content, type(u"")):
+			content = content.encode("utf-8")
+		return hashlib.sha1(content).hexdigest()
+
+	@staticmethod
+	def load(user, digest):
+		"""return the encoded lines cached for this digest, or None"""
+		try:
+			# reading the whole file first is much faster than unmarshalling from it
+			with open(Snapshot.path(user), "rb") as snapshot:
+				data = marshal.loads(snapshot.read())
+		except (IOError, OSError, EOFError, ValueError, TypeError):
+			return None
+		if not isinstance(data, tuple) or data[:3] != (Snapshot.FORMAT, crontab.__version__, digest):
+			return None
+		return data[3]
+
+	@staticmethod
+	def save(user, digest, lines):
+		"""cache the lines of a crontab under this digest, ignoring any I/O error"""
+		data = (Snapshot.FORMAT, crontab.__version__, digest, [Snapshot.encode(line) for line in lines])
+		path = Snapshot.path(user)
+		temp = None
+		try:
+			if not os.path.isdir(os.path.dirname(path)):
+				os.makedirs(os.path.dirname(path), 0o700)
+			# written aside under a name of its own, then renamed, so a reader never sees half a
+			# snapshot and concurrent writers (processes or fan-out threads) never share a file
+			fd, temp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", dir=os.path.dirname(path))
+			with os.fdopen(fd, "wb") as snapshot:
+				marshal.dump(data, snapshot)
+			os.rename(temp, path)
+		except (IOError, OSError):
+			if temp is not None and os.path.exists(temp):
+				os.unlink(temp)
+
+	@staticmethod
+	def encode(line):
+		"""encode a crontab line (a job or a plain string) into builtin types"""
+		if not hasattr(line, "slices"):
+			return line
+		slices = line.slices
+		parts = tuple(tuple(Snapshot.encode_value(part) for part in cron_slice.parts) for cron_slice in slices)
+		return (line.enabled, slices.special, parts, line.command, line.comment, line.user,
+			getattr(line, "_line", None))
+
+	@staticmethod
+	def encode_value(value):
+		if isinstance(value, CronRange):
+			return ("r", Snapshot.encode_value(value.vfrom), Snapshot.encode_value(value.vto),
+				int(value.seq))
+		if isinstance(value, CronValue):
+			return ("e", value.enum)
+		return int(value)
+
+	@staticmethod
+	def decode_lines(lines, item_class, cron):
+		"""rebuild the lines of a crontab from their encoded form, without parsing them"""
+		# values and ranges are replaced, never modified, when a slice changes,
+		# so the jobs can share the ones decoded from the same encoded part
+		values = {}
+		for data in lines:
+			yield Snapshot.decode(data, item_class, cron, values)
+
+	@staticmethod
+	def decode(data, item_class, cron, values):
+		if not isinstance(data, tuple):
+			return data
+		enabled, special, parts, command, comment, user, raw_line = data
+		# the constructors would build and parse default slices only to have them replaced
+		item = item_class.__new__(item_class)
+		item.__dict__.update(cron=cron, user=user, valid=True, enabled=enabled, special=False,
+			command=command, _log=None)
+		item.comment = comment
+		item._line = raw_line
+		item.slices = slices = CronSlices.__new__(CronSlices)
+		slices.special = special
+		for position, slice_parts in enumerate(parts):
+			cron_slice = CronSlice.__new__(CronSlice)
+			cron_slice.__dict__.update(SLICE_ATTRIBUTES[position])
+			cron_slice.parts = decoded = []
+			for part in slice_parts:
+				if part.__class__ is not tuple:
+					decoded.append(part)
+					continue
+				value = values.get((position, part))
+				if value is None:
+					value = values[(position, part)] = Snapshot.decode_value(part, cron_slice)
+				decoded.append(value)
+			slices.append(cron_slice)
+		return item
+
+	@staticmethod
+	def decode_value(value, cron_slice):
+		if not isinstance(value, tuple):
+			return value
+		if value[0] == "e":
+			return CronValue(value[1], cron_slice.enum)
+		cron_range = CronRange.__new__(CronRange)
+		cron_range.slice = cron_slice
+		cron_range.cron = None
+		cron_range.vfrom = Snapshot.decode_value(value[1], cron_slice)
+		cron_range.vto = Snapshot.decode_value(value[2], cron_slice)
+		cron_range.seq = value[3]
+		return cron_range
@@ -0,0 +1,226 @@
+import os
+import stat
+import mmap
+import errno
+import tempfile
+import subprocess as sp
+from contextlib import contextmanager
+
+try:
+	import pwd
+except ImportError:
+	pwd = None
+
+try:
+	from snapshot import Snapshot
+	from timing import Timing
+except ImportError:
+	from supercron.snapshot import Snapshot
+	from supercron.timing import Timing
+
+
+class Storage(object):
+	"""interface of the places a crontab is read from and written to, as raw bytes
+
+	key names the crontab in the lock file of its writes, and in the snapshot cache when snapshots
+	is True; storages without a key (in memory) have no check for changes made by others.
+	"""
+
+	key = None
+	# whether the jobs are loaded from a snapshot of the parsed crontab, saved again on every write
+	snapshots = False
+
+	def read(self):
+		"""return the content of the crontab, empty if there is none"""
+		raise NotImplementedError
+
+	def write(self, content):
+		raise NotImplementedError
+
+	def digest(self):
+		"""return the hash of the content of the crontab, as Snapshot.digest does"""
+		return Snapshot.digest(self.read())
+
+	def __str__(self):
+		return self.key or self.__class__.__name__
+
+	@staticmethod
+	def parse(spec):
+		"""return the storage described by spec: crontab[:USER], file:PATH or spool:DIRECTORY:NAME"""
+		kind, _, location = spec.partition(":")
+		if kind == "crontab":
+			return CommandStorage(location or True)
+		if kind == "file" and location:
+			return FileStorage(location)
+		if kind == "spool" and ":" in location:
+			directory, _, name = location.rpartition(":")
+			return SpoolStorage(directory, name)
+		raise ValueError("invalid storage '{}' (expected crontab[:USER], file:PATH or spool:DIRECTORY:NAME).".format(
+			spec))
+
+
+class CommandStorage(Storage):
+	"""user's crontab, read and written by the crontab command"""
+
+	# read by every command line, which the snapshot spares parsing it
+	snapshots = True
+
+	def __init__(self, user=True, command="crontab"):
+		self.user = user
+		self.command = command
+		if user is True:
+			self.key = pwd.getpwuid(os.getuid())[0] if pwd else "user"
+		else:
+			self.key = str(user)
+		if command != "crontab":
+			# e.g. "ssh HOST crontab": the same user elsewhere is another crontab
+			self.key += "-" + Snapshot.digest(command)[:8]
+
+	@staticmethod
+	def command_line(cmd, *args, **flags):
+		"""return the arguments of a command, with its flags turned into options"""
+		l = tuple(cmd.split(' '))
+		for (k,v) in flags.items():
+			if v is not None:
+				l += len(k)==1 and ("-%s" % (k,), str(v)) or ("--%s=%s" % (k,v),)
+		l += tuple(args)
+		return tuple(a for a in l if a)
+
+	def __str__(self):
+		# the name of the user, or the spec of the crontab of another command
+		if self.command == "crontab":
+			return self.key
+		return "{} ({})".format(self.key.rpartition("-")[0], self.command)
+
+	def user_opt(self):
+		# like python-crontab, the current user is not named (Fedora and Mac refuse it)
+		if self.user is not True:
+			return {"u": self.user}
+		return {}
+
+	def run(self, *args):
+		"""run the crontab command and return its output, raising IOError if it failed"""
+		process = sp.Popen(self.command_line(self.command, *args, **self.user_opt()), stdout=sp.PIPE, stderr=sp.PIPE)
+		out, err = process.communicate()
+		if process.returncode and "no crontab for" in str(err):
+			return b""
+		if process.returncode:
+			raise IOError("crontab %s %s: %s" % (" ".join(args), self.key, err.decode("utf-8", "replace").strip()))
+		return out
+
+	def read(self):
+		with Timing.span("crontab -l"):
+			return self.run("-l")
+
+	@staticmethod
+	@contextmanager
+	def content_file(content):
+		"""yield the path of a temporary file holding content, to install it with 'crontab FILE'"""
+		# a file rather than stdin, which not every crontab command reads
+		fd, path = tempfile.mkstemp(prefix="supercron-")
+		try:
+			with os.fdopen(fd, "wb") as f:
+				f.write(content)
+			yield path
+		finally:
+			os.unlink(path)
+
+	def write(self, content):
+		with CommandStorage.content_file(content) as path:
+			with Timing.span("crontab -"):
+				self.run(path)
+
+
+class FileStorage(Storage):
+	"""crontab file, like a fragment of /etc/cron.d, read in bulk and replaced atomically
+
+	Files have no snapshot: saving one on every write costs more than parsing the file on every read.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.key = "file-" + Snapshot.digest(os.path.abspath(path))[:16]
+
+	def __str__(self):
+		return "file:" + self.path
+
+	def read(self):
+		with Timing.span("read file"):
+			try:
+				with open(self.path, "rb") as f:
+					return f.read()
+			except (IOError, OSError) as e:
+				if e.errno == errno.ENOENT:
+					return b""
+				raise
+
+	def digest(self):
+		# hashed from the mapped file, without copying it
+		try:
+			f = open(self.path, "rb")
+		except (IOError, OSError) as e:
+			if e.errno == errno.ENOENT:
+				return Snapshot.digest(b"")
+			raise
+		with f:
+			if not os.fstat(f.fileno()).st_size:
+				# empty files cannot be mapped
+				return Snapshot.digest(b"")
+			mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			try:
+				return Snapshot.digest(mapped)
+			finally:
+				mapped.close()
+
+	def write(self, content):
+		"""write content aside, then rename it over the file, so cron never reads half a crontab"""
+		directory, name = os.path.split(os.path.abspath(self.path))
+		try:
+			mode = stat.S_IMODE(os.stat(self.path).st_mode)
+		except OSError:
+			mode = 0o644
+		with Timing.span("write file"):
+			fd, path = tempfile.mkstemp(prefix="." + name + ".", dir=directory)
+			try:
+				with os.fdopen(fd, "wb") as f:
+					f.write(content)
+					f.flush()
+					os.fsync(f.fileno())
+				os.chmod(path, mode)
+				os.rename(path, self.path)
+			except Exception:
+				os.unlink(path)
+				raise
+
+
+class SpoolStorage(FileStorage):
+	"""crontab named name in a spool directory holding one crontab per user or service"""
+
+	def __init__(self, directory, name):
+		if not name or os.sep in name or name.startswith("."):
+			raise ValueError("invalid crontab name '{}'.".format(name))
+		self.directory = directory
+		self.name = name
+		super(SpoolStorage, self).__init__(os.path.join(directory, name))
+
+	def __str__(self):
+		return "spool:{}:{}".format(self.directory, self.name)
+
+	@staticmethod
+	def names(directory):
+		"""return the names of the crontabs of a spool directory (hidden files are being written)"""
+		return sorted(name for name in os.listdir(directory)
+			if not name.startswith(".") and os.path.isfile(os.path.join(directory, name)))
+
+
+class MemoryStorage(Storage):
+	"""crontab held in a string, for tests and sandboxes"""
+
+	def __init__(self, content=""):
+		self.content = content
+
+	def read(self):
+		return self.content.encode("utf-8")
+
+	def write(self, content):
+		self.content = content.decode("utf-8")
@@ -1,18 +1,49 @@
 #!/usr/bin/env python
 
+import os
 import sys
+import time
 import argparse
+from datetime import datetime, timedelta
+from contextlib import contextmanager
 
 try:
+	from timing import Timing, STARTED, clock
+	from lazy import LazyImport
 	from namespace import Namespace
 	from utils import Utils
-	from repetition_parsing import Repetition
-	from trigger import TCronTab
+	from client import DaemonClient
 except ImportError:
+	from supercron.timing import Timing, STARTED, clock
+	from supercron.lazy import LazyImport
 	from supercron.namespace import Namespace
 	from supercron.utils import Utils
-	from supercron.repetition_parsing import Repetition
-	from supercron.trigger import TCronTab
+	from supercron.client import DaemonClient
+
+# imported by the subcommands that use them, so that the others start faster
+Repetition = LazyImport("repetition_parsing", "Repetition")
+TCronTab = LazyImport("trigger", "TCronTab")
+Daemon = LazyImport("daemon", "Daemon")
+Schedule = LazyImport("schedule", "Schedule")
+ScheduleIndex = LazyImport("schedule", "ScheduleIndex")
+LoadProfile = LazyImport("loadprofile", "LoadProfile")
+Occupancy = LazyImport("placement", "Occupancy")
+Storage = LazyImport("storage", "Storage")
+FanOut = LazyImport("fanout", "FanOut")
+JobRunner = LazyImport("runner", "JobRunner")
+RunHistory = LazyImport("history", "RunHistory")
+DesiredJobs = LazyImport("desired", "DesiredJobs")
+TriggerExpression = LazyImport("expression", "TriggerExpression")
+
+# time the modules of SuperCron were all imported
+IMPORTED = clock()
+
+
+class LineParser(argparse.ArgumentParser):
+	"""argument parser that raises ValueError instead of exiting on errors"""
+
+	def error(self, message):
+		raise ValueError(message)
 
 
 class SuperCron:
@@ -20,11 +51,89 @@ class SuperCron:
 
 	VERSION = "0.4.0"
 	TOBEDELETED = "@tobedeleted"
+	SUBCOMMANDS = ("add", "rename", "delete", "enable", "disable", "trigger", "search", "next", "profile", "clear",
+		"policy", "batch", "daemon", "exec", "history", "apply")
+	# crontab shared by all operations while a transaction is running
+	crontab = None
+	# parser reused by all the command lines run by the daemon
+	parser = None
+	# where crontabs are read from and written to (option --storage), None for user's crontab
+	storage = None
+	SEARCH_FORMATS = ("table", "json", "jsonl", "csv")
+	# fields of the records written by search in the machine-readable formats
+	SEARCH_FIELDS = ("name", "enabled", "trigger", "policy", "slices", "command", "next_run")
+	# crontabs a command line is applied to in parallel (options --users and --user-file), None for one crontab
+	storages = None
+	workers = None
+	FAN_OUT_MODE = "with --users or --user-file"
+
+	@staticmethod
+	def new_crontab():
+		"""load the crontab of the storage, or else user's crontab"""
+		if SuperCron.storage is not None:
+			return TCronTab(storage=SuperCron.storage)
+		return TCronTab(user=True)
+
+	@staticmethod
+	def open_crontab():
+		"""return the crontab of the running transaction, or load the crontab"""
+		if SuperCron.crontab is not None:
+			return SuperCron.crontab
+		return SuperCron.new_crontab()
+
+	@staticmethod
+	@contextmanager
+	def transaction():
+		"""apply all operations inside the block to one crontab and write it once"""
+		outer = SuperCron.crontab
+		# the crontab held by the daemon is reused, and written when the daemon flushes it
+		cron = outer if outer is not None else SuperCron.new_crontab()
+		SuperCron.crontab = cron
+		try:
+			with cron.transaction():
+				yield cron
+		finally:
+			SuperCron.crontab = outer
+
+	@staticmethod
+	def save_crontab(cron, args):
+		"""write cron where it was read from, or only show the trigger propagation on a dry run"""
+		if "dry_run" in args and args.dry_run:
+			SuperCron.print_propagation(cron)
+			Utils.debug_print("Dry run: user's crontab has not been modified.")
+		else:
+			cron.write()
+
+	@staticmethod
+	def print_propagation(cron):
+		"""print the jobs switched by triggers, in propagation order, and the cycles found"""
+		if not cron.propagation:
+			Utils.debug_print("No trigger was activated.")
+		for depth, name, state, job in cron.propagation:
+			Utils.debug_print("{}{}. job '{}' turned {} ({})".format("  " * depth, depth, job.get_name(),
+				"ON" if job.is_enabled() else "OFF", job.repr_trigger()))
+		for cycle in cron.cycles:
+			Utils.debug_print("Trigger cycle stopped: {}".format(" -> ".join(
+				"{} is {}".format(name, state) for name, state in cycle)))
 
 	@staticmethod
 	def parse_arguments():
 		"""parse the arguments coming from running the script"""
-		parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+		# the global options take no value, so the first other argument is the subcommand
+		command = next((arg for arg in sys.argv[1:] if not arg.startswith("-")), None)
+		if command not in SuperCron.SUBCOMMANDS:
+			# the parser of every subcommand is needed for the help or the error message
+			command = None
+		args = SuperCron.build_parser(command=command).parse_args()
+		args.func(args)
+
+	@staticmethod
+	def build_parser(parser_class=argparse.ArgumentParser, command=None):
+		"""build the parser of the command line arguments, only with the subparser of command if given"""
+		def wanted(name):
+			return command is None or name == command
+
+		parser = parser_class(formatter_class=argparse.RawDescriptionHelpFormatter,
 			description="A utility that translates intelligent schedule commands to crontab entries.",
 			epilog="Examples:\n\tAdd a job:\tsupercron add -c \"date +%j\" -r \"every 2 days\" log_dates" +
 			"\n\tRename a job:\tsupercron rename log_dates log_all_dates" +
@@ -32,95 +141,267 @@ class SuperCron:
 			"\n\tEnable a job:\tsupercron enable log_dates" +
 			"\n\tDisable a job:\tsupercron disable log_dates" +
 			"\n\tSearch jobs:\tsupercron search log_dates" +
+			"\n\tNext runs:\tsupercron next -c 3 log_dates" +
+			"\n\tComing jobs:\tsupercron next -w 60 @all" +
+			"\n\tLoad profile:\tsupercron profile -w 5 --csv load.csv" +
 			"\n\tClear all jobs:\tsupercron clear" +
 			"\n\tAdd trigger:\tsupercon trigger -t \"off if log_months is disabled\" log_dates" +
-			"\n\tRemove trigger:\tsupercron trigger -t none log_dates")
+			"\n\tRemove trigger:\tsupercron trigger -t none log_dates" +
+			"\n\tNo overlap:\tsupercron policy -p skip log_dates" +
+			"\n\tBatch of jobs:\tsupercron batch \"enable log_dates\" \"delete log_months\"" +
+			"\n\tRun the daemon:\tsupercron daemon" +
+			"\n\tLogged job:\tsupercron add -w -c \"backup.sh\" -r \"every 5 minutes\" backup" +
+			"\n\tRun times:\tsupercron history --stats -s 30d backup" +
+			"\n\tFailed runs:\tsupercron history --failed -s 1h" +
+			"\n\tDesired jobs:\tsupercron apply --plan jobs.yaml")
 		parser.add_argument("-V", "--version", action="version", version="SuperCron v{}".format(
 			SuperCron.VERSION), help="display version number and exit")
+		parser.add_argument("--no-cache", action="store_true",
+			help="parse the crontab again instead of loading its cached snapshot (must come first)")
+		parser.add_argument("--storage", metavar="SPEC",
+			help="read and write the crontab of SPEC instead of user's crontab: crontab:USER (crontab command), " +
+			"file:PATH (crontab file) or spool:DIRECTORY:NAME (crontab NAME of a spool directory); " +
+			"default: $SUPERCRON_STORAGE (must come first)")
+		parser.add_argument("--users", metavar="LIST",
+			help="apply the subcommand to the crontabs of a comma-separated list of users (or storage specs), " +
+			"in parallel (must come first)")
+		parser.add_argument("--user-file", metavar="FILE",
+			help="like --users, with one user (or storage spec) per line of FILE (must come first)")
+		parser.add_argument("--workers", type=int, metavar="N",
+			help="number of crontabs changed at the same time with --users (default: 8, must come first)")
+		parser.add_argument("--profile", action="store_true",
+			help="print the time spent in each step to stderr (must come first)")
+		parser.add_argument("--profile-json", action="store_true",
+			help="print the time spent in each step to stderr as one JSON line (must come first)")
 		# Add subparsers
 		subparsers = parser.add_subparsers(title="Subcommands", help="Subcommand help")
-		parser_add = subparsers.add_parser("add", help="for adding a job",
-			description="For adding a job to user's crontab.")
-		parser_rename = subparsers.add_parser("rename", help="for renaming a job",
-			description="For renaming a SuperCron job in user's crontab.")
-		parser_delete = subparsers.add_parser("delete", help="for deleting a job",
-			description="For deleting a SuperCron job from user's crontab.")
-		parser_enable = subparsers.add_parser("enable", help="for enabling a job",
-			description="For enabling a SuperCron job in user's crontab.")
-		parser_disable = subparsers.add_parser("disable", help="for disabling a job",
-			description="For disabling a SuperCron job in user's crontab.")
-		parser_trigger = subparsers.add_parser("trigger", help="for adding/changing/removing a trigger",
-			description="For adding/changing/removing a trigger on a job.")
-		parser_search = subparsers.add_parser("search", help="for searching for a job by name",
-			formatter_class=argparse.RawDescriptionHelpFormatter,
-			description="For listing SuperCron jobs that match the exact name supplied.\n" +
-			"Special cases of the value of 'name':\n" +
-			"  - '@supercon' (without quotes): list all SuperCron jobs in user's crontab\n" +
-			"  - '@all' (without quotes): list all user's crontab entries")
-		parser_clear = subparsers.add_parser("clear", help="for clearing all SuperCron's jobs",
-			description="For clearing all SuperCron jobs from user's crontab.")
-		# subcommand 'add' arguments
-		parser_add.add_argument("-r", "--repetition", nargs=1, required=True,
-			help="repetition clause (should be enclosed by quotes if it contains spaces)")
-		parser_add.add_argument("-c", "--command", nargs=1, required=True,
-			help="command to be executed by the job (should be enclosed by quotes if it contains spaces)")
-		parser_add.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
-		parser_add.add_argument("name", help="name of the job")
-		parser_add.set_defaults(func=SuperCron.add_job)
-		# subcommand 'rename' arguments
-		parser_rename.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
-		parser_rename.add_argument("old_name", help="old name of the job")
-		parser_rename.add_argument("new_name", help="new name of the job")
-		parser_rename.set_defaults(func=SuperCron.rename_job)
-		# subcommand 'delete' arguments
-		parser_delete.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
-		parser_delete.add_argument("name", help="name of the job")
-		parser_delete.set_defaults(func=SuperCron.delete_job)
-		# subcommand 'enable' arguments
-		parser_enable.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
-		parser_enable.add_argument("name", help="name of the job")
-		parser_enable.set_defaults(func=SuperCron.enable_job)
-		# subcommand 'disable' arguments
-		parser_disable.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
-		parser_disable.add_argument("name", help="name of the job")
-		parser_disable.set_defaults(func=SuperCron.disable_job)
-		# subcommand 'search' arguments
-		parser_search.add_argument("name", help="name of the job")
-		parser_search.set_defaults(func=SuperCron.search_job)
-		# subcommand 'clear' arguments
-		parser_clear.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
-		parser_clear.add_argument("-f", "--force", action="store_true", help="do not ask for confirmation before clearing")
-		parser_clear.set_defaults(func=SuperCron.clear_jobs)
-		# subcommand 'trigger' arguments
-		parser_trigger.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
-		parser_trigger.add_argument("-t", "--trigger", nargs=1, required=True, help="NONE, or in the form of: ACTION if NAME==STATE")
-		parser_trigger.add_argument("name", help="name of the triggered job")
-		parser_trigger.set_defaults(func=SuperCron.trigger_job)
-		# parse all args
-		args = parser.parse_args()
-		args.func(args)
+		if wanted("add"):
+			parser_add = subparsers.add_parser("add", help="for adding a job",
+				description="For adding a job to user's crontab.")
+			parser_add.add_argument("-r", "--repetition", nargs=1, required=True,
+				help="repetition clause (should be enclosed by quotes if it contains spaces)")
+			parser_add.add_argument("-c", "--command", nargs=1, required=True,
+				help="command to be executed by the job (should be enclosed by quotes if it contains spaces)")
+			parser_add.add_argument("-s", "--spread", choices=Occupancy.STRATEGIES,
+				help="when the repetition sets no time, start on the least loaded minute of the crontab (load), " +
+				"or on a minute derived from the job name (hash), instead of the current minute")
+			parser_add.add_argument("-w", "--wrap", action="store_true",
+				help="run the command through 'supercron exec', which logs the duration, CPU time and exit status " +
+				"of every run, and whether it started while the previous run was still going")
+			parser_add.add_argument("-p", "--policy", metavar="POLICY",
+				help="overlap policy of the runs (implies --wrap): skip (a run is skipped while the previous one is " +
+				"going), queue (it waits for the previous one) or 'limit N' (at most N runs at the same time)")
+			parser_add.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
+			parser_add.add_argument("-n", "--dry-run", action="store_true",
+				help="show the propagation of the triggers without modifying the crontab")
+			parser_add.add_argument("name", help="name of the job")
+			parser_add.set_defaults(func=SuperCron.add_job)
+		if wanted("rename"):
+			parser_rename = subparsers.add_parser("rename", help="for renaming a job",
+				description="For renaming a SuperCron job in user's crontab.")
+			parser_rename.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
+			parser_rename.add_argument("-n", "--dry-run", action="store_true",
+				help="show the propagation of the triggers without modifying the crontab")
+			parser_rename.add_argument("old_name", help="old name of the job")
+			parser_rename.add_argument("new_name", help="new name of the job")
+			parser_rename.set_defaults(func=SuperCron.rename_job)
+		if wanted("delete"):
+			parser_delete = subparsers.add_parser("delete", help="for deleting a job",
+				description="For deleting a SuperCron job from user's crontab.")
+			parser_delete.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
+			parser_delete.add_argument("-n", "--dry-run", action="store_true",
+				help="show the propagation of the triggers without modifying the crontab")
+			parser_delete.add_argument("name", help="name of the job")
+			parser_delete.set_defaults(func=SuperCron.delete_job)
+		if wanted("enable"):
+			parser_enable = subparsers.add_parser("enable", help="for enabling a job",
+				description="For enabling a SuperCron job in user's crontab.")
+			parser_enable.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
+			parser_enable.add_argument("-n", "--dry-run", action="store_true",
+				help="show the propagation of the triggers without modifying the crontab")
+			parser_enable.add_argument("name", help="name of the job")
+			parser_enable.set_defaults(func=SuperCron.enable_job)
+		if wanted("disable"):
+			parser_disable = subparsers.add_parser("disable", help="for disabling a job",
+				description="For disabling a SuperCron job in user's crontab.")
+			parser_disable.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
+			parser_disable.add_argument("-n", "--dry-run", action="store_true",
+				help="show the propagation of the triggers without modifying the crontab")
+			parser_disable.add_argument("name", help="name of the job")
+			parser_disable.set_defaults(func=SuperCron.disable_job)
+		if wanted("trigger"):
+			parser_trigger = subparsers.add_parser("trigger", help="for adding/changing/removing a trigger",
+				description="For adding/changing/removing a trigger on a job.")
+			parser_trigger.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
+			parser_trigger.add_argument("-t", "--trigger", nargs=1, required=True, help="NONE, or in the form of: ACTION if CONDITION, where CONDITION combines NAME is STATE terms with and, or, " +
+				"not and parentheses; several triggers are separated by ';'")
+			parser_trigger.add_argument("name", help="name of the triggered job")
+			parser_trigger.set_defaults(func=SuperCron.trigger_job)
+		if wanted("policy"):
+			parser_policy = subparsers.add_parser("policy", help="for setting/removing the overlap policy of a job",
+				description="For limiting the runs of a job going on at the same time. The commands of the jobs are\n" +
+				"wrapped with 'supercron exec' (see 'add --wrap'), which enforces the policy with lock files.",
+				formatter_class=argparse.RawDescriptionHelpFormatter)
+			parser_policy.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
+			parser_policy.add_argument("-p", "--policy", nargs=1, required=True,
+				help="NONE, skip (a run is skipped while the previous one is going), queue (it waits for the " +
+				"previous one) or 'limit N' (at most N runs at the same time, the others are skipped)")
+			parser_policy.add_argument("name", help="name of the job")
+			parser_policy.set_defaults(func=SuperCron.policy_job)
+		if wanted("search"):
+			parser_search = subparsers.add_parser("search", help="for searching for a job by name",
+				formatter_class=argparse.RawDescriptionHelpFormatter,
+				description="For listing SuperCron jobs that match the exact name supplied.\n" +
+				"Special cases of the value of 'name':\n" +
+				"  - '@supercon' (without quotes): list all SuperCron jobs in user's crontab\n" +
+				"  - '@all' (without quotes): list all user's crontab entries")
+			parser_search.add_argument("-f", "--format", choices=SuperCron.SEARCH_FORMATS, default="table",
+				help="table (default), or one record per job with its next run time, written as soon as it is " +
+				"found: a JSON array (json), JSON Lines (jsonl) or CSV with a header (csv)")
+			parser_search.add_argument("name", help="name of the job")
+			parser_search.set_defaults(func=SuperCron.search_job)
+		if wanted("next"):
+			parser_next = subparsers.add_parser("next", help="for showing when jobs run next",
+				description="For showing the next run times of jobs, or the jobs running within the next minutes.\n" +
+				"'name' can be:\n" +
+				"  - the job name\n" +
+				"  - '@supercron' (without quotes): all SuperCron jobs\n" +
+				"  - '@all' (without quotes): all user's crontab entries",
+				formatter_class=argparse.RawDescriptionHelpFormatter)
+			parser_next.add_argument("-c", "--count", type=int, default=1, help="number of run times to show per job")
+			parser_next.add_argument("-w", "--within", type=int, metavar="MINUTES",
+				help="show the enabled jobs running within the next MINUTES minutes instead, by time")
+			parser_next.add_argument("name", help="name of the job")
+			parser_next.set_defaults(func=SuperCron.next_jobs)
+		if wanted("profile"):
+			parser_profile = subparsers.add_parser("profile", help="for showing how many jobs start at each minute",
+				description="For counting the enabled jobs starting at each minute of the next 7 days (or of the\n" +
+				"current month), and showing the busiest windows. Needs NumPy.",
+				formatter_class=argparse.RawDescriptionHelpFormatter)
+			parser_profile.add_argument("-m", "--month", action="store_true",
+				help="profile the current month instead of the next 7 days")
+			parser_profile.add_argument("-w", "--width", type=int, default=1, metavar="MINUTES",
+				help="width of the busiest windows, in minutes (default: 1)")
+			parser_profile.add_argument("-t", "--top", type=int, default=5, help="number of busiest windows to show")
+			parser_profile.add_argument("--csv", metavar="FILE",
+				help="write the number of jobs starting at each minute to FILE ('-' for standard output)")
+			parser_profile.set_defaults(func=SuperCron.profile_jobs)
+		if wanted("clear"):
+			parser_clear = subparsers.add_parser("clear", help="for clearing all SuperCron's jobs",
+				description="For clearing all SuperCron jobs from user's crontab.")
+			parser_clear.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
+			parser_clear.add_argument("-f", "--force", action="store_true", help="do not ask for confirmation before clearing")
+			parser_clear.set_defaults(func=SuperCron.clear_jobs)
+		if wanted("batch"):
+			parser_batch = subparsers.add_parser("batch", help="for applying several operations at once",
+				description="For applying several operations to user's crontab with a single read and a single write.\n" +
+				"Each operation is a quoted subcommand line. If any of them fails, nothing is written.",
+				formatter_class=argparse.RawDescriptionHelpFormatter)
+			parser_batch.add_argument("operations", nargs="+", metavar="operation",
+				help="subcommand line, e.g. \"add -c 'ls' -r 'at 10:00' list_files\" (should be enclosed by quotes)")
+			parser_batch.set_defaults(func=SuperCron.batch_jobs)
+		if wanted("daemon"):
+			parser_daemon = subparsers.add_parser("daemon", help="for serving subcommands from memory",
+				description="For keeping user's crontab in memory and serving the subcommands of other supercron\n" +
+				"commands over a Unix socket ($SUPERCRON_SOCKET, or a per-user default).",
+				formatter_class=argparse.RawDescriptionHelpFormatter)
+			parser_daemon.add_argument("-s", "--socket", help="path of the socket (default: $SUPERCRON_SOCKET)")
+			parser_daemon.add_argument("--stop", action="store_true", help="stop the running daemon")
+			parser_daemon.set_defaults(func=SuperCron.run_daemon)
+		if wanted("exec"):
+			parser_exec = subparsers.add_parser("exec", help="for running the command of a job and logging the run",
+				description="For running a command as job 'name' and logging its duration, CPU time, exit status\n" +
+				"and overlap with a previous run. Crontab lines of jobs added with 'add --wrap' run it.",
+				formatter_class=argparse.RawDescriptionHelpFormatter)
+			parser_exec.add_argument("name", help="name of the job")
+			parser_exec.add_argument("command", nargs=argparse.REMAINDER,
+				help="'--', then the command (a shell command line if it is a single argument)")
+			parser_exec.set_defaults(func=SuperCron.exec_job)
+		if wanted("history"):
+			parser_history = subparsers.add_parser("history", help="for showing the runs of wrapped jobs",
+				description="For listing the runs logged by 'supercron exec' (see 'add --wrap'), oldest first, or\n" +
+				"their statistics per job. Runs are kept 90 days in an SQLite database.",
+				formatter_class=argparse.RawDescriptionHelpFormatter)
+			parser_history.add_argument("-s", "--since", metavar="DURATION",
+				help="only the runs started within DURATION, like 15m, 12h, 30d or 2w")
+			parser_history.add_argument("--failed", action="store_true", help="only the runs with an exit status above 0")
+			parser_history.add_argument("--stats", action="store_true",
+				help="show per job the number of runs, failed and skipped runs, and percentiles of the duration")
+			parser_history.add_argument("-p", "--percentiles", default="50,95,99", metavar="LIST",
+				help="comma-separated percentiles of the duration shown with --stats (default: %(default)s)")
+			parser_history.add_argument("-f", "--format", choices=SuperCron.SEARCH_FORMATS, default="table",
+				help="table (default), json, jsonl or csv, written as the runs are read")
+			parser_history.add_argument("--retention", type=int, metavar="DAYS",
+				help="delete the runs older than DAYS days (default: 90)")
+			parser_history.add_argument("name", nargs="?", help="name of the job (default: all jobs)")
+			parser_history.set_defaults(func=SuperCron.history_jobs)
+		if wanted("apply"):
+			parser_apply = subparsers.add_parser("apply", help="for making the jobs those of a file",
+				description="For adding, removing, modifying, enabling and disabling SuperCron jobs so that they are\n" +
+				"the jobs of a YAML (or JSON) file, with a single write. Jobs are matched by name, schedule and\n" +
+				"command. Each job of the file has a name, a command, a repetition (or a raw cron schedule), and\n" +
+				"optionally enabled, trigger, policy and wrap. The changes do not fire triggers. Needs PyYAML.",
+				formatter_class=argparse.RawDescriptionHelpFormatter)
+			parser_apply.add_argument("-q", "--quiet", action="store_true", help="do not print any output or error messages")
+			parser_apply.add_argument("-n", "--plan", action="store_true",
+				help="show the changes without modifying the crontab")
+			parser_apply.add_argument("file", help="file of the desired jobs ('-' for standard input)")
+			parser_apply.set_defaults(func=SuperCron.apply_jobs)
+		return parser
+
+	@staticmethod
+	def check_name(name):
+		"""return the job name, or raise ValueError if it is not allowed"""
+		if Utils.check_job_name(name) == -1:
+			raise ValueError("job name cannot be '{}'.".format(name))
+		if Utils.check_job_name(name) == -2:
+			raise ValueError("job name cannot contain a '%' symbol.")
+		return name
+
+	@staticmethod
+	def get_repeat(repetition):
+		"""return the parsed repetition sentence, or raise ValueError if it is invalid"""
+		repeat = Repetition.parse_repetition(repetition)
+		if not repeat:
+			raise ValueError("invalid repetition sentence: '{}'.".format(repetition))
+		return repeat
 
 	@staticmethod
-	def _generic_enable_job(name, enable_it, quiet=None):
+	def spread_repeat(cron, repetition, name, strategy):
+		"""return a valid repetition sentence parsed, with the time it does not set chosen by strategy"""
+		hour, minute = Utils.get_time_now()
+		return cron.occupancy().place(Repetition.parse_schedule(repetition), name, strategy, hour, minute)
+
+	@staticmethod
+	def get_trigger(trigger):
+		"""return the parsed triggers ("" for none), or raise ValueError if they are invalid"""
+		if trigger.lower().strip() == "none":
+			return ""
+		try:
+			return TriggerExpression.parse(trigger.strip())
+		except ValueError as e:
+			raise ValueError("invalid trigger: {} (expected \"NONE\" or \"ACTION if CONDITION\", ".format(e) +
+				"CONDITION combining \"NAME is STATE\" terms with and, or, not and parentheses).")
+
+	@staticmethod
+	def get_policy(policy):
+		"""return the parsed overlap policy ("" for none), or raise ValueError if it is invalid"""
+		if policy.lower().strip() == "none":
+			return ""
+		parsed = Utils.parse_policy(policy)
+		if not parsed:
+			raise ValueError("invalid policy (expected \"NONE\", \"skip\", \"queue\" or \"limit N\").")
+		return parsed
+
+	@staticmethod
+	def _generic_enable_job(name, enable_it, quiet=None, dry_run=False):
 		"""enable or disable job(s) by their name"""
 		if quiet != None:
 			Utils.DEBUG = not quiet
-		count = 0
-		cron = TCronTab(user=True)
-		for job in cron:
-			if job.get_name() == name and job.is_enabled() != enable_it:
-				job.enable(enable_it)
-				count += 1
-		if enable_it:
-			action = "enabled"
-			if count:
-				cron.activate_triggered_jobs(name, "enabled")
-		else:
-			action = "disabled"
-			if count:
-				cron.activate_triggered_jobs(name, "disabled")
-		cron.activate_triggered_jobs(name, "toggled")
-		cron.write_to_user(user=True)
+		cron = SuperCron.open_crontab()
+		count = cron.enable_job(name, enable_it)
+		action = "enabled" if enable_it else "disabled"
+		SuperCron.save_crontab(cron, Namespace({"dry_run": dry_run}))
 		if count == 1:
 			Utils.debug_print("1 job named '{}' has been {}.".format(name, action))
 		else:
@@ -128,67 +409,40 @@ class SuperCron:
 
 	@staticmethod
 	def enable_job(args):
+		dry_run = "dry_run" in args and args.dry_run
 		if "quiet" in args:
-			SuperCron._generic_enable_job(str(args.name), True, args.quiet)
+			SuperCron._generic_enable_job(str(args.name), True, args.quiet, dry_run)
 		else:
-			SuperCron._generic_enable_job(str(args.name), True)
+			SuperCron._generic_enable_job(str(args.name), True, dry_run=dry_run)
 
 	@staticmethod
 	def disable_job(args):
+		dry_run = "dry_run" in args and args.dry_run
 		if "quiet" in args:
-			SuperCron._generic_enable_job(str(args.name), False, args.quiet)
+			SuperCron._generic_enable_job(str(args.name), False, args.quiet, dry_run)
 		else:
-			SuperCron._generic_enable_job(str(args.name), False)
+			SuperCron._generic_enable_job(str(args.name), False, dry_run=dry_run)
 
 	@staticmethod
 	def add_job(args):
 		"""add the job to crontab"""
 		if "quiet" in args:
 			Utils.DEBUG = not args.quiet
-		name = str(args.name)
-		if Utils.check_job_name(name) == -1:
-			Utils.debug_print("Error: job name cannot be '{}'.".format(name))
-			sys.exit(1)
-		if Utils.check_job_name(name) == -2:
-			Utils.debug_print("Error: job name cannot contain a '%' symbol.")
-			sys.exit(1)
 		command = str(args.command[0])
-		repetition = str(args.repetition[0])
-		repeat = Repetition.parse_repetition(repetition)
-		if not repeat:
-			Utils.debug_print("Error: invalid repetition sentence: '{}'."
-				.format(repetition))
+		try:
+			name = SuperCron.check_name(str(args.name))
+			repeat = SuperCron.get_repeat(str(args.repetition[0]))
+			policy = SuperCron.get_policy(args.policy) if "policy" in args and args.policy else ""
+		except ValueError as e:
+			Utils.debug_print("Error: {}".format(e))
 			sys.exit(1)
-		cron = TCronTab(user=True)
-		job = cron.new(command=command, comment=name)
-		if "reboot" in repeat:
-			job.every_reboot()
-		else:
-			if "min_every" in repeat:
-				job.minute.every(repeat['min_every'])
-			if "min_on" in repeat:
-				job.minute.on(repeat['min_on'])
-			if "hour_every" in repeat:
-				job.hour.every(repeat['hour_every'])
-			if "hour_on" in repeat:
-				job.hour.on(repeat['hour_on'])
-			if "day_every" in repeat:
-				job.day.every(repeat['day_every'])
-			if "day_on" in repeat:
-				job.day.on(repeat['day_on'])
-			if "dow_on" in repeat:
-				job.dow.on(*repeat['dow_on'])
-			if "dow_during" in repeat:
-				job.dow.during(*repeat['dow_during'])
-			if "month_every" in repeat:
-				job.month.every(repeat['month_every'])
-			if "month_during" in repeat:
-				job.month.during(*repeat['month_during'])
-			if "month_on" in repeat:
-				job.month.on(*repeat['month_on'])
-		job.enable()
-		cron.activate_triggered_jobs(name, "added")
-		cron.write_to_user(user=True)
+		if policy or "wrap" in args and args.wrap:
+			command = JobRunner.wrap(name, command, policy)
+		cron = SuperCron.open_crontab()
+		if "spread" in args and args.spread:
+			repeat = SuperCron.spread_repeat(cron, str(args.repetition[0]), name, args.spread)
+		cron.add_job(name, command, repeat, policy)
+		SuperCron.save_crontab(cron, args)
 		Utils.debug_print("Job named '{}' has been successfully added.".format(name))
 
 	@staticmethod
@@ -196,24 +450,15 @@ class SuperCron:
 		"""rename a job in user's crontab"""
 		if "quiet" in args:
 			Utils.DEBUG = not args.quiet
-		count = 0
 		old_name = str(args.old_name)
-		new_name = str(args.new_name)
-		if Utils.check_job_name(new_name) == -1:
-			Utils.debug_print("Error: job name cannot be '{}'.".format(name))
-			sys.exit(1)
-		if Utils.check_job_name(new_name) == -2:
-			Utils.debug_print("Error: job name cannot contain a '%' symbol.")
+		try:
+			new_name = SuperCron.check_name(str(args.new_name))
+		except ValueError as e:
+			Utils.debug_print("Error: {}".format(e))
 			sys.exit(1)
-		cron = TCronTab(user=True)
-		for job in cron:
-			if job.get_name() == old_name:
-				job.set_name(new_name)
-				count += 1
-		if count:
-			cron.activate_triggered_jobs(old_name, "deleted")
-			cron.activate_triggered_jobs(new_name, "added")
-		cron.write_to_user(user=True)
+		cron = SuperCron.open_crontab()
+		count = cron.rename_job(old_name, new_name)
+		SuperCron.save_crontab(cron, args)
 		if count == 0:
 			Utils.debug_print("Error: job '{}' does not exist.".format(old_name))
 		elif count == 1:
@@ -229,15 +474,9 @@ class SuperCron:
 		if "quiet" in args:
 			Utils.DEBUG = not args.quiet
 		name = str(args.name)
-		count = 0
-		cron = TCronTab(user=True)
-		for job in cron:
-			if job.get_name() == name:
-				cron.remove(job)
-				count += 1
-		if count:
-			cron.activate_triggered_jobs(name, "deleted")
-		cron.write_to_user(user=True)
+		cron = SuperCron.open_crontab()
+		count = cron.delete_job(name)
+		SuperCron.save_crontab(cron, args)
 		if count == 1:
 			Utils.debug_print("1 job named '{}' has been deleted.".format(name))
 		else:
@@ -260,15 +499,9 @@ class SuperCron:
 	@staticmethod
 	def _generic_clear_jobs(args, quiet):
 		Utils.DEBUG = not quiet
-		count = 0
-		cron = TCronTab(user=True)
-		for job in cron:
-			if job.is_superjob():
-				job.set_name(SuperCron.TOBEDELETED)
-				job.set_trigger("")
-				count += 1
-		cron.remove_all(comment=SuperCron.TOBEDELETED)
-		cron.write_to_user(user=True)
+		cron = SuperCron.open_crontab()
+		count = cron.clear_jobs()
+		cron.write()
 		if count == 1:
 			Utils.debug_print("1 job has been removed from your crontab.")
 		else:
@@ -281,7 +514,9 @@ class SuperCron:
 			count = 0
 			name = str(args.name)
 			job_list = []
-			cron = TCronTab(user=True)
+			cron = SuperCron.open_crontab()
+			if "format" in args and args.format != "table":
+				return SuperCron.write_jobs(SuperCron.find_jobs(cron, name), args.format, sys.stdout)
 			if name == "@all":
 				for job in cron:
 					job_name = job.get_name()
@@ -299,15 +534,8 @@ class SuperCron:
 					enabled = "ON" if job.is_enabled() else "OFF"
 					job_list.append([name, enabled, job.repr_trigger(), str(job.slices), job.command])
 			if job_list:
-				col_widths = []
-				col_titles = ["Name", "State", "Trigger", "Repetition", "Command"]
-				for i in range(0, 5):
-					col_widths.append(max(max(len(n[i]) for n in job_list) + 2, len(col_titles[i]) + 2))
-				Utils.debug_print("".join(word.ljust(col_widths[i]) for word, i in zip(col_titles, range(0, 5))))
-				Utils.debug_print("-" * (sum(col_widths) - 2))
-				for job_item in job_list:
-					Utils.debug_print("".join(word.ljust(col_widths[i]) for word, i in zip(job_item, range(0, 5))))
-					count += 1
+				SuperCron.print_table(["Name", "State", "Trigger", "Repetition", "Command"], job_list)
+				count = len(job_list)
 			else:
 				Utils.debug_print("Zero search results.")
 			return count
@@ -316,31 +544,143 @@ class SuperCron:
 			return -1
 
 	@staticmethod
-	def trigger_job(args):
-		remove_trigger = False
+	def job_record(job, now):
+		"""return the values of SEARCH_FIELDS for a job (None for no trigger or no next run)"""
+		schedule = Schedule.of(job)
+		runs = schedule.next_runs(now, 1) if schedule else []
+		return (job.get_name(), job.is_enabled(), job.repr_trigger() if job.get_triggers() else None, job.get_policy(),
+			str(job.slices), job.command, runs[0].isoformat() if runs else None)
+
+	@staticmethod
+	def write_jobs(jobs, output_format, out):
+		"""write one record per job to out as soon as it is built, in format json, jsonl or csv; return their count"""
+		now = datetime.now()
+		return SuperCron.write_records(SuperCron.SEARCH_FIELDS, (SuperCron.job_record(job, now) for job in jobs),
+			output_format, out)
+
+	@staticmethod
+	def write_records(fields, records, output_format, out):
+		"""write records (tuples of the values of fields) to out one by one, in format json, jsonl or csv;
+		return their count"""
+		import json
+		from collections import OrderedDict
 		count = 0
-		cron = TCronTab(user=True)
+		if output_format == "csv":
+			import csv
+			writer = csv.writer(out, lineterminator="\n")
+			writer.writerow(fields)
+		elif output_format == "json":
+			out.write("[")
+		for record in records:
+			if output_format == "csv":
+				writer.writerow(["" if value is None else str(value).lower() if isinstance(value, bool) else value
+					for value in record])
+			else:
+				line = json.dumps(OrderedDict(zip(fields, record)))
+				if output_format == "json":
+					line = ("," if count else "") + "\n" + line
+				out.write(line if output_format == "json" else line + "\n")
+			count += 1
+		if output_format == "json":
+			out.write("\n]\n" if count else "]\n")
+		return count
+
+	@staticmethod
+	def print_table(titles, rows):
+		"""print rows of strings in columns, under their titles"""
+		widths = [max(max(len(row[i]) for row in rows) + 2, len(title) + 2) for i, title in enumerate(titles)]
+		Utils.debug_print("".join(title.ljust(width) for title, width in zip(titles, widths)))
+		Utils.debug_print("-" * (sum(widths) - 2))
+		for row in rows:
+			Utils.debug_print("".join(word.ljust(width) for word, width in zip(row, widths)))
+
+	@staticmethod
+	def find_jobs(cron, name):
+		"""return the jobs named name, or all SuperCron jobs for '@supercron', or all jobs for '@all'"""
+		if name == "@all":
+			return list(cron)
+		if name == "@supercron":
+			return [job for job in cron if job.is_superjob()]
+		return list(cron.find_name(name))
+
+	@staticmethod
+	def next_jobs(args):
+		"""show the next run times of jobs, or the jobs running within the next minutes"""
+		now = datetime.now()
+		jobs = SuperCron.find_jobs(SuperCron.open_crontab(), str(args.name))
+		rows = []
+		if args.within is not None:
+			jobs = [job for job in jobs if job.is_enabled()]
+			end = now + timedelta(minutes=args.within)
+			for run, job in ScheduleIndex(jobs).runs_within(now, end):
+				rows.append([run.strftime("%Y-%m-%d %H:%M"), job.get_name(), str(job.slices), job.command])
+			titles = ["Time", "Name", "Repetition", "Command"]
+		else:
+			for job in jobs:
+				schedule = Schedule.of(job)
+				runs = schedule.next_runs(now, args.count) if schedule else []
+				rows.append([job.get_name(), "ON" if job.is_enabled() else "OFF",
+					", ".join(run.strftime("%Y-%m-%d %H:%M") for run in runs) or "never", str(job.slices), job.command])
+			titles = ["Name", "State", "Next runs", "Repetition", "Command"]
+		if rows:
+			SuperCron.print_table(titles, rows)
+		else:
+			Utils.debug_print("Zero search results.")
+
+	@staticmethod
+	def profile_jobs(args):
+		"""show how many jobs start at each minute of a period, and its busiest windows"""
+		import calendar
+		today = datetime.now()
+		if args.month:
+			start = today.replace(day=1)
+			days = calendar.monthrange(today.year, today.month)[1]
+		else:
+			start, days = today, 7
+		if args.width < 1 or args.top < 1:
+			Utils.debug_print("Error: window width and number of windows must be at least 1.")
+			sys.exit(1)
+		try:
+			profile = LoadProfile(SuperCron.open_crontab(), start, days)
+		except ImportError as e:
+			Utils.debug_print("Error: {}.".format(e))
+			sys.exit(1)
+		if args.csv:
+			out = sys.stdout if args.csv == "-" else open(args.csv, "w")
+			try:
+				profile.write_csv(out)
+			finally:
+				if out is not sys.stdout:
+					out.close()
+			if args.csv == "-":
+				return
+		Utils.debug_print("{} jobs ({} distinct schedules) profiled from {} to {}.".format(profile.jobs,
+			profile.schedules, profile.start.strftime("%Y-%m-%d"), profile.time_of(days * 1440).strftime("%Y-%m-%d")))
+		if not profile.jobs:
+			return
+		Utils.debug_print("At most {} jobs start at the same minute, {:.2f} per minute on average.\n".format(
+			profile.counts.max(), profile.counts.mean()))
+		SuperCron.print_table(["Jobs starting", "Minutes"],
+			[[str(jobs), str(minutes)] for jobs, minutes in profile.histogram()])
+		Utils.debug_print("")
+		SuperCron.print_table(["Busiest windows ({} min)".format(args.width), "Jobs starting"],
+			[[start.strftime("%Y-%m-%d %H:%M"), str(jobs)] for start, jobs in profile.peaks(args.width, args.top)])
+
+	@staticmethod
+	def trigger_job(args):
 		if "quiet" in args:
 			Utils.DEBUG = not args.quiet
 		name = str(args.name)
 		trigger = str(args.trigger[0])
-		jobs = cron.find_name(name)
-		if trigger.lower().strip() == "none":
-			remove_trigger = True
-			for job in jobs:
-				job.set_trigger("")
-				count += 1
-		else:
-			trigger_list = Utils.parse_trigger(trigger.strip())
-			if trigger_list:
-				for job in jobs:
-					job.set_trigger(trigger_list)
-					count += 1
-			else:
-				print(trigger.strip())
-				Utils.debug_print("Error: invalid trigger (expected format is \"NONE\" or \"ACTION if NAME is STATE\").")
-				sys.exit(1)
-		cron.write_to_user(user=True)
+		try:
+			trigger_list = SuperCron.get_trigger(trigger)
+		except ValueError as e:
+			Utils.debug_print("Error: {}".format(e))
+			sys.exit(1)
+		remove_trigger = not trigger_list
+		cron = SuperCron.open_crontab()
+		count = cron.trigger_job(name, trigger_list)
+		cron.write()
 		if remove_trigger:
 			if count == 1:
 				Utils.debug_print("Trigger was removed from 1 job named '{}'.".format(name))
@@ -354,6 +694,222 @@ class SuperCron:
 				Utils.debug_print("Trigger '{}' was added to {} jobs named '{}'."
 					.format(trigger.strip(), count, name))
 
+	@staticmethod
+	def policy_job(args):
+		"""set or remove the overlap policy of the jobs named name"""
+		if "quiet" in args:
+			Utils.DEBUG = not args.quiet
+		name = str(args.name)
+		try:
+			policy = SuperCron.get_policy(str(args.policy[0]))
+		except ValueError as e:
+			Utils.debug_print("Error: {}".format(e))
+			sys.exit(1)
+		cron = SuperCron.open_crontab()
+		count = cron.policy_job(name, policy)
+		cron.write()
+		if not policy:
+			if count == 1:
+				Utils.debug_print("Policy was removed from 1 job named '{}'.".format(name))
+			else:
+				Utils.debug_print("Policy was removed from {} jobs named '{}'.".format(count, name))
+		else:
+			if count == 1:
+				Utils.debug_print("Policy '{}' was set on 1 job named '{}'.".format(policy, name))
+			else:
+				Utils.debug_print("Policy '{}' was set on {} jobs named '{}'.".format(policy, count, name))
+
+	@staticmethod
+	def batch_jobs(args):
+		"""apply a list of subcommand lines to user's crontab in one transaction"""
+		import shlex
+		parser = SuperCron.build_parser()
+		operations = []
+		for operation in args.operations:
+			op_args = parser.parse_args(shlex.split(operation))
+			if op_args.func in (SuperCron.batch_jobs, SuperCron.run_daemon, SuperCron.exec_job):
+				Utils.debug_print("Error: a batch cannot contain another batch, a daemon or a job run.")
+				sys.exit(1)
+			operations.append(op_args)
+		try:
+			from StringIO import StringIO
+		except ImportError:
+			from io import StringIO
+		# the messages of the operations are shown once the crontab is written, since a later failure undoes them
+		messages = []
+		stdout = sys.stdout
+		try:
+			with SuperCron.transaction():
+				for op_args in operations:
+					sys.stdout = output = StringIO()
+					try:
+						op_args.func(op_args)
+					finally:
+						sys.stdout = stdout
+					messages.append(output.getvalue())
+		except BaseException:
+			if len(messages) < len(operations):
+				# the error of the operation that failed
+				sys.stdout.write(output.getvalue())
+			Utils.debug_print("Batch rolled back: none of its operations was applied.")
+			raise
+		sys.stdout.write("".join(messages))
+
+	@staticmethod
+	def run_daemon(args):
+		"""serve subcommands from a crontab kept in memory until stopped, or stop the running daemon"""
+		import socket
+		if SuperCron.storage is not None:
+			Utils.debug_print("Error: the daemon only serves user's crontab, not another storage.")
+			sys.exit(1)
+		path = args.socket or DaemonClient.socket_path()
+		try:
+			if args.stop:
+				Utils.debug_print(DaemonClient.stop(path)["output"].strip())
+				return
+			Utils.debug_print("SuperCron daemon listening on '{}'.".format(path))
+			Daemon(path, SuperCron.execute).serve()
+		except socket.error as e:
+			Utils.debug_print("Error: no daemon is listening on '{}' ({}).".format(path, e))
+			sys.exit(1)
+		except (IOError, OSError) as e:
+			Utils.debug_print("Error: {}.".format(e))
+			sys.exit(1)
+
+	@staticmethod
+	def exec_job(args):
+		"""run the command of a wrapped job, log the run and exit with the status of the command"""
+		sys.exit(JobRunner.main([args.name] + args.command))
+
+	@staticmethod
+	def history_jobs(args):
+		"""list the logged runs of wrapped jobs, or their statistics, as they are read from the history"""
+		since = None
+		if args.since:
+			seconds = Utils.parse_duration(args.since)
+			if seconds is None:
+				Utils.debug_print("Error: invalid duration '{}' (expected like 15m, 12h, 30d or 2w).".format(args.since))
+				sys.exit(1)
+			since = time.time() - seconds
+		try:
+			percentiles = [float(percent) for percent in args.percentiles.split(",")]
+		except ValueError:
+			percentiles = []
+		if not percentiles or not all(0 < percent <= 100 for percent in percentiles):
+			Utils.debug_print("Error: percentiles must be numbers above 0 and up to 100.")
+			sys.exit(1)
+		if args.retention is not None and args.retention < 1:
+			Utils.debug_print("Error: retention must be at least 1 day.")
+			sys.exit(1)
+		history = RunHistory()
+		try:
+			history.ingest(args.retention)
+			with Timing.span("query"):
+				if args.stats:
+					names = ["p{:g}".format(percent) for percent in percentiles]
+					fields = RunHistory.STATS_FIELDS + tuple(names)
+					records = (tuple(stats[field] for field in RunHistory.STATS_FIELDS[:4]) +
+						tuple(None if stats[field] is None else round(stats[field], 6) for field in fields[4:])
+						for stats in history.stats(args.name, since, percentiles))
+				else:
+					fields = RunHistory.FIELDS
+					records = (tuple(run[field] for field in fields)
+						for run in history.runs(args.name, since, args.failed))
+				if args.format != "table":
+					SuperCron.write_records(fields, records, args.format, sys.stdout)
+				elif not SuperCron.print_records(fields, records):
+					Utils.debug_print("Zero runs found.")
+		finally:
+			history.close()
+
+	@staticmethod
+	def load_desired(path):
+		"""return the jobs of a desired jobs file, resolved (ValueError if the file cannot be used)"""
+		try:
+			return DesiredJobs.resolve(DesiredJobs.load(path))
+		except (IOError, OSError, ImportError) as e:
+			raise ValueError(str(e))
+
+	@staticmethod
+	def apply_jobs(args):
+		"""make the SuperCron jobs of the crontab those of a file, or only show the changes with --plan"""
+		if "quiet" in args:
+			Utils.DEBUG = not args.quiet
+		try:
+			desired = SuperCron.load_desired(args.file)
+		except ValueError as e:
+			Utils.debug_print("Error: {}".format(e))
+			sys.exit(1)
+		cron = SuperCron.open_crontab()
+		changes = cron.plan(desired) if args.plan else cron.reconcile(desired)
+		symbols = {"add": "+", "remove": "-"}
+		for change in changes:
+			detail = " ({})".format(", ".join(change.fields)) if change.action == "modify" else ""
+			Utils.debug_print("{} {} '{}'{}".format(symbols.get(change.action, "~"), change.action, change.name, detail))
+		if not changes:
+			Utils.debug_print("The jobs are already the desired ones.")
+			return
+		counts = [sum(1 for change in changes if change.action == action)
+			for action in ("add", "remove", "modify", "enable", "disable")]
+		if args.plan:
+			Utils.debug_print("{} to add, {} to remove, {} to modify, {} to enable, {} to disable.".format(*counts))
+			Utils.debug_print("Plan only: user's crontab has not been modified.")
+		else:
+			cron.write()
+			Utils.debug_print("{} added, {} removed, {} modified, {} enabled, {} disabled.".format(*counts))
+
+	@staticmethod
+	def print_records(fields, records):
+		"""print records of runs or statistics in columns of fixed widths, each one as soon as it is read;
+		return their count"""
+		count = 0
+		for record in records:
+			if not count:
+				Utils.debug_print("  ".join(field.ljust(20 if field == "name" else 19 if field == "started" else 10)
+					for field in fields).rstrip())
+			cells = []
+			for field, value in zip(fields, record):
+				if field == "started":
+					cells.append(datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M:%S"))
+				elif field == "name":
+					cells.append(value.ljust(20))
+				elif value is None:
+					cells.append("-".ljust(10))
+				elif field == "overlap":
+					cells.append(("yes" if value else "no").ljust(10))
+				elif field == "status" and value == -1:
+					cells.append("skipped".ljust(10))
+				elif isinstance(value, float):
+					# durations, in seconds
+					cells.append("{:.3f}".format(value).ljust(10))
+				else:
+					cells.append(str(value).ljust(10))
+			Utils.debug_print("  ".join(cells).rstrip())
+			count += 1
+		return count
+
+	@staticmethod
+	def execute(cron, argv):
+		"""run a command line on a crontab held in memory and return its exit status"""
+		if SuperCron.parser is None:
+			SuperCron.parser = SuperCron.build_parser()
+		Utils.DEBUG = True
+		try:
+			args = SuperCron.parser.parse_args(argv)
+			if "dry_run" in args and args.dry_run:
+				# a dry run must leave the crontab of the daemon untouched
+				cron = TCronTab(tab=cron.render())
+			SuperCron.crontab = cron
+			args.func(args)
+		except SystemExit as e:
+			if e.code is None or isinstance(e.code, int):
+				return e.code or 0
+			print(e.code)
+			return 1
+		finally:
+			SuperCron.crontab = None
+		return 0
+
 	@staticmethod
 	def interactive_mode():
 		try:
@@ -407,23 +963,172 @@ class SuperCron:
 		except KeyboardInterrupt:
 			Utils.debug_print("\nCancelled.")
 
+	@staticmethod
+	def apply_operation(cron, args, mode="in input mode"):
+		"""validate a parsed subcommand, apply it to cron without writing it and return the count of jobs affected
+		(mode names the caller in the errors about subcommands it does not support)"""
+		if "func" not in args:
+			raise ValueError("missing subcommand.")
+		if args.func == SuperCron.add_job:
+			name = SuperCron.check_name(str(args.name))
+			repeat = SuperCron.get_repeat(str(args.repetition[0]))
+			if args.spread:
+				repeat = SuperCron.spread_repeat(cron, str(args.repetition[0]), name, args.spread)
+			command = str(args.command[0])
+			policy = SuperCron.get_policy(args.policy) if args.policy else ""
+			if policy or args.wrap:
+				command = JobRunner.wrap(name, command, policy)
+			cron.add_job(name, command, repeat, policy)
+			return 1
+		elif args.func == SuperCron.rename_job:
+			new_name = SuperCron.check_name(str(args.new_name))
+			return cron.rename_job(str(args.old_name), new_name)
+		elif args.func == SuperCron.delete_job:
+			return cron.delete_job(str(args.name))
+		elif args.func in (SuperCron.enable_job, SuperCron.disable_job):
+			return cron.enable_job(str(args.name), args.func == SuperCron.enable_job)
+		elif args.func == SuperCron.trigger_job:
+			return cron.trigger_job(str(args.name), SuperCron.get_trigger(str(args.trigger[0])))
+		elif args.func == SuperCron.policy_job:
+			return cron.policy_job(str(args.name), SuperCron.get_policy(str(args.policy[0])))
+		elif args.func == SuperCron.apply_jobs and not args.plan:
+			return len(cron.reconcile(SuperCron.load_desired(args.file)))
+		elif args.func == SuperCron.clear_jobs and args.force:
+			return cron.clear_jobs()
+		elif args.func == SuperCron.clear_jobs:
+			raise ValueError("subcommand 'clear' needs option '-f' {}.".format(mode))
+		else:
+			raise ValueError("subcommand not supported {}.".format(mode))
+
+	@staticmethod
+	def fan_out(argv):
+		"""apply a subcommand line to the crontabs of SuperCron.storages in parallel and print their results"""
+		try:
+			args = SuperCron.build_parser(LineParser).parse_args(argv)
+			# invalid names, repetitions or triggers fail once here, before any crontab is read
+			SuperCron.apply_operation(TCronTab(tab=""), args, SuperCron.FAN_OUT_MODE)
+		except ValueError as e:
+			Utils.debug_print("Error: {}".format(e))
+			sys.exit(1)
+		dry_run = "dry_run" in args and args.dry_run
+		outcome = FanOut.apply(SuperCron.storages, lambda cron: SuperCron.apply_operation(cron, args, SuperCron.FAN_OUT_MODE),
+			SuperCron.workers, dry_run)
+		SuperCron.print_table(["Crontab", "Jobs", "Time (ms)", "Result"],
+			[[result.name, "-" if result.error else str(result.value), "{:.1f}".format(result.seconds * 1000),
+			"Error: " + result.error if result.error else "ok"] for result in outcome.results])
+		Utils.debug_print("{} crontabs {}, {} failed, in {:.3f} s.".format(
+			len(outcome.results) - len(outcome.failures), "checked (dry run)" if dry_run else "changed",
+			len(outcome.failures), outcome.seconds))
+		if outcome.failures:
+			sys.exit(1)
+
 	@staticmethod
 	def input_mode(input_file):
-		with open(input_file, "r") as infile:
-			for line in infile:
-				if (line):
-					splitted = line.split(" ")
-					if len(splitted) > 1:
-						cmd = splitted[0]
-						args = " ".join(splitted[1:])
+		"""apply the subcommand lines of a file ('-' for stdin) with a single crontab write"""
+		import shlex
+		parser = SuperCron.build_parser(LineParser)
+		count = 0
+		errors = 0
+		infile = sys.stdin if input_file == "-" else open(input_file, "r")
+		try:
+			with SuperCron.transaction() as cron:
+				for number, line in enumerate(infile, 1):
+					line = line.strip()
+					if not line or line.startswith("#"):
+						continue
+					try:
+						SuperCron.apply_operation(cron, parser.parse_args(shlex.split(line)))
+						count += 1
+					except ValueError as e:
+						Utils.debug_print("Error on line {}: {}".format(number, e))
+						errors += 1
+		finally:
+			if infile is not sys.stdin:
+				infile.close()
+		Utils.debug_print("{} operations applied, {} lines with errors.".format(count, errors))
+		if errors:
+			sys.exit(1)
 
 
 def main():
-	if len(sys.argv) == 1:
+	use_daemon = True
+	profile = None
+	storage = os.environ.get("SUPERCRON_STORAGE")
+	users = []
+	# global options, valid with every mode
+	while len(sys.argv) > 1 and sys.argv[1] in ("--no-cache", "--profile", "--profile-json", "--storage", "--users",
+			"--user-file", "--workers"):
+		option = sys.argv.pop(1)
+		if option == "--no-cache":
+			# also bypasses the crontab held by the daemon
+			TCronTab.SNAPSHOTS = False
+			use_daemon = False
+		elif option in ("--profile", "--profile-json"):
+			profile = option
+		elif len(sys.argv) < 2:
+			Utils.debug_print("Error: option {} needs a value.".format(option))
+			sys.exit(2)
+		elif option == "--storage":
+			storage = sys.argv.pop(1)
+		elif option == "--users":
+			users.extend(user.strip() for user in sys.argv.pop(1).split(",") if user.strip())
+		elif option == "--user-file":
+			try:
+				users.extend(FanOut.read_users(sys.argv.pop(1)))
+			except (IOError, OSError) as e:
+				Utils.debug_print("Error: {}.".format(e))
+				sys.exit(2)
+		else:
+			try:
+				SuperCron.workers = int(sys.argv.pop(1))
+			except ValueError:
+				SuperCron.workers = 0
+			if SuperCron.workers < 1:
+				Utils.debug_print("Error: option --workers needs a number of at least 1.")
+				sys.exit(2)
+	if users:
+		try:
+			SuperCron.storages = [FanOut.storage_of(user) for user in users]
+		except ValueError as e:
+			Utils.debug_print("Error: {}".format(e))
+			sys.exit(2)
+		use_daemon = False
+	elif storage:
+		try:
+			SuperCron.storage = Storage.parse(storage)
+		except ValueError as e:
+			Utils.debug_print("Error: {}".format(e))
+			sys.exit(2)
+		# the daemon holds user's crontab
+		use_daemon = False
+	if profile:
+		Timing.enable()
+		Timing.add("imports", IMPORTED - STARTED)
+	try:
+		with Timing.span("total"):
+			run(use_daemon)
+	finally:
+		if profile:
+			Timing.write(as_json=profile == "--profile-json")
+
+def run(use_daemon):
+	if sys.argv[1:] in (["-V"], ["--version"]):
+		# without building the parser
+		print("SuperCron v{}".format(SuperCron.VERSION))
+	elif sys.argv[1:2] == ["exec"] and "-h" not in sys.argv[2:3] and "--help" not in sys.argv[2:3]:
+		# run by cron at every firing of a wrapped job, also without building the parser
+		sys.exit(JobRunner.main(sys.argv[2:]))
+	elif SuperCron.storages is not None:
+		SuperCron.fan_out(sys.argv[1:])
+	elif len(sys.argv) == 1:
 		SuperCron.interactive_mode()
 	elif len(sys.argv) == 3 and sys.argv[1] == "--input":
 		SuperCron.input_mode(sys.argv[2])
 	else:
+		with Timing.span("daemon"):
+			status = DaemonClient.forward(sys.argv[1:]) if use_daemon else None
+		if status is not None:
+			sys.exit(status)
 		SuperCron.parse_arguments()
 	sys.exit(0)
 
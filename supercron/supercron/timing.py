@@ -0,0 +1,98 @@
+import sys
+import time
+from functools import wraps
+from contextlib import contextmanager
+
+# highest resolution clock available
+clock = getattr(time, "perf_counter", time.time)
+
+# time the modules of SuperCron started being imported
+STARTED = clock()
+
+
+class Timing(object):
+	"""class for timing the spans of SuperCron operations, which costs one test per span while disabled"""
+
+	enabled = False
+	# (path of names from the outermost span) -> [calls, seconds], in the order the spans were entered
+	spans = {}
+	order = []
+	# names of the spans being timed
+	stack = []
+
+	@staticmethod
+	def enable():
+		Timing.enabled = True
+		Timing.spans, Timing.order, Timing.stack = {}, [], []
+
+	@staticmethod
+	def entry(name):
+		"""return the [calls, seconds] of name inside the spans being timed"""
+		path = tuple(Timing.stack) + (name,)
+		entry = Timing.spans.get(path)
+		if entry is None:
+			entry = Timing.spans[path] = [0, 0.0]
+			Timing.order.append(path)
+		return entry
+
+	@staticmethod
+	def add(name, seconds):
+		"""count a call of name lasting seconds, timed by other means than a span"""
+		entry = Timing.entry(name)
+		entry[0] += 1
+		entry[1] += seconds
+
+	@staticmethod
+	@contextmanager
+	def span(name):
+		if not Timing.enabled:
+			yield
+			return
+		entry = Timing.entry(name)
+		Timing.stack.append(name)
+		start = clock()
+		try:
+			yield
+		finally:
+			Timing.stack.pop()
+			entry[0] += 1
+			entry[1] += clock() - start
+
+	@staticmethod
+	def timed(name):
+		"""decorator timing every call of a function as a span"""
+		def decorator(function):
+			@wraps(function)
+			def timed_function(*args, **kwargs):
+				if not Timing.enabled:
+					return function(*args, **kwargs)
+				with Timing.span(name):
+					return function(*args, **kwargs)
+			return timed_function
+		return decorator
+
+	@staticmethod
+	def report():
+		"""return the spans as dicts, each one with its calls and its total and own milliseconds"""
+		report = []
+		for path in Timing.order:
+			calls, seconds = Timing.spans[path]
+			inner = sum(Timing.spans[other][1] for other in Timing.order
+				if len(other) == len(path) + 1 and other[:-1] == path)
+			report.append({"span": "/".join(path), "depth": len(path) - 1, "calls": calls,
+				"total_ms": round(seconds * 1000, 3), "self_ms": round((seconds - inner) * 1000, 3)})
+		return report
+
+	@staticmethod
+	def write(out=None, as_json=False):
+		"""write the timing breakdown to out (stderr by default), as a table or as one JSON line"""
+		out = out or sys.stderr
+		report = Timing.report()
+		if as_json:
+			import json
+			out.write(json.dumps({"spans": report}) + "\n")
+			return
+		out.write("{:<40}{:>8}{:>12}{:>12}\n".format("span", "calls", "total ms", "self ms"))
+		for span in report:
+			name = "  " * span["depth"] + span["span"].split("/")[-1]
+			out.write("{:<40}{:>8}{:>12.3f}{:>12.3f}\n".format(name, span["calls"], span["total_ms"], span["self_ms"]))
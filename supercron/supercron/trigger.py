@@ -1,27 +1,122 @@
-import codecs
+import gc
+import os
+import re
+import sys
 import subprocess as sp
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+	import fcntl
+except ImportError:
+	# no file locks on Windows, where there is no crontab command either
+	fcntl = None
 
 from crontab import CronTab, CronItem
 
+try:
+	from snapshot import Snapshot
+	from placement import Occupancy
+	from timing import Timing
+	from storage import CommandStorage, FileStorage, MemoryStorage
+	from runner import JobRunner
+	from namespace import Namespace
+	from expression import TriggerExpression
+except ImportError:
+	from supercron.snapshot import Snapshot
+	from supercron.placement import Occupancy
+	from supercron.timing import Timing
+	from supercron.storage import CommandStorage, FileStorage, MemoryStorage
+	from supercron.runner import JobRunner
+	from supercron.namespace import Namespace
+	from supercron.expression import TriggerExpression
+
+
+@contextmanager
+def paused_gc():
+	"""pause the cyclic garbage collector, which would scan again and again while many jobs are built"""
+	enabled = gc.isenabled()
+	gc.disable()
+	try:
+		yield
+	finally:
+		if enabled:
+			gc.enable()
+
+
+def journaled(operation):
+	"""record the calls of a crontab operation, to apply them again if the crontab changed meanwhile"""
+	@wraps(operation)
+	def journaled_operation(self, *args):
+		result = operation(self, *args)
+		self.journal.append((operation.__name__, args))
+		return result
+	return journaled_operation
+
 
 class TCronTab(CronTab):
 	"""class for extending CronTab with triggers"""
 
 	PREFIX = "SuperCron__"
+
+	# load the jobs of user crontabs from the on-disk snapshot cache when it is up to date
+	SNAPSHOTS = True
+
+	# times the operations are applied again to a crontab changed by someone else before giving up
+	RETRIES = 5
 	
-	def __init__(self, user=None, tab=None, tabfile=None, log=None):
+	def __init__(self, user=None, tab=None, tabfile=None, log=None, storage=None):
+		"""read the crontab of storage, or else of tab (in memory), tabfile or user (crontab command)"""
+		self._transactions = 0
+		self.journal = []
+		# jobs by name, and triggered jobs by the (name, state) terms of their triggers
+		self._names = {}
+		self._triggers = {}
+		self._occupancy = None
+		self.storage = storage
 		super(TCronTab, self).__init__(user, tab, tabfile, log)
 
+	@property
+	def intab(self):
+		"""content of a crontab held in memory, None for the other storages (like CronTab.intab)"""
+		if isinstance(self.storage, MemoryStorage):
+			return self.storage.content
+		return None
+
+	@intab.setter
+	def intab(self, tab):
+		# CronTab.__init__ sets None when there is no tab, which leaves the given storage
+		if tab is not None:
+			self.storage = MemoryStorage(tab)
+
+	command_line = staticmethod(CommandStorage.command_line)
+
 	def pipeOpen(self, cmd, *args, **flags):
-		l = tuple(cmd.split(' '))
-		for (k,v) in flags.items():
-			if v is not None:
-				l += len(k)==1 and ("-%s" % (k,), str(v)) or ("--%s=%s" % (k,v),)
-		l += tuple(args)
-		return sp.Popen(tuple(a for a in l if a), stdout=sp.PIPE, stderr=sp.PIPE)
+		return sp.Popen(self.command_line(cmd, *args, **flags), stdout=sp.PIPE, stderr=sp.PIPE)
 
 	def find_comment(self, comment):
-		return super(TCronTab, self).find_comment(self.PREFIX + comment)
+		comment = self.PREFIX + comment
+		for job in self.find_name(comment[len(self.PREFIX):]):
+			if job.comment == comment:
+				yield job
+
+	def index_job(self, job):
+		"""add job to the name and trigger indexes"""
+		self._names.setdefault(job.get_name(), {})[id(job)] = job
+		for trigger in job.get_triggers():
+			for atom in trigger.atoms:
+				self._triggers.setdefault(atom, {})[id(job)] = job
+
+	def unindex_job(self, job):
+		"""remove job from the name and trigger indexes"""
+		keys = [(self._names, job.get_name())]
+		for trigger in job.get_triggers():
+			keys.extend((self._triggers, atom) for atom in trigger.atoms)
+		for index, key in keys:
+			jobs = index.get(key)
+			if jobs and jobs.pop(id(job), None) is not None and not jobs:
+				del index[key]
 
 	def new(self, command="", comment="", user=None):
 		if not user and self.user is False:
@@ -29,54 +124,467 @@ class TCronTab(CronTab):
 		item = TCronItem(command=command, comment=self.PREFIX + comment, user=user, cron=self)
 		self.crons.append(item)
 		self.lines.append(item)
+		self.index_job(item)
 		return item
 
+	def remove(self, *items):
+		"""remove jobs from the crontab, filtering the lists only once"""
+		removed = set(id(item) for item in items)
+		for item in items:
+			self.unindex_job(item)
+			if self._occupancy is not None:
+				self._occupancy.remove(item)
+		count = len(self.crons)
+		self.crons = [item for item in self.crons if id(item) not in removed]
+		self.lines = [line for line in self.lines if id(line) not in removed]
+		return count - len(self.crons)
+
+	@Timing.timed("read")
 	def read(self, filename=None):
 		self.crons = []
 		self.lines = []
-		lines = []
-		if self.intab is not None:
-			lines = self.intab.split('\n')
-		elif filename:
+		self._names = {}
+		self._triggers = {}
+		self._occupancy = None
+		self.propagation = []
+		self.cycles = []
+		# operations applied since the crontab was read
+		self.journal = []
+		# hash of the content this crontab was read from
+		self.digest = None
+		if filename:
 			self.filen = filename
-			with codecs.open(filename, 'r', encoding='utf-8') as fhl:
-				lines = fhl.readlines()
-		elif self.user:
-			(out, err) = self.pipeOpen("crontab", l='', **self.user_opt).communicate()
-			if err and 'no crontab for' in str(err):
-				pass
-			elif err:
-				raise IOError("Read crontab %s: %s" % (self.user, err))
-			lines = out.decode('utf-8').split("\n")
-		for line in lines:
-			cron = TCronItem(line, cron=self)
-			if cron.is_valid():
-				self.crons.append(cron)
-				self.lines.append(cron)
-			else:
-				self.lines.append(line.replace('\n', ''))
+			self.storage = FileStorage(filename)
+		elif self.storage is None and self.user:
+			self.storage = CommandStorage(self._user)
+		if self.storage is None:
+			return
+		content = self.storage.read()
+		lines = content.decode('utf-8').split("\n")
+		if self.storage.key is None:
+			self.parse_lines(lines)
+			return
+		self.digest = Snapshot.digest(content)
+		if self.SNAPSHOTS and self.storage.snapshots:
+			self.read_snapshot(self.digest, lines)
+		else:
+			self.parse_lines(lines)
+
+	def read_digest(self):
+		"""return the hash of the crontab as it is now in its storage, without parsing it"""
+		return self.storage.digest()
+
+	@Timing.timed("parse")
+	def parse_lines(self, lines):
+		with paused_gc():
+			for line in lines:
+				cron = TCronItem(line, cron=self)
+				if cron.is_valid():
+					cron._line = line.rstrip("\r\n")
+					self.append_line(cron)
+				else:
+					self.lines.append(line.replace('\n', ''))
 
+	def append_line(self, line):
+		if isinstance(line, TCronItem):
+			self.crons.append(line)
+			self.index_job(line)
+			for trigger in line.get_triggers():
+				if trigger.tree is None:
+					sys.stderr.write("Warning: trigger '{}' of job '{}' cannot be read, it never fires.\n".format(
+						trigger.compact, line.get_name()))
+		self.lines.append(line)
+
+	@Timing.timed("snapshot")
+	def read_snapshot(self, digest, lines):
+		"""load the jobs from the snapshot of this content, parsing and caching them on a miss"""
+		key = self.storage.key
+		encoded = Snapshot.load(key, digest)
+		if encoded is not None:
+			try:
+				with paused_gc():
+					for line in Snapshot.decode_lines(encoded, TCronItem, self):
+						self.append_line(line)
+				return
+			except Exception:
+				# a corrupted snapshot is not an error, the crontab is parsed instead
+				self.crons, self.lines, self._names, self._triggers = [], [], {}, {}
+		self.parse_lines(lines)
+		Snapshot.save(key, digest, self.lines)
+
+	@Timing.timed("write")
+	def write(self, filename=None):
+		if filename:
+			self.filen = filename
+			self.storage = FileStorage(filename)
+			# a new file has nothing in common with what was read
+			self.digest = None
+		if self._transactions:
+			# the outermost transaction writes once when it ends
+			return
+		if self.storage is None:
+			raise IOError("Write crontab: no storage to write to")
+		with self.lock():
+			retries = self.RETRIES
+			while self.digest is not None and self.read_digest() != self.digest:
+				if not retries:
+					raise IOError("Write crontab %s: changed by someone else %d times in a row" % (
+						self.storage.key, self.RETRIES))
+				retries -= 1
+				self.replay()
+			content = self.render().encode('utf-8')
+			self.storage.write(content)
+		if self.storage.key is not None:
+			# what was written is what the next read gets
+			self.digest = Snapshot.digest(content)
+			self.journal = []
+			if self.SNAPSHOTS and self.storage.snapshots:
+				Snapshot.save(self.storage.key, self.digest, self.lines)
+
+	def write_to_user(self, user=None):
+		"""write the crontab to user's crontab (or the one it was read from), whatever it was read from"""
+		if user is not None:
+			self._user = user
+		if not isinstance(self.storage, CommandStorage) or (user is not None and self.storage.user != user):
+			self.storage = CommandStorage(self._user)
+			self.filen = None
+			self.digest = None
+		self.write()
+
+	def lock(self):
+		"""hold the lock of the crontab, which serializes the writes of SuperCron processes"""
+		return TCronTab.lock_key(self.storage.key)
+
+	@staticmethod
+	@contextmanager
+	def lock_key(key):
+		"""hold the lock of the crontab of a storage key, doing nothing for storages without a key"""
+		if fcntl is None or key is None:
+			yield
+			return
+		directory = Snapshot.directory()
+		try:
+			os.makedirs(directory)
+		except OSError:
+			# already there, possibly created by another thread in the meantime
+			if not os.path.isdir(directory):
+				raise
+		with open(os.path.join(directory, "{}.lock".format(key)), "a") as f:
+			with Timing.span("lock"):
+				fcntl.flock(f, fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(f, fcntl.LOCK_UN)
+
+	def replay(self):
+		"""read the crontab again and apply the operations of the journal to it"""
+		journal = self.journal
+		self.read()
+		for name, args in journal:
+			getattr(self, name)(*args)
+
+	@contextmanager
+	def transaction(self):
+		"""defer all writes inside the block and commit them with a single write"""
+		self._transactions += 1
+		try:
+			yield self
+		finally:
+			self._transactions -= 1
+		# not reached if the block raised, so nothing gets written
+		if not self._transactions:
+			self.write()
+
+	@Timing.timed("render")
 	def render(self):
 		self.lines = [line for line in self.lines if str(line).strip()]
 		return super(TCronTab, self).render()
 
 	def find_name(self, name):
-		for job in self.crons:
-			if job.get_name() == name:
-				yield job
+		"""return an iter of the jobs named 'name' (safe to modify while iterating)"""
+		return iter(list(self._names.get(name, {}).values()))
 
 	def find_trigger(self, trigger_list):
-		for job in self.crons:
-			if job.get_trigger() == trigger_list:
-				yield job
+		"""return an iter of the jobs having this trigger ([action, name, state], or a TriggerExpression)"""
+		if not isinstance(trigger_list, TriggerExpression):
+			trigger_list = TriggerExpression(trigger_list[0], ("is",) + tuple(trigger_list[1:]))
+		jobs = self._triggers.get(trigger_list.atoms[0], {}).values()
+		return iter([job for job in jobs if trigger_list in job.get_triggers()])
+
+	def find_triggered(self, event):
+		"""return the (job, trigger) pairs of the triggers having the (name, state) event as a term,
+		in the order of TriggerExpression.ACTIONS"""
+		pairs = [(job, trigger) for job in self._triggers.get(event, {}).values()
+			for trigger in job.get_triggers() if event in trigger.atoms]
+		pairs.sort(key=lambda pair: TriggerExpression.ACTIONS.index(pair[1].action))
+		return pairs
+
+	def is_in_state(self, name, state):
+		"""return whether the jobs named name are in a state: some is enabled (enabled), they all are
+		disabled (disabled), there is one (added) or none (deleted); toggled is not a lasting state"""
+		jobs = self._names.get(name)
+		if state == "deleted":
+			return not jobs
+		if not jobs or state == "toggled":
+			return False
+		if state == "added":
+			return True
+		enabled = any(job.is_enabled() for job in jobs.values())
+		return enabled if state == "enabled" else not enabled
+
+	@Timing.timed("triggers")
+	def activate_triggered_jobs(self, name, state):
+		"""fire the triggers of 'name' being 'state', then breadth-first the triggers of
+		the jobs they switched. Only the triggers having the event as a term are evaluated,
+		and each (name, state) event fires at most once, so cycles stop where they close.
+		The switched jobs are appended to self.propagation as (depth, name, state, job) and
+		the cycles to self.cycles; the switched jobs of this cascade are returned"""
+		changed = []
+		root = (name, state)
+		parents = {root: None}
+		queue = deque([(root, 1)])
+		while queue:
+			event, depth = queue.popleft()
+			for job, trigger in self.find_triggered(event):
+				# the event is the only term of a simple trigger, which holds then
+				if not (trigger.is_simple() or trigger.evaluate(event, self.is_in_state)):
+					continue
+				enabled = not job.is_enabled() if trigger.action == "toggle" else trigger.action == "on"
+				if enabled == job.is_enabled():
+					continue
+				job.enable(enabled)
+				changed.append(job)
+				self.propagation.append((depth,) + event + (job,))
+				job_name = job.get_name()
+				for new_event in ((job_name, "enabled" if enabled else "disabled"), (job_name, "toggled")):
+					if new_event not in parents:
+						parents[new_event] = event
+						queue.append((new_event, depth + 1))
+					elif self.is_triggering(new_event):
+						# the event already fired, and firing it again would loop
+						self._add_cycle(parents, event, new_event)
+		return changed
+
+	def is_triggering(self, event):
+		"""return True if some trigger depends on the (name, state) event"""
+		return tuple(event) in self._triggers
+
+	def _add_cycle(self, parents, event, new_event):
+		"""record the path from new_event to event, if new_event is one of its ancestors"""
+		path = [event]
+		while path[-1] is not None and path[-1] != new_event:
+			path.append(parents[path[-1]])
+		if path[-1] is not None:
+			path.reverse()
+			self.cycles.append(path + [new_event])
+
+	def occupancy(self):
+		"""return the number of jobs starting at every minute of the day, kept up to date by add_job and remove"""
+		if self._occupancy is None:
+			self._occupancy = Occupancy(self.crons)
+		return self._occupancy
+
+	@journaled
+	def add_job(self, name, command, repeat, policy=None):
+		"""add a SuperCron job from a parsed repetition and fire its triggers"""
+		job = self.new(command=command, comment=name)
+		job.set_repetition(repeat)
+		if policy:
+			job.set_policy(policy)
+		if self._occupancy is not None:
+			self._occupancy.add(job)
+		job.enable()
+		self.activate_triggered_jobs(name, "added")
+		return job
+
+	@journaled
+	def rename_job(self, old_name, new_name):
+		count = 0
+		for job in self.find_name(old_name):
+			job.set_name(new_name)
+			wrapped = JobRunner.unwrap(job.command) if job.is_superjob() else None
+			if wrapped:
+				# the runs of the job are logged under its new name
+				job.set_command(JobRunner.wrap(new_name, wrapped[2], wrapped[1]))
+			count += 1
+		if count:
+			self.activate_triggered_jobs(old_name, "deleted")
+			self.activate_triggered_jobs(new_name, "added")
+		return count
 
-	def activate_triggered_jobs(self, job, state):
-		for job in self.find_trigger(["toggle", job, state]):
-			job.enable(not job.is_enabled())
-		for job in self.find_trigger(["on", job, state]):
-			job.enable(True)
-		for job in self.find_trigger(["off", job, state]):
-			job.enable(False)
+	@journaled
+	def delete_job(self, name):
+		jobs = list(self.find_name(name))
+		self.remove(*jobs)
+		if jobs:
+			self.activate_triggered_jobs(name, "deleted")
+		return len(jobs)
+
+	@journaled
+	def enable_job(self, name, enable_it):
+		count = 0
+		for job in self.find_name(name):
+			if job.is_enabled() != enable_it:
+				job.enable(enable_it)
+				count += 1
+		if count:
+			self.activate_triggered_jobs(name, "enabled" if enable_it else "disabled")
+		self.activate_triggered_jobs(name, "toggled")
+		return count
+
+	@journaled
+	def trigger_job(self, name, trigger):
+		"""set the trigger list of all jobs named 'name' (empty trigger removes it)"""
+		count = 0
+		for job in self.find_name(name):
+			job.set_trigger(trigger)
+			count += 1
+		return count
+
+	@journaled
+	def policy_job(self, name, policy):
+		"""set the overlap policy of all jobs named 'name' (empty policy removes it)
+
+		The policy is enforced by the wrapper, so the commands of the jobs are wrapped if they were not;
+		removing the policy leaves the commands that are not wrapped alone.
+		"""
+		count = 0
+		for job in self.find_name(name):
+			if not job.is_superjob():
+				continue
+			wrapped = JobRunner.unwrap(job.command)
+			if policy or wrapped:
+				job.set_command(JobRunner.wrap(wrapped[0] if wrapped else name, wrapped[2] if wrapped else job.command,
+					policy or None))
+			job.set_policy(policy)
+			count += 1
+		return count
+
+	@staticmethod
+	def job_key(job):
+		"""return the (name, schedule, command) of a SuperCron job, its command unwrapped if wrapped"""
+		wrapped = JobRunner.unwrap(job.command)
+		return job.get_name(), str(job.slices), wrapped[2] if wrapped else job.command
+
+	@staticmethod
+	def differences(job, spec):
+		"""return the fields of job that differ from the desired job spec (see DesiredJobs.resolve)"""
+		wrapped = JobRunner.unwrap(job.command)
+		fields = []
+		if str(job.slices) != spec.slices:
+			fields.append("schedule")
+		if (wrapped[2] if wrapped else job.command) != spec.command:
+			fields.append("command")
+		if job.is_enabled() != spec.enabled:
+			fields.append("enabled")
+		if tuple(trigger.compact for trigger in job.get_triggers()) != (spec.trigger or ()):
+			fields.append("trigger")
+		if job.get_policy() != spec.policy:
+			fields.append("policy")
+		if (bool(wrapped) != spec.wrap) or (wrapped and wrapped[:2] != (spec.name, spec.policy)):
+			fields.append("wrap")
+		return fields
+
+	@Timing.timed("plan")
+	def plan(self, desired):
+		"""return the changes turning the SuperCron jobs into the desired ones, as Namespaces of an action
+		(add, remove, modify, enable or disable), a job name, the current job, the desired one and the fields changed
+
+		Jobs are matched in linear time: first on the hash of their name, schedule and command, then
+		the desired jobs left on their name alone (modified), and the current jobs left are removed.
+		"""
+		superjobs = [job for job in self.crons if job.is_superjob()]
+		current = {}
+		for job in superjobs:
+			current.setdefault(self.job_key(job), deque()).append(job)
+		matched = set()
+		pairs = []
+		for spec in desired:
+			jobs = current.get((spec.name, spec.slices, spec.command))
+			job = jobs.popleft() if jobs else None
+			if job is not None:
+				matched.add(id(job))
+			pairs.append((spec, job))
+		by_name = {}
+		for job in superjobs:
+			if id(job) not in matched:
+				by_name.setdefault(job.get_name(), deque()).append(job)
+		changes = []
+		for spec, job in pairs:
+			if job is None:
+				jobs = by_name.get(spec.name)
+				job = jobs.popleft() if jobs else None
+			if job is None:
+				changes.append(Namespace({"action": "add", "name": spec.name, "job": None, "desired": spec,
+					"fields": []}))
+				continue
+			matched.add(id(job))
+			fields = self.differences(job, spec)
+			if fields == ["enabled"]:
+				action = "enable" if spec.enabled else "disable"
+			elif fields:
+				action = "modify"
+			else:
+				continue
+			changes.append(Namespace({"action": action, "name": spec.name, "job": job, "desired": spec,
+				"fields": fields}))
+		for job in superjobs:
+			if id(job) not in matched:
+				changes.append(Namespace({"action": "remove", "name": job.get_name(), "job": job, "desired": None,
+					"fields": []}))
+		return changes
+
+	def apply_desired(self, job, spec):
+		"""set the schedule, command, trigger, policy and state of job to those of the desired job spec"""
+		if str(job.slices) != spec.slices:
+			if self._occupancy is not None:
+				self._occupancy.remove(job)
+			job.setall(spec.slices)
+			if self._occupancy is not None:
+				self._occupancy.add(job)
+		command = spec.command
+		if spec.wrap:
+			wrapped = JobRunner.unwrap(job.command)
+			# a command wrapped the same way is kept, whatever the path of the wrapper
+			if wrapped and wrapped == (spec.name, spec.policy, spec.command):
+				command = job.command
+			else:
+				command = JobRunner.wrap(spec.name, spec.command, spec.policy)
+		if command != job.command:
+			job.set_command(command)
+		if tuple(trigger.compact for trigger in job.get_triggers()) != (spec.trigger or ()):
+			job.set_trigger([TriggerExpression.decode(compact) for compact in spec.trigger or ()])
+		if job.get_policy() != spec.policy:
+			job.set_policy(spec.policy)
+		job.enable(spec.enabled)
+
+	@journaled
+	def reconcile(self, desired):
+		"""apply the changes planned for the desired jobs and return them
+
+		The desired jobs are the whole state wanted, so the changes do not fire triggers: a job switched
+		by a trigger would differ from the desired file again.
+		"""
+		changes = self.plan(desired)
+		removed = []
+		for change in changes:
+			if change.action == "remove":
+				removed.append(change.job)
+			elif change.action == "add":
+				job = self.new(command=change.desired.command, comment=change.name)
+				job.setall(change.desired.slices)
+				self.apply_desired(job, change.desired)
+				if self._occupancy is not None:
+					self._occupancy.add(job)
+			else:
+				self.apply_desired(change.job, change.desired)
+		self.remove(*removed)
+		return changes
+
+	@journaled
+	def clear_jobs(self):
+		return self.remove(*[job for job in self.crons if job.is_superjob()])
 
 
 class TCronItem(CronItem):
@@ -84,60 +592,174 @@ class TCronItem(CronItem):
 
 	PREFIX = "SuperCron__"
 	SEPARATOR = "%"
+	# between the compact forms of the triggers of a job
+	TRIGGER_SEPARATOR = ";"
+	# separators, the ';' of job names being escaped
+	TRIGGER_SPLIT = re.compile(r"(?<!\\);")
+
+	# the comment is decoded into _superjob, _name, _trigger and _policy, so it is not parsed again
+	# on every name or trigger lookup, and _line holds the line read from the crontab, rendered again
+	# only once the job is changed (no __slots__: CronItem has none, so every job has a __dict__ anyway)
 
 	def __init__(self, line=None, command='', comment='', user=None, cron=None):
 		super(TCronItem, self).__init__(line, command, comment, user, cron)
+		self._line = None
+
+	def render(self):
+		if self._line is not None:
+			return self._line
+		return super(TCronItem, self).render()
+
+	def enable(self, enabled=True):
+		if enabled in (True, False) and enabled != self.enabled:
+			self._line = None
+		return super(TCronItem, self).enable(enabled)
+
+	def set_command(self, cmd):
+		self._line = None
+		super(TCronItem, self).set_command(cmd)
+
+	def setall(self, *args):
+		self._line = None
+		return super(TCronItem, self).setall(*args)
+
+	def set_repetition(self, repeat):
+		"""set the time slices of the job from a parsed repetition dict"""
+		self._line = None
+		if "reboot" in repeat:
+			self.every_reboot()
+			return
+		if "min_every" in repeat:
+			self.minute.every(repeat['min_every'])
+		if "min_on" in repeat:
+			self.minute.on(repeat['min_on'])
+		if "hour_every" in repeat:
+			self.hour.every(repeat['hour_every'])
+		if "hour_on" in repeat:
+			self.hour.on(repeat['hour_on'])
+		if "day_every" in repeat:
+			self.day.every(repeat['day_every'])
+		if "day_on" in repeat:
+			self.day.on(repeat['day_on'])
+		if "dow_on" in repeat:
+			self.dow.on(*repeat['dow_on'])
+		if "dow_during" in repeat:
+			self.dow.during(*repeat['dow_during'])
+		if "month_every" in repeat:
+			self.month.every(repeat['month_every'])
+		if "month_during" in repeat:
+			self.month.during(*repeat['month_during'])
+		if "month_on" in repeat:
+			self.month.on(*repeat['month_on'])
+
+	@property
+	def comment(self):
+		"""the raw comment, rendered again from the decoded fields after a change"""
+		if self._comment is None:
+			if not self._superjob:
+				self._comment = self._name
+			elif self._policy:
+				# NAME%TRIGGERS%POLICY, with empty triggers if there are none
+				self._comment = self.PREFIX + self._name + self.SEPARATOR + self.TRIGGER_SEPARATOR.join(
+					trigger.compact for trigger in self._trigger or ()) + self.SEPARATOR + self._policy
+			elif self._trigger:
+				self._comment = self.PREFIX + self._name + self.SEPARATOR + self.TRIGGER_SEPARATOR.join(
+					trigger.compact for trigger in self._trigger)
+			else:
+				self._comment = self.PREFIX + self._name
+		return self._comment
+
+	@comment.setter
+	def comment(self, comment):
+		"""decode the prefix, name, triggers and overlap policy of the comment once"""
+		self._line = None
+		self._comment = comment
+		self._superjob = bool(comment) and comment.startswith(self.PREFIX)
+		self._trigger = None
+		self._policy = None
+		if not self._superjob:
+			# not a SuperCron job
+			self._name = comment
+			return
+		sep = comment.find(self.SEPARATOR)
+		if sep == -1:
+			self._name = comment[len(self.PREFIX):]
+		else:
+			self._name = comment[len(self.PREFIX):sep]
+			trigger, _, policy = comment[sep+1:].partition(self.SEPARATOR)
+			if trigger:
+				parts = self.TRIGGER_SPLIT.split(trigger) if "\\" in trigger else trigger.split(self.TRIGGER_SEPARATOR)
+				self._trigger = tuple(TriggerExpression.decode(part) for part in parts)
+				if len(self._trigger) > 1 and any(part.tree is None for part in self._trigger):
+					# a single trigger written before ';' was escaped, like "on:tests;lint:disabled"
+					whole = TriggerExpression.decode(trigger)
+					if whole.tree is not None:
+						self._trigger = (whole,)
+			self._policy = policy or None
 
 	def is_superjob(self):
-		return self.comment.startswith(self.PREFIX)
+		return self._superjob
 
 	def get_name(self):
-		if self.is_superjob():
-			sep = self.comment.find(self.SEPARATOR)
-			if sep == -1:
-				return self.comment[len(self.PREFIX):]
-			return self.comment[len(self.PREFIX):sep]
-		else:
-			# not a SuperCron job
-			return self.comment
+		return self._name
 
 	def set_name(self, name):
-		if self.is_superjob():
-			sep = self.comment.find(self.SEPARATOR)
-			if sep == -1 or sep == len(self.comment) - 1:
-				self.comment = self.PREFIX + name
-			else:
-				self.comment = self.PREFIX + name + self.SEPARATOR + self.comment[sep+1:]
-		elif self.comment:
-			# this is not a SuperCron job, so don't edit
-			pass
+		if isinstance(self.cron, TCronTab):
+			self.cron.unindex_job(self)
+			self._set_name(name)
+			self.cron.index_job(self)
 		else:
-			self.comment = name
+			self._set_name(name)
+
+	def _set_name(self, name):
+		if self._superjob or not self._name:
+			# comments of jobs not added by SuperCron are not edited
+			self._name = name
+			self._comment = None
+			self._line = None
 
 	def get_trigger(self):
-		if self.is_superjob():
-			sep = self.comment.find(self.SEPARATOR)
-			if sep not in (-1, 0, len(self.comment)-1):
-				return self.comment[sep+1:].split(":")
+		"""return the trigger as [action, name, state], or the compact forms of the triggers if there are
+		several or a compound one (None if none)"""
+		if not self._trigger:
+			return None
+		if len(self._trigger) == 1 and self._trigger[0].is_simple():
+			return self._trigger[0].as_list()
+		return [trigger.compact for trigger in self._trigger]
+
+	def get_triggers(self):
+		"""return the triggers as TriggerExpressions"""
+		return self._trigger or ()
 
 	def set_trigger(self, trigger):
-		if self.is_superjob():
-			trigger_string = ":".join(trigger)
-			sep = self.comment.find(self.SEPARATOR)
-			if trigger:
-				if sep == -1:
-					self.comment += self.SEPARATOR + trigger_string
-				else:
-					self.comment = self.comment[:sep] + self.SEPARATOR + trigger_string
-			else:
-				if sep != -1:
-					self.comment = self.comment[:sep]
+		if isinstance(self.cron, TCronTab):
+			self.cron.unindex_job(self)
+			self._set_trigger(trigger)
+			self.cron.index_job(self)
 		else:
-			# do nothing for non-superjobs
-			pass
+			self._set_trigger(trigger)
+
+	def _set_trigger(self, trigger):
+		"""set the triggers from a list of TriggerExpressions, or a single [action, name, state]"""
+		# do nothing for non-superjobs
+		if self._superjob:
+			if trigger and not isinstance(trigger[0], TriggerExpression):
+				trigger = [TriggerExpression(trigger[0], ("is",) + tuple(trigger[1:]))]
+			self._trigger = tuple(trigger) if trigger else None
+			self._comment = None
+			self._line = None
+
+	def get_policy(self):
+		return self._policy
+
+	def set_policy(self, policy):
+		# like triggers, only for SuperCron jobs
+		if self._superjob:
+			self._policy = policy or None
+			self._comment = None
+			self._line = None
 
 	def repr_trigger(self):
-		trigger = self.get_trigger()
-		if not trigger:
+		if not self._trigger:
 			return "NONE"
-		return "{} IF {} IS {}".format(trigger[0].upper(), trigger[1], trigger[2].upper())
+		return "; ".join(str(trigger) for trigger in self._trigger)
@@ -1,7 +1,6 @@
 import re
 
 from datetime import datetime
-from subprocess import Popen, PIPE
 
 
 class Utils:
@@ -48,9 +47,8 @@ class Utils:
 	@staticmethod
 	def get_time_now():
 		"""get current time"""
-		hour = datetime.now().hour
-		minute = datetime.now().minute
-		return hour, minute
+		now = datetime.now()
+		return now.hour, now.minute
 
 	@staticmethod
 	def list_to_dict(name, command="", repetition=""):
@@ -64,6 +62,7 @@ class Utils:
 	@staticmethod
 	def get_crontab():
 		"""get user's crontab to compare in tests"""
+		from subprocess import Popen, PIPE
 		p = Popen(["crontab", "-l"], stdout=PIPE, stderr=PIPE)
 		crontab_out, crontab_err = p.communicate()
 		return crontab_out
@@ -79,8 +78,34 @@ class Utils:
 
 	@staticmethod
 	def parse_trigger(string):
-		matched = re.match(r"(on|off|toggle)\s+if\s+(.+)\s+is\s+(enabled|disabled|toggled|added|deleted)",
-			string.strip(), re.IGNORECASE)
+		"""return [action, name, state] of a trigger sentence of a single term, or None (see TriggerExpression.parse)"""
+		try:
+			from expression import TriggerExpression
+		except ImportError:
+			from supercron.expression import TriggerExpression
+		try:
+			triggers = TriggerExpression.parse(string.strip())
+		except ValueError:
+			return None
+		if len(triggers) == 1 and triggers[0].is_simple():
+			return triggers[0].as_list()
+		return None
+
+	@staticmethod
+	def parse_policy(string):
+		"""return the overlap policy of a sentence (skip, queue, or limit:N for 'limit N'), or None"""
+		matched = re.match(r"(skip|queue|limit)(?:\s*[\s:=]\s*(\d+))?$", string.strip(), re.IGNORECASE)
+		if not matched or (matched.group(1).lower() == "limit") != bool(matched.group(2)):
+			return None
+		if matched.group(2):
+			if int(matched.group(2)) < 1:
+				return None
+			return "limit:{}".format(int(matched.group(2)))
+		return matched.group(1).lower()
+
+	@staticmethod
+	def parse_duration(string):
+		"""return the seconds of a duration like '15m', '12h', '30d' or '2w' (minutes, hours, days, weeks), or None"""
+		matched = re.match(r"(\d+)\s*(m|min|minutes?|h|hours?|d|days?|w|weeks?)$", string.strip(), re.IGNORECASE)
 		if matched:
-			trigger = [matched.group(1).lower(), matched.group(2), matched.group(3).lower()]
-			return trigger
+			return int(matched.group(1)) * {"m": 60, "h": 3600, "d": 86400, "w": 604800}[matched.group(2)[0].lower()]
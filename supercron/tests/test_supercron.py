@@ -2,14 +2,47 @@
 
 import sys
 import os
+import json
+import shutil
+import tempfile
+import subprocess
+import time
 import unittest
+from datetime import datetime
+
+import crontab
+
+try:
+	import asyncio
+except ImportError:
+	asyncio = None
+
+try:
+	from StringIO import StringIO
+except ImportError:
+	from io import StringIO
 
 ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
 sys.path.append(ROOT_DIR)
 
-from supercron.supercron import SuperCron
+from supercron.supercron import SuperCron, LineParser
 from supercron.utils import Utils
 from supercron.namespace import Namespace
+from supercron.trigger import TCronTab
+from supercron.repetition_parsing import Repetition
+from supercron.lrucache import LRUCache
+from supercron.snapshot import Snapshot
+from supercron.daemon import Daemon, DaemonCronTab
+from supercron.schedule import Schedule, ScheduleIndex
+from supercron.loadprofile import LoadProfile, numpy
+from supercron.placement import Occupancy
+from supercron.timing import Timing
+from supercron.storage import Storage, FileStorage, SpoolStorage, MemoryStorage, CommandStorage
+from supercron.fanout import FanOut
+from supercron.runner import JobRunner, RunLog
+from supercron.history import RunHistory
+from supercron.desired import DesiredJobs
+from supercron.expression import TriggerExpression
 
 
 class TestRepetitions(unittest.TestCase):
@@ -216,6 +249,46 @@ class TestRepetitions(unittest.TestCase):
 		self.assertTrue(entry in user_crontab)
 
 
+class TestRepetitionParsing(unittest.TestCase):
+	"""class that tests the repetition parser without touching the crontab"""
+
+	def test_time_and_weekdays(self):
+		self.assertEqual(Repetition.parse_repetition("at 11:59 pm on Mon, wed and fridays"),
+			{"hour_on": 23, "min_on": 59, "dow_on": ["1", "3", "5"]})
+
+	def test_backward_month_range(self):
+		self.assertEqual(Repetition.parse_repetition("midnight from september to february"),
+			{"hour_on": 0, "min_on": 0, "month_on": ["9", "10", "11", "12", "1", "2"]})
+
+	def test_forward_ranges(self):
+		self.assertEqual(Repetition.parse_repetition("every 3 hours from mondays to fridays from feb to nov"),
+			{"hour_every": 3, "min_on": Utils.get_time_now()[1], "dow_during": ["1", "5"],
+			"month_during": ["2", "11"]})
+
+	def test_invalid_values(self):
+		for sentence in ("every 60 minutes", "at 24:00", "on 31/4", "30 february"):
+			self.assertRaises(ValueError, Repetition.parse_repetition, sentence)
+		self.assertEqual(Repetition.parse_repetition("whenever"), {})
+
+	def test_cached_schedule(self):
+		Repetition.cache.clear()
+		self.assertEqual(Repetition.parse_schedule("On Mondays"), {"dow_on": ["1"]})
+		repeat = Repetition.apply_defaults(Repetition.parse_schedule("on mondays"), 3, 7)
+		self.assertEqual(repeat, {"dow_on": ["1"], "hour_on": 3, "min_on": 7})
+		repeat['dow_on'].append("2")
+		self.assertEqual(Repetition.parse_schedule("on mondays"), {"dow_on": ["1"]})
+		self.assertEqual((Repetition.cache.hits, Repetition.cache.misses), (2, 1))
+
+	def test_lru_eviction(self):
+		cache = LRUCache(2)
+		cache.put("a", 1)
+		cache.put("b", 2)
+		cache.get("a")
+		cache.put("c", 3)
+		self.assertTrue("a" in cache and "c" in cache and "b" not in cache)
+		self.assertEqual(cache.info(), {"hits": 1, "misses": 0, "size": 2, "maxsize": 2})
+
+
 class TestJobs(unittest.TestCase):
 	"""class that tests supercron for job actions"""
 
@@ -412,6 +485,989 @@ class TestTriggers(unittest.TestCase):
 		self.assertTrue(test1 and test2)
 
 
+class TestTransactions(unittest.TestCase):
+	"""class for testing in-memory transactions on a crontab"""
+
+	TAB = "10 10 * * * pwd # SuperCron__TEST__pwd\n" + \
+		"# 11 11 * * * echo 1 > /dev/null # SuperCron__TEST__echo1%on:TEST__pwd:deleted\n"
+
+	def setUp(self):
+		Utils.DEBUG = False
+
+	def test_single_write(self):
+		cron = TCronTab(tab=self.TAB)
+		with cron.transaction():
+			cron.add_job("TEST__ls", "ls", {"min_every": 5})
+			cron.enable_job("TEST__pwd", False)
+			self.assertEqual(cron.intab, self.TAB)
+		self.assertTrue("*/5 * * * * ls # SuperCron__TEST__ls" in cron.intab)
+		self.assertTrue("# 10 10 * * * pwd # SuperCron__TEST__pwd" in cron.intab)
+
+	def test_rollback(self):
+		cron = TCronTab(tab=self.TAB)
+		try:
+			with cron.transaction():
+				cron.delete_job("TEST__pwd")
+				raise RuntimeError()
+		except RuntimeError:
+			pass
+		self.assertEqual(cron.intab, self.TAB)
+
+	def test_triggers_inside_transaction(self):
+		cron = TCronTab(tab=self.TAB)
+		with cron.transaction():
+			self.assertEqual(cron.delete_job("TEST__pwd"), 1)
+		self.assertTrue("11 11 * * * echo 1 > /dev/null # SuperCron__TEST__echo1%on:TEST__pwd:deleted"
+			in cron.intab.splitlines())
+
+
+class TestIndexes(unittest.TestCase):
+	"""class for testing the name and trigger indexes of a crontab"""
+
+	def setUp(self):
+		Utils.DEBUG = False
+		self.cron = TCronTab(tab="1 1 * * * ls # SuperCron__TEST__a\n" +
+			"2 2 * * * ls # SuperCron__TEST__a%on:TEST__c:added\n" +
+			"3 3 * * * ls # SuperCron__TEST__b%on:TEST__c:added\n" +
+			"4 4 * * * ls # other comment\n")
+
+	def names(self, jobs):
+		return sorted(str(job.slices) for job in jobs)
+
+	def test_read(self):
+		self.assertEqual(self.names(self.cron.find_name("TEST__a")), ["1 1 * * *", "2 2 * * *"])
+		self.assertEqual(self.names(self.cron.find_name("other comment")), ["4 4 * * *"])
+		self.assertEqual(self.names(self.cron.find_trigger(["on", "TEST__c", "added"])), ["2 2 * * *", "3 3 * * *"])
+
+	def test_updates(self):
+		self.cron.rename_job("TEST__a", "TEST__d")
+		self.cron.trigger_job("TEST__b", "")
+		self.cron.new(command="pwd", comment="TEST__d").set_trigger(["off", "TEST__c", "added"])
+		self.assertEqual(list(self.cron.find_name("TEST__a")), [])
+		self.assertEqual(self.names(self.cron.find_name("TEST__d")), ["* * * * *", "1 1 * * *", "2 2 * * *"])
+		self.assertEqual(self.names(self.cron.find_trigger(["on", "TEST__c", "added"])), ["2 2 * * *"])
+		self.assertEqual(self.cron.delete_job("TEST__d"), 3)
+		self.assertEqual(list(self.cron.find_trigger(["on", "TEST__c", "added"])), [])
+		self.assertEqual(list(self.cron.find_trigger(["off", "TEST__c", "added"])), [])
+		self.assertEqual(len(self.cron), 2)
+
+	def test_comment_metadata(self):
+		job = next(self.cron.find_name("TEST__b"))
+		self.assertEqual((job.is_superjob(), job.get_trigger()), (True, ["on", "TEST__c", "added"]))
+		job.set_name("TEST__e")
+		job.set_trigger(["toggle", "TEST__a", "deleted"])
+		self.assertEqual(job.comment, "SuperCron__TEST__e%toggle:TEST__a:deleted")
+		self.assertEqual((job.get_name(), job.get_trigger()), ("TEST__e", ["toggle", "TEST__a", "deleted"]))
+
+	def test_clear(self):
+		self.assertEqual(self.cron.clear_jobs(), 3)
+		self.assertEqual(self.cron.render(), "4 4 * * * ls # other comment\n")
+
+
+class TestCascades(unittest.TestCase):
+	"""class for testing the propagation of triggers through several jobs"""
+
+	def test_chain(self):
+		cron = TCronTab(tab="# 1 1 * * * ls # SuperCron__TEST__b%on:TEST__a:enabled\n" +
+			"# 2 2 * * * ls # SuperCron__TEST__c%on:TEST__b:toggled\n" +
+			"3 3 * * * ls # SuperCron__TEST__d%off:TEST__c:enabled\n")
+		changed = cron.activate_triggered_jobs("TEST__a", "enabled")
+		self.assertEqual([job.get_name() for job in changed], ["TEST__b", "TEST__c", "TEST__d"])
+		self.assertEqual([step[0] for step in cron.propagation], [1, 2, 3])
+		self.assertEqual(cron.render(), "1 1 * * * ls # SuperCron__TEST__b%on:TEST__a:enabled\n" +
+			"2 2 * * * ls # SuperCron__TEST__c%on:TEST__b:toggled\n" +
+			"# 3 3 * * * ls # SuperCron__TEST__d%off:TEST__c:enabled\n")
+
+	def test_cycle(self):
+		cron = TCronTab(tab="1 1 * * * ls # SuperCron__TEST__a%toggle:TEST__b:toggled\n" +
+			"2 2 * * * ls # SuperCron__TEST__b%toggle:TEST__a:toggled\n")
+		cron.enable_job("TEST__a", False)
+		self.assertEqual(len(cron.propagation), 2)
+		self.assertEqual(cron.cycles, [[("TEST__a", "toggled"), ("TEST__b", "toggled"), ("TEST__a", "toggled")]])
+
+
+class TestTriggerExpressions(unittest.TestCase):
+	"""class for testing compound triggers and jobs having several triggers"""
+
+	def setUp(self):
+		self.cron = TCronTab(tab="1 1 * * * ls # SuperCron__TEST__a\n2 2 * * * ls # SuperCron__TEST__b\n" +
+			"3 3 * * * ls # SuperCron__TEST__c\n# 4 4 * * * ls # SuperCron__TEST__d\n")
+		self.job = next(self.cron.find_name("TEST__d"))
+
+	def test_compact(self):
+		triggers = TriggerExpression.parse("on if TEST__a is disabled and (TEST__b is added or not TEST__c is " +
+			"toggled); OFF if TEST__a is enabled")
+		self.assertEqual([trigger.compact for trigger in triggers],
+			["on:TEST__a:disabled&(TEST__b:added|!TEST__c:toggled)", "off:TEST__a:enabled"])
+		self.assertEqual(str(triggers[0]), "ON IF TEST__a IS DISABLED AND (TEST__b IS ADDED OR NOT TEST__c IS TOGGLED)")
+		self.assertEqual([TriggerExpression.decode(trigger.compact) for trigger in triggers], triggers)
+		for sentence in ("on if TEST__a is disabled and", "on if (TEST__a is added", "on TEST__a is added",
+				"on if TEST__a is gone", 'on if "TEST__a" is', "on if TEST__a and b is added"):
+			self.assertRaises(ValueError, TriggerExpression.parse, sentence)
+
+	def test_compound(self):
+		self.cron.trigger_job("TEST__d", SuperCron.get_trigger("on if TEST__a is disabled and " +
+			"(TEST__b is deleted or TEST__c is toggled)"))
+		# only the triggers having the event as a term are evaluated
+		self.assertEqual(self.cron.find_triggered(("TEST__b", "disabled")), [])
+		self.cron.enable_job("TEST__a", False)
+		self.assertFalse(self.job.is_enabled())
+		self.cron.enable_job("TEST__c", False)
+		self.assertTrue(self.job.is_enabled())
+		self.assertEqual([step[:3] for step in self.cron.propagation], [(1, "TEST__c", "toggled")])
+
+	def test_negated(self):
+		cron = TCronTab(tab="1 1 * * * ls # SuperCron__TEST__a\n# 2 2 * * * ls # SuperCron__TEST__b%on:!TEST__a:enabled\n")
+		cron.enable_job("TEST__a", False)
+		self.assertTrue(next(cron.find_name("TEST__b")).is_enabled())
+		self.cron.trigger_job("TEST__d", SuperCron.get_trigger("on if not TEST__a is enabled and not " +
+			"(TEST__b is added or TEST__c is toggled)"))
+		# indexed by the events that make the negated terms true
+		self.assertEqual(TriggerExpression.parse("on if not TEST__a is enabled and not (TEST__b is added " +
+			"or TEST__c is toggled)")[0].atoms, (("TEST__a", "disabled"), ("TEST__b", "deleted")))
+		self.cron.enable_job("TEST__a", False)
+		self.assertFalse(self.job.is_enabled())
+		self.cron.delete_job("TEST__b")
+		self.assertTrue(self.job.is_enabled())
+		self.assertEqual([step[:3] for step in self.cron.propagation], [(1, "TEST__b", "deleted")])
+		for sentence in ("on if not TEST__a is toggled", "on if not (TEST__a is toggled or TEST__b is toggled)"):
+			self.assertRaises(ValueError, TriggerExpression.parse, sentence)
+
+	def test_several(self):
+		self.cron.trigger_job("TEST__d", SuperCron.get_trigger("on if TEST__a is deleted; off if TEST__b is deleted"))
+		self.assertEqual(self.job.comment, "SuperCron__TEST__d%on:TEST__a:deleted;off:TEST__b:deleted")
+		cron = TCronTab(tab=self.cron.render())
+		cron.delete_job("TEST__a")
+		self.assertTrue(next(cron.find_name("TEST__d")).is_enabled())
+		cron.delete_job("TEST__b")
+		self.assertFalse(next(cron.find_name("TEST__d")).is_enabled())
+		self.assertEqual(next(cron.find_name("TEST__d")).get_trigger(), ["on:TEST__a:deleted", "off:TEST__b:deleted"])
+
+	def test_unreadable(self):
+		stderr, sys.stderr = sys.stderr, StringIO()
+		try:
+			cron = TCronTab(tab="# 1 1 * * * ls # SuperCron__TEST__a%on:TEST__b:added&(\n")
+			self.assertEqual(sys.stderr.getvalue(), "Warning: trigger 'on:TEST__b:added&(' of job 'TEST__a' " +
+				"cannot be read, it never fires.\n")
+		finally:
+			sys.stderr = stderr
+		cron.add_job("TEST__b", "ls", SuperCron.get_repeat("at 10:00"))
+		self.assertEqual(cron.render().split("\n")[0], "# 1 1 * * * ls # SuperCron__TEST__a%on:TEST__b:added&(")
+
+	def test_quoted_names(self):
+		trigger = TriggerExpression.parse('on if "TEST (a) and b;c" is disabled and not "not ready" is added')[0]
+		self.assertEqual(trigger.atoms, (("TEST (a) and b;c", "disabled"), ("not ready", "deleted")))
+		self.assertEqual(trigger.compact, r"on:TEST \(a\) and b\;c:disabled&!not ready:added")
+		self.assertEqual(str(trigger), 'ON IF "TEST (a) and b;c" IS DISABLED AND NOT "not ready" IS ADDED')
+		self.assertEqual(TriggerExpression.parse(str(trigger)), [trigger])
+		self.assertEqual(TriggerExpression.decode(trigger.compact).tree, trigger.tree)
+		cron = TCronTab(tab="1 1 * * * ls # SuperCron__TEST (a) and b;c\n# 2 2 * * * ls # SuperCron__TEST__d%" +
+			trigger.compact + ";off:TEST__e:added\n")
+		cron.enable_job("TEST (a) and b;c", False)
+		self.assertTrue(next(cron.find_name("TEST__d")).is_enabled())
+
+	def test_legacy_names(self):
+		# single terms written before names were escaped
+		cron = TCronTab(tab="1 1 * * * ls # SuperCron__tests;lint (ci)\n" +
+			"# 2 2 * * * ls # SuperCron__TEST__d%on:tests;lint (ci):disabled\n")
+		self.assertEqual(next(cron.find_name("TEST__d")).get_trigger(), ["on", "tests;lint (ci)", "disabled"])
+		cron.enable_job("tests;lint (ci)", False)
+		self.assertTrue(next(cron.find_name("TEST__d")).is_enabled())
+		self.assertEqual(Utils.parse_trigger('off if "a and b" is toggled'), ["off", "a and b", "toggled"])
+		self.assertEqual(Utils.parse_trigger("on if a is added or b is added"), None)
+		self.assertEqual(Utils.parse_trigger("on a is added"), None)
+
+
+class TestInputMode(unittest.TestCase):
+	"""class for testing the operations of input mode on an in-memory crontab"""
+
+	def setUp(self):
+		Utils.DEBUG = False
+		self.parser = SuperCron.build_parser(LineParser)
+		self.cron = TCronTab(tab="")
+
+	def apply(self, line):
+		import shlex
+		SuperCron.apply_operation(self.cron, self.parser.parse_args(shlex.split(line)))
+
+	def test_operations(self):
+		self.apply("add -c 'ls -l' -r 'at 10:05' TEST__ls")
+		self.apply("add -c pwd -r 'every 5 minutes' TEST__pwd")
+		self.apply("trigger -t 'off if TEST__pwd is deleted' TEST__ls")
+		self.apply("delete TEST__pwd")
+		self.assertEqual(self.cron.render(),
+			"# 5 10 * * * ls -l # SuperCron__TEST__ls%off:TEST__pwd:deleted\n")
+
+	def test_errors(self):
+		for line in ("add -c ls -r 'every 99 minutes' TEST__ls", "add -c ls -r 'blah' TEST__ls",
+				"add -c ls -r 'at 10:05' @all", "trigger -t 'maybe' TEST__ls", "clear", "unknown TEST__ls"):
+			self.assertRaises(ValueError, self.apply, line)
+		self.assertEqual(len(self.cron), 0)
+
+
+class TestSnapshots(unittest.TestCase):
+	"""class for testing the on-disk snapshot cache of parsed crontabs"""
+
+	TAB = "# comment\nMAILTO=root\n*/5 1-3,7 * jan-mar mon-fri ls # SuperCron__TEST__a%on:TEST__b:enabled\n" + \
+		"@reboot pwd # SuperCron__TEST__b\n# 0 12 * * 1-5/2 date # SuperCron__TEST__c\n"
+
+	def setUp(self):
+		self.cache_home = os.environ.get("XDG_CACHE_HOME")
+		self.directory = tempfile.mkdtemp()
+		os.environ["XDG_CACHE_HOME"] = self.directory
+
+	def tearDown(self):
+		if self.cache_home is None:
+			del os.environ["XDG_CACHE_HOME"]
+		else:
+			os.environ["XDG_CACHE_HOME"] = self.cache_home
+		shutil.rmtree(self.directory)
+
+	def test_round_trip(self):
+		cron = TCronTab(tab=self.TAB)
+		digest = Snapshot.digest(self.TAB)
+		# in-memory crontabs have no user
+		Snapshot.save(str(cron.user), digest, cron.lines)
+		self.assertTrue(Snapshot.path(str(cron.user)).startswith(os.path.join(self.directory, "supercron")))
+		self.assertEqual(Snapshot.load(str(cron.user), Snapshot.digest(self.TAB + "\n")), None)
+		copy = TCronTab(tab="")
+		copy.lines = []
+		copy.read_snapshot(digest, [])
+		self.assertEqual(copy.render(), cron.render())
+		self.assertEqual([job.get_name() for job in copy.find_trigger(["on", "TEST__b", "enabled"])], ["TEST__a"])
+
+	def test_concurrent_saves(self):
+		from multiprocessing.pool import ThreadPool
+		cron = TCronTab(tab=self.TAB)
+		digest = Snapshot.digest(self.TAB)
+		pool = ThreadPool(8)
+		try:
+			pool.map(lambda i: Snapshot.save("TEST__user", digest, cron.lines), range(32))
+		finally:
+			pool.close()
+			pool.join()
+		self.assertEqual(len(Snapshot.load("TEST__user", digest)), len(cron.lines))
+		# every writer renamed its own temporary file
+		self.assertEqual(os.listdir(os.path.dirname(Snapshot.path("TEST__user"))),
+			[os.path.basename(Snapshot.path("TEST__user"))])
+
+	def test_miss(self):
+		cron = TCronTab(tab="")
+		cron.lines = []
+		cron.read_snapshot(Snapshot.digest(self.TAB), self.TAB.split("\n"))
+		self.assertEqual(len(cron), 3)
+		self.assertEqual(len(Snapshot.load(str(cron.user), Snapshot.digest(self.TAB))), 6)
+
+
+class TestSchedule(unittest.TestCase):
+	"""class for testing the computation of run times"""
+
+	START = datetime(2026, 10, 18, 10, 5, 30)
+
+	def runs(self, line, count=2):
+		job = next(iter(TCronTab(tab=line + " ls\n")))
+		schedule = Schedule.of(job)
+		return schedule.next_runs(self.START, count) if schedule else None
+
+	def test_next_runs(self):
+		self.assertEqual(self.runs("*/7 3-5 * * *"), [datetime(2026, 10, 19, 3, 0), datetime(2026, 10, 19, 3, 7)])
+		self.assertEqual(self.runs("0 12 * * mon-fri"), [datetime(2026, 10, 19, 12, 0), datetime(2026, 10, 20, 12, 0)])
+		self.assertEqual(self.runs("0 0 29 2 *"), [datetime(2028, 2, 29, 0, 0), datetime(2032, 2, 29, 0, 0)])
+		self.assertEqual(self.runs("*/15 * * * 7", 1), [datetime(2026, 10, 18, 10, 15)])
+		self.assertEqual(self.runs("0 0 30 2 *"), [])
+		self.assertEqual(self.runs("@reboot"), None)
+
+	def test_days_of_month_or_week(self):
+		# the 13th of the month or any friday
+		self.assertEqual(self.runs("15 10 13 * 5", 3), [datetime(2026, 10, 23, 10, 15),
+			datetime(2026, 10, 30, 10, 15), datetime(2026, 11, 6, 10, 15)])
+		self.assertEqual(self.runs("15 10 1-13 * 5", 1), [datetime(2026, 10, 23, 10, 15)])
+		self.assertEqual(self.runs("0 0 13 11 *", 1), [datetime(2026, 11, 13, 0, 0)])
+
+	def test_star_days(self):
+		# like cron, '*/2' is a star: only the mondays that are odd days
+		self.assertEqual(self.runs("0 3 */2 * 1", 3), [datetime(2026, 10, 19, 3, 0),
+			datetime(2026, 11, 9, 3, 0), datetime(2026, 11, 23, 3, 0)])
+		# but '1-31' is not, so any day or any monday: every day
+		self.assertEqual(self.runs("0 3 1-31 * 1", 3), [datetime(2026, 10, 19, 3, 0),
+			datetime(2026, 10, 20, 3, 0), datetime(2026, 10, 21, 3, 0)])
+		# the sundays, tuesdays, thursdays and saturdays
+		self.assertEqual(self.runs("0 3 * * */2", 3), [datetime(2026, 10, 20, 3, 0),
+			datetime(2026, 10, 22, 3, 0), datetime(2026, 10, 24, 3, 0)])
+		# a job changed since it was read is written with python-crontab's '*'
+		job = next(iter(TCronTab(tab="0 3 1-31 * 1 ls\n")))
+		job.setall("0 3 1-31 * 1")
+		self.assertEqual(Schedule.of(job).next_runs(self.START, 2), [datetime(2026, 10, 19, 3, 0),
+			datetime(2026, 10, 26, 3, 0)])
+
+	def test_window(self):
+		cron = TCronTab(tab="10 10 * * * ls # a\n20 10 * * * ls # b\n10 10 * * * pwd # c\n0 9 * * * ls # d\n")
+		runs = ScheduleIndex(cron).runs_within(self.START, datetime(2026, 10, 18, 11, 0))
+		self.assertEqual([(run.minute, job.get_name()) for run, job in runs], [(10, "a"), (10, "c"), (20, "b")])
+
+
+class TestSearchFormats(unittest.TestCase):
+	"""class for testing the machine-readable output of subcommand search"""
+
+	def setUp(self):
+		self.cron = TCronTab(tab="0 10 * * * ls # SuperCron__TEST__a\n" +
+			"# */5 * * * * echo \"a,b\" # SuperCron__TEST__b%off:TEST__a:disabled\n@reboot pwd\n")
+
+	def write(self, output_format, name="@all"):
+		out = StringIO()
+		count = SuperCron.write_jobs(SuperCron.find_jobs(self.cron, name), output_format, out)
+		return count, out.getvalue()
+
+	def test_json(self):
+		count, output = self.write("json")
+		records = json.loads(output)
+		self.assertEqual(count, 3)
+		self.assertEqual([record["name"] for record in records], ["TEST__a", "TEST__b", ""])
+		self.assertEqual(records[1]["trigger"], "OFF IF TEST__a IS DISABLED")
+		self.assertFalse(records[1]["enabled"])
+		self.assertEqual(records[0]["next_run"][-8:], "10:00:00")
+		self.assertEqual(records[2]["next_run"], None)
+		self.assertEqual(self.write("json", "missing"), (0, "[]\n"))
+
+	def test_jsonl(self):
+		lines = self.write("jsonl", "TEST__b")[1].splitlines()
+		self.assertEqual(len(lines), 1)
+		self.assertEqual(json.loads(lines[0])["command"], "echo \"a,b\"")
+
+	def test_csv(self):
+		lines = self.write("csv")[1].splitlines()
+		self.assertEqual(lines[0], ",".join(SuperCron.SEARCH_FIELDS))
+		self.assertEqual(lines[2].split(",")[:3], ["TEST__b", "false", "OFF IF TEST__a IS DISABLED"])
+		self.assertEqual(len(lines), 4)
+
+
+class TestPlacement(unittest.TestCase):
+	"""class for testing the placement of the times repetitions do not set"""
+
+	def setUp(self):
+		self.cron = TCronTab(tab="5 10 * * * ls # a\n6 */2 * * * ls # b\n")
+
+	def place(self, repetition, name="TEST__a", strategy="load"):
+		repeat = self.cron.occupancy().place(Repetition.parse_schedule(repetition), name, strategy, 10, 5)
+		self.cron.add_job(name, "ls", repeat)
+		return repeat
+
+	def test_least_loaded(self):
+		self.assertEqual(self.place("every day"), {"day_every": 1, "hour_on": 10, "min_on": 7})
+		self.assertEqual(self.place("every day"), {"day_every": 1, "hour_on": 10, "min_on": 8})
+		self.assertEqual(self.place("every 2 hours"), {"hour_every": 2, "min_on": 9})
+		self.assertEqual(self.place("every hour")["min_on"], 10)
+		self.assertEqual(self.place("at 12:30"), {"hour_on": 12, "min_on": 30})
+		self.assertEqual(self.place("every 5 minutes"), {"min_every": 5})
+		# 10:07 is free again
+		self.cron.delete_job("TEST__a")
+		self.assertEqual(self.place("every day")["min_on"], 7)
+
+	def test_hash(self):
+		first = self.place("every day", "TEST__b", "hash")
+		self.assertEqual(self.place("every day", "TEST__b", "hash"), first)
+		self.assertNotEqual(self.place("every day", "TEST__c", "hash"), first)
+
+	def test_incremental(self):
+		for i in range(50):
+			self.place("every day")
+		self.assertEqual(self.cron.occupancy().slots, Occupancy(self.cron.crons).slots)
+
+
+@unittest.skipIf(numpy is None, "load profiles need NumPy")
+class TestLoadProfile(unittest.TestCase):
+	"""class for testing the load profile of a crontab"""
+
+	def setUp(self):
+		cron = TCronTab(tab="0 * * * * ls # a\n0 * * * * pwd # b\n*/30 * * * * ls # c\n" +
+			"# 0 * * * * ls # d\n0 12 * * 1 ls # e\n@reboot ls # f\n")
+		# from monday 2026-10-19, for two days
+		self.profile = LoadProfile(cron, datetime(2026, 10, 19, 15, 20), 2)
+
+	def test_counts(self):
+		self.assertEqual((self.profile.jobs, self.profile.schedules), (4, 3))
+		self.assertEqual(list(self.profile.counts[:61:30]), [3, 1, 3])
+		self.assertEqual(self.profile.counts[12 * 60], 4)
+		self.assertEqual(self.profile.counts[36 * 60], 3)
+		self.assertEqual(self.profile.histogram(), [(0, 2784), (1, 48), (3, 47), (4, 1)])
+
+	def test_peaks(self):
+		self.assertEqual(self.profile.peaks(1, 2), [(datetime(2026, 10, 19, 12, 0), 4),
+			(datetime(2026, 10, 19, 0, 0), 3)])
+		# 11:00, 11:30 and 12:00
+		self.assertEqual(self.profile.peaks(90, 1), [(datetime(2026, 10, 19, 10, 31), 8)])
+
+
+class TestDaemon(unittest.TestCase):
+	"""class for testing the requests served by the daemon"""
+
+	def setUp(self):
+		self.daemon = Daemon("unused", SuperCron.execute)
+		self.daemon.cron = DaemonCronTab(tab="")
+		# no user's crontab to check for outside changes
+		self.daemon.CHECK_INTERVAL = float("inf")
+
+	def tearDown(self):
+		Utils.DEBUG = False
+
+	def run_command(self, *argv):
+		return self.daemon.handle({"argv": list(argv)})
+
+	def test_commands(self):
+		reply = self.run_command("add", "-c", "ls", "-r", "at 10:05", "TEST__a")
+		self.assertEqual(reply, {"status": 0, "output": "Job named 'TEST__a' has been successfully added.\n"})
+		self.assertNotEqual(self.daemon.cron.dirty, None)
+		self.assertEqual(self.run_command("batch", "add -c pwd -r 'at 11:00' TEST__b",
+			"trigger -t 'off if TEST__b is enabled' TEST__a")["status"], 0)
+		rendered = self.daemon.cron.render()
+		self.assertEqual(self.run_command("disable", "--dry-run", "TEST__b")["status"], 0)
+		self.assertEqual(self.daemon.cron.render(), rendered)
+		self.assertEqual(self.run_command("search", "TEST__b")["output"].count("TEST__b"), 1)
+
+	def test_errors(self):
+		self.assertEqual(self.run_command("add", "-c", "ls", "-r", "blah", "TEST__a")["status"], 1)
+		self.assertEqual(self.run_command("add", "TEST__a")["status"], 2)
+		self.assertEqual(self.run_command("daemon")["status"], 2)
+		self.assertEqual(self.run_command("clear")["status"], 2)
+		self.assertEqual(self.daemon.cron.dirty, None)
+		self.assertFalse(Daemon.serves(["clear", "-q"]))
+		self.assertTrue(Daemon.serves(["clear", "-f"]))
+
+	def test_flush_error(self):
+		self.assertEqual(self.run_command("add", "-c", "ls", "-r", "at 09:00", "TEST__a")["status"], 0)
+		storage = self.daemon.cron.storage
+		write = storage.write
+
+		def fail(content):
+			raise IOError("crontab: disk full")
+		storage.write = fail
+		stderr, sys.stderr = sys.stderr, StringIO()
+		try:
+			self.assertFalse(self.daemon.flush())
+			self.assertTrue(sys.stderr.getvalue().startswith("Error: cannot write the crontab"))
+		finally:
+			sys.stderr = stderr
+		# the changes are kept, and written on the next try
+		self.assertNotEqual(self.daemon.cron.dirty, None)
+		storage.write = write
+		self.assertTrue(self.daemon.flush())
+		self.assertEqual(self.daemon.cron.dirty, None)
+		self.assertTrue(storage.content.endswith("# SuperCron__TEST__a\n"))
+
+	def test_trusted_socket(self):
+		import socket
+		directory = tempfile.mkdtemp()
+		try:
+			path = os.path.join(directory, "daemon.sock")
+			self.assertTrue(Daemon.trusted(path))
+			with open(path, "w"):
+				pass
+			self.assertFalse(Daemon.trusted(path))
+			os.unlink(path)
+			server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			server.bind(path)
+			try:
+				os.chmod(path, 0o600)
+				self.assertTrue(Daemon.trusted(path))
+				os.chmod(path, 0o666)
+				self.assertFalse(Daemon.trusted(path))
+			finally:
+				server.close()
+		finally:
+			shutil.rmtree(directory)
+		environ = dict(os.environ)
+		try:
+			for key in ("SUPERCRON_SOCKET", "XDG_RUNTIME_DIR"):
+				os.environ.pop(key, None)
+			# in a directory of the user, not directly in the temporary directory
+			self.assertEqual(os.path.basename(os.path.dirname(Daemon.socket_path())), "supercron-{}".format(os.getuid()))
+		finally:
+			os.environ.clear()
+			os.environ.update(environ)
+
+	def test_failed_batch(self):
+		self.assertEqual(self.run_command("add", "-c", "ls", "-r", "at 09:00", "TEST__a")["status"], 0)
+		rendered = self.daemon.cron.render()
+		self.daemon.cron.dirty = None
+		self.assertEqual(self.run_command("batch", "add -c ls -r 'at 10:00' TEST__b",
+			"add -c ls -r 'bogus repetition' TEST__c")["status"], 1)
+		self.assertEqual(self.daemon.cron.render(), rendered)
+		self.assertEqual(self.daemon.cron.dirty, None)
+		self.assertEqual(list(self.daemon.cron.find_name("TEST__b")), [])
+		# the operations applied before the failure are not reported as done
+		reply = self.run_command("batch", "add -c ls -r 'at 10:00' TEST__b", "add -c ls -r 'bogus' TEST__c")
+		self.assertEqual(reply["output"], "Error: invalid repetition sentence: 'bogus'.\n" +
+			"Batch rolled back: none of its operations was applied.\n")
+		reply = self.run_command("batch", "add -c ls -r 'at 10:00' TEST__b", "disable TEST__a")
+		self.assertEqual(reply["output"], "Job named 'TEST__b' has been successfully added.\n" +
+			"1 job named 'TEST__a' has been disabled.\n")
+		self.assertEqual(len(list(self.daemon.cron.find_name("TEST__a"))), 1)
+
+
+class TestTiming(unittest.TestCase):
+	"""class for testing the timing of operations"""
+
+	def tearDown(self):
+		Timing.enabled = False
+
+	def test_spans(self):
+		Timing.enable()
+		with Timing.span("total"):
+			cron = TCronTab(tab="")
+			cron.add_job("TEST__a", "ls", Repetition.parse_repetition("at 10:00"))
+			cron.render()
+		Timing.add("imports", 0.5)
+		report = Timing.report()
+		self.assertEqual([span["span"] for span in report],
+			["total", "total/read", "total/read/parse", "total/parse_repetition", "total/triggers", "total/render", "imports"])
+		self.assertEqual((report[-1]["depth"], report[-1]["calls"], report[-1]["total_ms"]), (0, 1, 500.0))
+		self.assertTrue(report[0]["self_ms"] <= report[0]["total_ms"])
+		out = StringIO()
+		Timing.write(out, as_json=True)
+		self.assertEqual(json.loads(out.getvalue())["spans"], report)
+
+	def test_disabled(self):
+		Timing.enable()
+		Timing.enabled = False
+		with Timing.span("total"):
+			TCronTab(tab="").render()
+		self.assertEqual(Timing.report(), [])
+
+
+class TestStartup(unittest.TestCase):
+	"""class for testing that the CLI only imports the modules the subcommand needs"""
+
+	def imported_modules(self, command=None):
+		"""return the modules imported by the CLI once it has built the parser of command"""
+		code = "import sys\nfrom supercron.supercron import SuperCron\nSuperCron.build_parser(command={!r})\n" \
+			"print(' '.join(sys.modules))".format(command)
+		out = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT_DIR)
+		return out.decode("utf-8").split()
+
+	def test_lazy_imports(self):
+		modules = self.imported_modules("search")
+		for module in ("crontab", "numpy", "socketserver", "supercron.trigger", "supercron.daemon"):
+			self.assertFalse(module in modules, module)
+		self.assertTrue("supercron.placement" in self.imported_modules("add"))
+
+	def test_subcommand_parser(self):
+		parser = SuperCron.build_parser(command="search")
+		self.assertEqual(parser.parse_args(["search", "TEST__a"]).func, SuperCron.search_job)
+		self.assertRaises(SystemExit, parser.parse_args, ["delete", "TEST__a"])
+
+
+class TestStorage(unittest.TestCase):
+	"""class for testing the storages crontabs are read from and written to"""
+
+	def setUp(self):
+		self.cache_home = os.environ.get("XDG_CACHE_HOME")
+		self.directory = tempfile.mkdtemp()
+		os.environ["XDG_CACHE_HOME"] = self.directory
+
+	def tearDown(self):
+		if self.cache_home is None:
+			del os.environ["XDG_CACHE_HOME"]
+		else:
+			os.environ["XDG_CACHE_HOME"] = self.cache_home
+		shutil.rmtree(self.directory)
+
+	def test_file(self):
+		path = os.path.join(self.directory, "service")
+		storage = FileStorage(path)
+		self.assertEqual((storage.read(), storage.digest()), (b"", Snapshot.digest(b"")))
+		storage.write(b"0 10 * * * ls\n")
+		os.chmod(path, 0o600)
+		storage.write(b"0 11 * * * pwd\n")
+		self.assertEqual(storage.read(), b"0 11 * * * pwd\n")
+		self.assertEqual(storage.digest(), Snapshot.digest(b"0 11 * * * pwd\n"))
+		self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+		self.assertEqual(SpoolStorage.names(self.directory), ["service"])
+
+	def test_parse(self):
+		self.assertEqual(Storage.parse("file:/etc/cron.d/backup").path, "/etc/cron.d/backup")
+		self.assertEqual(Storage.parse("spool:/var/spool/cron:web").path, os.path.join("/var/spool/cron", "web"))
+		self.assertEqual(Storage.parse("crontab:www").user_opt(), {"u": "www"})
+		self.assertEqual(Storage.parse("crontab").user_opt(), {})
+		for spec in ("file:", "spool:/var/spool/cron", "spool:/tmp:.hidden", "ftp:host"):
+			self.assertRaises(ValueError, Storage.parse, spec)
+
+	def test_memory(self):
+		cron = TCronTab(storage=MemoryStorage("0 10 * * * ls # SuperCron__TEST__a\n"))
+		cron.enable_job("TEST__a", False)
+		cron.write()
+		self.assertEqual(cron.intab, "# 0 10 * * * ls # SuperCron__TEST__a\n")
+		self.assertEqual(cron.digest, None)
+
+	def test_concurrent_file_writes(self):
+		storage = SpoolStorage(self.directory, "service")
+		first, second = TCronTab(storage=storage), TCronTab(storage=storage)
+		first.add_job("TEST__a", "ls", SuperCron.get_repeat("at 10:00"))
+		second.add_job("TEST__b", "pwd", SuperCron.get_repeat("at 11:00"))
+		first.write()
+		second.write()
+		cron = TCronTab(tabfile=storage.path)
+		self.assertEqual(sorted(job.get_name() for job in cron), ["TEST__a", "TEST__b"])
+		self.assertEqual(cron.digest, storage.digest())
+		# the writes were locked, but no snapshot was saved
+		self.assertFalse([name for name in os.listdir(Snapshot.directory()) if name.endswith(".snapshot")])
+
+
+class TestFanOut(unittest.TestCase):
+	"""class for testing operations applied to many crontabs in parallel"""
+
+	def setUp(self):
+		self.cache_home = os.environ.get("XDG_CACHE_HOME")
+		self.directory = tempfile.mkdtemp()
+		os.environ["XDG_CACHE_HOME"] = self.directory
+		self.storages = [SpoolStorage(self.directory, "user{}".format(i)) for i in range(20)]
+		for storage in self.storages:
+			storage.write(b"0 10 * * * ls # SuperCron__TEST__a\n")
+
+	def tearDown(self):
+		if self.cache_home is None:
+			del os.environ["XDG_CACHE_HOME"]
+		else:
+			os.environ["XDG_CACHE_HOME"] = self.cache_home
+		shutil.rmtree(self.directory)
+
+	def test_apply(self):
+		storages = self.storages + [FanOut.storage_of("file:" + os.path.join(self.directory, "missing", "tab"))]
+		args = SuperCron.build_parser(LineParser).parse_args(["disable", "TEST__a"])
+		outcome = FanOut.apply(storages, lambda cron: SuperCron.apply_operation(cron, args), workers=4)
+		self.assertEqual([result.value for result in outcome.results], [1] * 20 + [0])
+		self.assertEqual([result.name for result in outcome.failures], [str(storages[-1])])
+		for storage in self.storages:
+			self.assertEqual(storage.read(), b"# 0 10 * * * ls # SuperCron__TEST__a\n")
+
+	def test_dry_run(self):
+		outcome = FanOut.apply(self.storages, lambda cron: cron.delete_job("TEST__a"), dry_run=True)
+		self.assertEqual((sum(result.value for result in outcome.results), outcome.failures), (20, []))
+		self.assertEqual(self.storages[0].read(), b"0 10 * * * ls # SuperCron__TEST__a\n")
+
+	def test_unsupported(self):
+		SuperCron.storages = self.storages
+		Utils.DEBUG = True
+		stdout, sys.stdout = sys.stdout, StringIO()
+		try:
+			for argv in (["search", "TEST__a"], ["next", "TEST__a"], ["clear"]):
+				self.assertRaises(SystemExit, SuperCron.fan_out, argv)
+			output = sys.stdout.getvalue().split("\n")
+		finally:
+			sys.stdout = stdout
+			SuperCron.storages = None
+			Utils.DEBUG = False
+		self.assertEqual(output[:3], ["Error: subcommand not supported with --users or --user-file."] * 2 +
+			["Error: subcommand 'clear' needs option '-f' with --users or --user-file."])
+		self.assertEqual(self.storages[0].read(), b"0 10 * * * ls # SuperCron__TEST__a\n")
+
+	def test_users(self):
+		path = os.path.join(self.directory, "users")
+		with open(path, "w") as f:
+			f.write("# accounts\nweb\n\n  db  # database\nspool:/var/spool/cron:backup\n")
+		self.assertEqual(FanOut.read_users(path), ["web", "db", "spool:/var/spool/cron:backup"])
+		self.assertEqual(FanOut.storage_of("web").user_opt(), {"u": "web"})
+		self.assertEqual(str(FanOut.storage_of("spool:/var/spool/cron:backup")), "spool:/var/spool/cron:backup")
+
+
+class TestRunner(unittest.TestCase):
+	"""class for testing the wrapper of jobs, which logs their runs"""
+
+	def setUp(self):
+		self.state_home = os.environ.get("XDG_STATE_HOME")
+		self.directory = tempfile.mkdtemp()
+		os.environ["XDG_STATE_HOME"] = self.directory
+
+	def tearDown(self):
+		if self.state_home is None:
+			del os.environ["XDG_STATE_HOME"]
+		else:
+			os.environ["XDG_STATE_HOME"] = self.state_home
+		shutil.rmtree(self.directory)
+
+	def test_run(self):
+		self.assertEqual(JobRunner.run("TEST__a", [sys.executable, "-c", "import sys; sys.exit(3)"]), 3)
+		self.assertEqual(JobRunner.run("TEST__a", ["exit 0"]), 0)
+		runs = list(RunLog.read("TEST__a"))
+		self.assertEqual([(run.status, run.overlap) for run in runs], [(3, False), (0, False)])
+		self.assertTrue(runs[0].wall >= runs[0].cpu > 0)
+		self.assertEqual(list(RunLog.read("TEST__b")), [])
+
+	def test_overlap(self):
+		fd, overlap = JobRunner.running("TEST__a")
+		try:
+			self.assertEqual(JobRunner.main(["TEST__a", "--", "true"]), 0)
+		finally:
+			os.close(fd)
+		self.assertEqual([run.overlap for run in RunLog.read()], [True])
+		self.assertEqual(JobRunner.main(["TEST__a", "true"]), 2)
+
+	def test_policy(self):
+		first = JobRunner.acquire("TEST__a", "limit:2")
+		second = JobRunner.acquire("TEST__a", "limit:2")
+		try:
+			self.assertEqual(JobRunner.acquire("TEST__a", "limit:2"), None)
+			self.assertEqual(JobRunner.main(["--policy", "skip", "TEST__a", "--", "exit 3"]), 0)
+		finally:
+			os.close(first)
+			os.close(second)
+		# the slots of the runs that are gone are free again
+		self.assertEqual(JobRunner.main(["--policy", "skip", "TEST__a", "--", "exit 3"]), 3)
+		self.assertEqual([run.status for run in RunLog.read("TEST__a")], [RunLog.SKIPPED, 3])
+		self.assertEqual([Utils.parse_policy(policy) for policy in ("Skip", "queue", "limit 3", "limit", "limit 0")],
+			["skip", "queue", "limit:3", None, None])
+
+	def test_policy_comment(self):
+		cron = TCronTab(tab="0 10 * * * ls # SuperCron__TEST__a%%skip\n" +
+			"0 11 * * * pwd # SuperCron__TEST__b%on:TEST__a:added\n")
+		job_a, job_b = next(cron.find_name("TEST__a")), next(cron.find_name("TEST__b"))
+		self.assertEqual((job_a.get_policy(), job_a.get_trigger()), ("skip", None))
+		self.assertEqual(cron.policy_job("TEST__b", "limit:2"), 1)
+		self.assertEqual(job_b.comment, "SuperCron__TEST__b%on:TEST__a:added%limit:2")
+		self.assertEqual(JobRunner.unwrap(job_b.command), ("TEST__b", "limit:2", "pwd"))
+		cron.policy_job("TEST__b", "")
+		self.assertEqual(job_b.comment, "SuperCron__TEST__b%on:TEST__a:added")
+		self.assertEqual(JobRunner.unwrap(job_b.command), ("TEST__b", None, "pwd"))
+		# removing the policy of a job that is not wrapped leaves its command alone
+		self.assertEqual(cron.policy_job("TEST__a", ""), 1)
+		self.assertEqual((job_a.command, job_a.get_policy()), ("ls", None))
+		self.assertEqual(JobRunner.unwrap("ls -l"), None)
+
+	def test_wrap(self):
+		import shlex
+		command = JobRunner.wrap("TEST__a", "echo 'it is' | wc -c")
+		self.assertEqual(shlex.split(command)[-4:], ["exec", "TEST__a", "--", "echo 'it is' | wc -c"])
+		cron = TCronTab(tab="")
+		SuperCron.apply_operation(cron, SuperCron.build_parser(LineParser).parse_args(
+			["add", "-w", "-c", "ls", "-r", "at 10:00", "TEST__a"]))
+		self.assertTrue(next(cron.find_name("TEST__a")).command.endswith(" exec TEST__a -- ls"))
+
+
+class TestHistory(unittest.TestCase):
+	"""class for testing the history of the runs of wrapped jobs"""
+
+	def setUp(self):
+		self.state_home = os.environ.get("XDG_STATE_HOME")
+		self.directory = tempfile.mkdtemp()
+		os.environ["XDG_STATE_HOME"] = self.directory
+		self.now = time.time()
+		for i in range(100):
+			RunLog.append("TEST__a", self.now - 3600 * i, float(i + 1), 0.5, 1 if i % 10 == 0 else 0, False)
+		RunLog.append("TEST__a", self.now + 1, 0.0, 0.0, RunLog.SKIPPED, True)
+		RunLog.append("TEST__b", self.now - 86400 * 100, 1.0, 0.5, 0, None)
+		self.history = RunHistory()
+		self.history.ingest()
+
+	def tearDown(self):
+		self.history.close()
+		if self.state_home is None:
+			del os.environ["XDG_STATE_HOME"]
+		else:
+			os.environ["XDG_STATE_HOME"] = self.state_home
+		shutil.rmtree(self.directory)
+
+	def test_runs(self):
+		runs = list(self.history.runs("TEST__a", self.now - 3600 * 4.5))
+		self.assertEqual([run.wall for run in runs], [5.0, 4.0, 3.0, 2.0, 1.0, 0.0])
+		self.assertEqual([run.wall for run in self.history.runs(failed=True)][-2:], [11.0, 1.0])
+		# older than the retention period
+		self.assertEqual(list(self.history.runs("TEST__b")), [])
+
+	def test_percentiles_plan(self):
+		where, parameters = RunHistory.where("TEST__a", self.now - 86400)
+		plan = self.history.db.execute("EXPLAIN QUERY PLAN SELECT wall FROM runs INDEXED BY runs_name_wall " +
+			"WHERE " + where + " ORDER BY wall", parameters).fetchall()
+		# the wall times come in order from the index, without a sort
+		self.assertFalse([row for row in plan if "TEMP B-TREE" in row[-1]])
+
+	def test_stats(self):
+		stats = list(self.history.stats(percentiles=(50, 95, 100)))
+		self.assertEqual(len(stats), 1)
+		self.assertEqual((stats[0].runs, stats[0].failed, stats[0].skipped), (101, 10, 1))
+		self.assertEqual((stats[0].p50, stats[0].p95, stats[0].p100), (50.0, 95.0, 100.0))
+		self.assertEqual(stats[0].mean_wall, 50.5)
+
+	def test_ingest(self):
+		RunHistory.LOG_LIMIT, limit = 100, RunHistory.LOG_LIMIT
+		try:
+			RunLog.append("TEST__c", self.now, 1.0, 0.5, 0, False)
+			# runs of a log whose rotation was interrupted are not counted twice
+			shutil.copy(RunLog.path(), RunLog.path() + ".old")
+			self.history.ingest()
+		finally:
+			RunHistory.LOG_LIMIT = limit
+		self.assertEqual(len(list(self.history.runs("TEST__c"))), 1)
+		self.assertFalse(os.path.exists(RunLog.path()))
+		RunLog.append("TEST__c", self.now + 1, 1.0, 0.5, 0, False)
+		self.history.ingest()
+		self.assertEqual(len(list(self.history.runs("TEST__c"))), 2)
+
+	def test_rename(self):
+		cron = TCronTab(tab="0 10 * * * {} # SuperCron__TEST__a%%skip\n".format(JobRunner.wrap("TEST__a", "ls", "skip")))
+		cron.rename_job("TEST__a", "TEST__b")
+		self.assertEqual(JobRunner.unwrap(next(cron.find_name("TEST__b")).command), ("TEST__b", "skip", "ls"))
+
+
+class TestApply(unittest.TestCase):
+	"""class for testing the reconciliation of a crontab with a file of desired jobs"""
+
+	def setUp(self):
+		self.cron = TCronTab(tab="MAILTO=root\n0 3 * * * backup # SuperCron__TEST__a\n*/5 * * * * ls # SuperCron__TEST__b\n" +
+			"# 0 4 * * * pwd # SuperCron__TEST__c%on:TEST__a:disabled\n5 5 * * * other\n")
+		self.desired = [{"name": "TEST__a", "command": "backup", "schedule": "0  3 * * *"},
+			{"name": "TEST__c", "command": "pwd", "repetition": "at 4:00", "trigger": "on if TEST__a is disabled"},
+			{"name": "TEST__d", "command": "date", "repetition": "every day", "enabled": False}]
+
+	def plan(self):
+		return [(change.action, change.name, change.fields) for change in self.cron.plan(DesiredJobs.resolve(self.desired))]
+
+	def test_plan(self):
+		self.assertEqual(self.plan(), [("enable", "TEST__c", ["enabled"]), ("add", "TEST__d", []),
+			("remove", "TEST__b", [])])
+		self.desired[0]["schedule"] = "30 3 * * *"
+		self.desired[1]["policy"] = "skip"
+		self.assertEqual(self.plan()[:2], [("modify", "TEST__a", ["schedule"]),
+			("modify", "TEST__c", ["enabled", "policy", "wrap"])])
+
+	def test_reconcile(self):
+		self.cron.reconcile(DesiredJobs.resolve(self.desired))
+		self.assertEqual(self.plan(), [])
+		lines = self.cron.render().split("\n")
+		# untouched lines are kept as they are, and the changes fire no trigger
+		self.assertEqual(lines[:3], ["MAILTO=root", "0 3 * * * backup # SuperCron__TEST__a",
+			"0 4 * * * pwd # SuperCron__TEST__c%on:TEST__a:disabled"])
+		self.assertTrue(lines[4].startswith("# ") and lines[4].endswith(" * * * date # SuperCron__TEST__d"))
+		self.assertEqual(self.cron.propagation, [])
+		self.assertEqual(self.cron.occupancy().slots, Occupancy(self.cron.crons).slots)
+
+	def test_hash_placement(self):
+		first = DesiredJobs.resolve(self.desired)[2].slices
+		self.assertEqual(DesiredJobs.resolve(self.desired[::-1])[0].slices, first)
+
+	def test_invalid(self):
+		for job in ({"name": "TEST__e", "command": "ls"}, {"name": "TEST__e", "command": "ls", "schedule": "* * *"},
+				{"name": "TEST__e", "command": "ls", "schedule": "@sometimes"}, {"name": "TEST__e", "schedule": "@daily"},
+				{"name": "TEST__e", "command": "ls", "schedule": "@daily", "colour": "red"}):
+			self.assertRaises(ValueError, DesiredJobs.resolve, [job])
+
+	def test_plan_only(self):
+		directory = tempfile.mkdtemp()
+		try:
+			path = os.path.join(directory, "jobs.json")
+			with open(path, "w") as f:
+				json.dump({"jobs": self.desired}, f)
+			text = self.cron.render()
+			self.assertEqual(SuperCron.execute(self.cron, ["apply", "-q", "--plan", path]), 0)
+			self.assertEqual(self.cron.render(), text)
+		finally:
+			shutil.rmtree(directory)
+
+
+class TestConcurrentWrites(unittest.TestCase):
+	"""class for testing the writes of crontabs changed by someone else since they were read"""
+
+	FAKE_CRONTAB = "#!/bin/sh\nif [ \"$1\" = -l ]; then cat \"$0.tab\" 2>/dev/null || " + \
+		"{ echo \"no crontab for user\" >&2; exit 1; }; else cat \"$1\" > \"$0.tab\"; fi\n"
+
+	def setUp(self):
+		self.environ = dict(os.environ)
+		self.command = crontab.CRONCMD
+		self.directory = tempfile.mkdtemp()
+		command = os.path.join(self.directory, "crontab")
+		with open(command, "w") as script:
+			script.write(self.FAKE_CRONTAB)
+		os.chmod(command, 0o700)
+		crontab.CRONCMD = command
+		os.environ["PATH"] = self.directory + os.pathsep + os.environ["PATH"]
+		os.environ["XDG_CACHE_HOME"] = self.directory
+
+	def tearDown(self):
+		crontab.CRONCMD = self.command
+		os.environ.clear()
+		os.environ.update(self.environ)
+		shutil.rmtree(self.directory)
+
+	def test_replay(self):
+		first, second = TCronTab(user=True), TCronTab(user=True)
+		first.add_job("TEST__a", "ls", SuperCron.get_repeat("at 10:00"))
+		second.add_job("TEST__b", "pwd", SuperCron.get_repeat("at 11:00"))
+		second.trigger_job("TEST__b", SuperCron.get_trigger("off if TEST__a is added"))
+		first.write()
+		second.write()
+		self.assertEqual(second.journal, [])
+		cron = TCronTab(user=True)
+		self.assertEqual(sorted(job.get_name() for job in cron), ["TEST__a", "TEST__b"])
+		self.assertEqual(next(cron.find_name("TEST__b")).get_trigger(), ["off", "TEST__a", "added"])
+
+	def test_raw_lines(self):
+		with open(os.path.join(self.directory, "crontab.tab"), "w") as tab:
+			tab.write("*/5  *   * * *   ls  # SuperCron__TEST__a\n0 10 * * *\tpwd # SuperCron__TEST__b\n")
+		cron = TCronTab(user=True)
+		cron.enable_job("TEST__b", False)
+		self.assertEqual(cron.render().split("\n")[:2],
+			["*/5  *   * * *   ls  # SuperCron__TEST__a", "# 0 10 * * * pwd # SuperCron__TEST__b"])
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio interface needs Python 3.5+")
+class TestAsync(unittest.TestCase):
+	"""class for testing the asyncio interface against a fake crontab command"""
+
+	# installs a file, like CommandStorage.write
+	FAKE_CRONTAB = TestConcurrentWrites.FAKE_CRONTAB
+
+	def setUp(self):
+		from supercron.aio import AsyncSuperCron
+		self.directory = tempfile.mkdtemp()
+		command = os.path.join(self.directory, "crontab")
+		with open(command, "w") as script:
+			script.write(self.FAKE_CRONTAB)
+		os.chmod(command, 0o700)
+		self.cron = AsyncSuperCron(command=command)
+		self.loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(self.loop)
+		# lock files of the crontab
+		self.cache_home = os.environ.get("XDG_CACHE_HOME")
+		os.environ["XDG_CACHE_HOME"] = self.directory
+
+	def tearDown(self):
+		if self.cache_home is None:
+			del os.environ["XDG_CACHE_HOME"]
+		else:
+			os.environ["XDG_CACHE_HOME"] = self.cache_home
+		asyncio.set_event_loop(None)
+		self.loop.close()
+		shutil.rmtree(self.directory)
+
+	def run_coroutine(self, coroutine):
+		return self.loop.run_until_complete(coroutine)
+
+	def test_concurrent_adds(self):
+		self.run_coroutine(asyncio.gather(*[self.cron.add("TEST__{}".format(i), "ls", "at 10:{:02}".format(i))
+			for i in range(20)]))
+		jobs = self.run_coroutine(self.cron.search("@supercron"))
+		self.assertEqual(sorted(job.name for job in jobs), sorted("TEST__{}".format(i) for i in range(20)))
+
+	def test_results(self):
+		result = self.run_coroutine(self.cron.add("TEST__a", "ls", "every 5 minutes"))
+		self.assertEqual((result.count, result.job.repetition, result.dry_run), (1, "*/5 * * * *", False))
+		self.run_coroutine(self.cron.add("TEST__b", "pwd", "at 11:00"))
+		self.run_coroutine(self.cron.trigger("TEST__a", "off if TEST__b is disabled"))
+		result = self.run_coroutine(self.cron.disable("TEST__b", dry_run=True))
+		self.assertEqual([(step.depth, step.name, step.enabled) for step in result.propagation], [(1, "TEST__a", False)])
+		self.assertTrue(self.run_coroutine(self.cron.search("TEST__a"))[0].enabled)
+		self.assertEqual(self.run_coroutine(self.cron.delete("TEST__b")).count, 1)
+		self.assertRaises(ValueError, self.run_coroutine, self.cron.add("TEST__c", "ls", "blah"))
+
+	def test_lock(self):
+		lock = TCronTab.lock_key(CommandStorage(True, self.cron.command).key)
+		lock.__enter__()
+		# a SuperCron process holds the lock for a while
+		self.loop.call_later(0.2, lock.__exit__, None, None, None)
+		start = time.time()
+		self.run_coroutine(self.cron.add("TEST__a", "ls", "at 10:00"))
+		self.assertTrue(time.time() - start >= 0.2)
+		self.assertEqual(len(self.run_coroutine(self.cron.search("TEST__a"))), 1)
+
+
 def main():
 	unittest.main()
 